@@ -1,36 +1,56 @@
 
+import os
 import time
-import threading
-from typing import List
+from typing import List, Optional
 from audio.audio_processor import AudioProcessor
+from audio.audio_sink import AudioSink
+from audio.automation import AutomationLog
 from modules.constants import *
 
 
 class AudioController:
 
     # Central command center in charge of all audio operations
-    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE):
-        self.audio_processor = AudioProcessor(sample_rate=sample_rate)
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, sink: Optional[AudioSink] = None, decks: int = MIXER_DECKS):
+        self.audio_processor = AudioProcessor(sample_rate=sample_rate, sink=sink, decks=decks)
         self.pitch = DEFAULT_PITCH
         self.volume = DEFAULT_VOLUME
         self.reverb = DEFAULT_REVERB
+        self.filter = DEFAULT_FILTER
+        self.echo = DEFAULT_ECHO
+        self.delay_division = DELAY_DIVISION
+        self.crossfader = DEFAULT_CROSSFADER
         self.pitch_buffer: List[float] = []
         self.volume_buffer: List[float] = []
         self.reverb_buffer: List[float] = []
-        self.parameter_update_lock = threading.Lock()
+        self.filter_buffer: List[float] = []
+        self.echo_buffer: List[float] = []
+        self.crossfader_buffer: List[float] = []
         self.last_update_time = time.time()
         self.audio_loaded = False
+        # Parameter changes since playback started, when a log path is configured; logs saved so far
+        self.automation: Optional[AutomationLog] = AutomationLog() if AUTOMATION_LOG_PATH else None
+        self.automation_saved = 0
 
     def load_audio(self, audio_file: str) -> bool:
         # Load audio file and start playback
         try:
             if self.audio_processor.load_file(audio_file) and self.audio_processor.play():
                 self.audio_loaded = True
+                if self.automation is not None:
+                    self.save_automation()
+                    self.automation.start({'volume': self.volume, 'pitch': self.pitch, 'reverb': self.reverb,
+                                           'filter': self.filter, 'echo': self.echo},
+                                          self.audio_processor.get_output_time_s)
                 return True
             return False
         except Exception:
             return False
 
+    def load_deck(self, index: int, audio_file: str) -> bool:
+        # Load a file on another deck of the mixer and start it from the top
+        return self.audio_processor.load_deck(index, audio_file) and self.audio_processor.play_deck(index)
+
     def smooth_pitch(self, pitch: float):
         # Smooth pitch value to reduce sudden changes
         self.pitch = self.smooth_value(pitch, self.pitch_buffer, self.pitch)
@@ -41,21 +61,61 @@ class AudioController:
         self.reverb = self.smooth_value(reverb, self.reverb_buffer, self.reverb)
         self.update_parameters()
 
+    def smooth_filter(self, value: float):
+        # Smooth the filter sweep; posted on its own like volume, so the sweep never waits on a re-render
+        self.filter = self.smooth_value(value, self.filter_buffer, self.filter)
+        if self.audio_loaded:
+            self.audio_processor.set_param('filter', self.filter)
+            self.record('filter', self.filter)
+
+    def smooth_echo(self, value: float):
+        # Smooth the echo send, posted on its own like the filter
+        self.echo = self.smooth_value(value, self.echo_buffer, self.echo)
+        if self.audio_loaded:
+            self.audio_processor.set_param('echo', self.echo)
+            self.record('echo', self.echo)
+
+    def smooth_crossfader(self, position: float):
+        # Smooth the crossfader between the A and B decks
+        self.crossfader = self.smooth_value(position, self.crossfader_buffer, self.crossfader)
+        if self.audio_loaded:
+            self.audio_processor.set_crossfader(self.crossfader)
+
     def smooth_volume(self, volume: float):
         # Smooth pitch value to reduce sudden changes and implement immediate volume change
         self.volume = self.smooth_value(volume, self.volume_buffer, self.volume, VOLUME_SMOOTHING_FACTOR)
         if self.audio_loaded:
             self.audio_processor.set_param('volume', self.volume)
+            self.record('volume', self.volume)
 
     def update_parameters(self):
-        # Update audio parameters with rate limiting to prevent excessive processing
-        current_time = time.time()
-        if current_time - self.last_update_time > PARAMETER_UPDATE_INTERVAL:
-            with self.parameter_update_lock:
-                if self.audio_loaded:
-                    self.audio_processor.set_param('pitch', self.pitch)
-                    self.audio_processor.set_param('reverb', self.reverb)
+        # The stream engine's mailbox keeps only the newest values and ramps them in over one block,
+        # so every tracked value goes straight through. The render-then-replay fallback starts a
+        # re-render on each change, so there updates stay rate limited.
+        if not self.audio_loaded:
+            return
+        if not self.audio_processor.is_streaming:
+            current_time = time.time()
+            if current_time - self.last_update_time <= PARAMETER_UPDATE_INTERVAL:
+                return
             self.last_update_time = current_time
+        self.audio_processor.set_params({'pitch': self.pitch, 'reverb': self.reverb})
+        self.record('pitch', self.pitch)
+        self.record('reverb', self.reverb)
+
+    def record(self, name: str, value: float):
+        if self.automation is not None:
+            self.automation.record(name, value)
+
+    def save_automation(self):
+        # Write the log of the track loaded last: the first to AUTOMATION_LOG_PATH, each later
+        # one numbered beside it (performance-2.csv, ...)
+        if self.automation is None or not len(self.automation):
+            return
+        root, ext = os.path.splitext(AUTOMATION_LOG_PATH)
+        path = AUTOMATION_LOG_PATH if self.automation_saved == 0 else f"{root}-{self.automation_saved + 1}{ext}"
+        self.automation.save(path)
+        self.automation_saved += 1
 
     def smooth_value(self, new_value: float, buffer: List[float], current_value: float, smoothing_factor: float = SMOOTHING_FACTOR) -> float:
         # Apply smoothing to reduce jitter in parameter values
@@ -66,22 +126,54 @@ class AudioController:
         return current_value + smoothing_factor * (avg_value - current_value)
 
     def get_stats(self):
-        # Return current audio parameter values for display in statistics
-        return {"pitch": self.pitch, "reverb": self.reverb, "volume": self.volume}
+        # Return current audio parameter values for display in statistics, plus re-render
+        # counters when the render-then-replay path is active
+        stats = {"pitch": self.pitch, "reverb": self.reverb, "volume": self.volume, "filter": self.filter,
+                 "echo": self.echo, "delay_division": self.delay_division, "tempo": self.audio_processor.get_tempo()}
+        mixer_stats = self.audio_processor.get_mixer_stats()
+        if mixer_stats:
+            stats["mixer"] = mixer_stats
+        render_stats = self.audio_processor.get_render_stats()
+        if render_stats:
+            stats["renders"] = render_stats
+        return stats
 
     def reset_parameters(self):
         # Reset all audio parameters
         self.pitch = DEFAULT_PITCH
         self.volume = DEFAULT_VOLUME
         self.reverb = DEFAULT_REVERB
+        self.filter = DEFAULT_FILTER
+        self.echo = DEFAULT_ECHO
+        self.crossfader = DEFAULT_CROSSFADER
         self.pitch_buffer.clear()
         self.volume_buffer.clear()
         self.reverb_buffer.clear()
+        self.filter_buffer.clear()
+        self.echo_buffer.clear()
+        self.crossfader_buffer.clear()
         if self.audio_loaded:
+            self.audio_processor.set_crossfader(DEFAULT_CROSSFADER)
             self.audio_processor.set_params({
                 'pitch': DEFAULT_PITCH, 'reverb': DEFAULT_REVERB, 
-                'volume': DEFAULT_VOLUME
+                'volume': DEFAULT_VOLUME, 'filter': DEFAULT_FILTER, 'echo': DEFAULT_ECHO
             })
+            for name, value in (('pitch', DEFAULT_PITCH), ('reverb', DEFAULT_REVERB), ('volume', DEFAULT_VOLUME),
+                                ('filter', DEFAULT_FILTER), ('echo', DEFAULT_ECHO)):
+                self.record(name, value)
+
+    def set_reverb_engine(self, name: str):
+        # Switch between the convolution and feedback-delay-network reverbs at runtime
+        self.audio_processor.set_reverb_engine(name)
+
+    def set_pitch_mode(self, mode: str):
+        # 'varispeed' moves pitch and tempo together, 'keylock' changes pitch at the original tempo
+        self.audio_processor.set_pitch_mode(mode)
+
+    def set_delay_division(self, name: str):
+        # Note length of the echo at the track's tempo, one of DELAY_DIVISIONS
+        self.audio_processor.set_delay_division(name)
+        self.delay_division = name
 
     def toggle_playback(self):
         # Toggle between play and pause states
@@ -93,4 +185,5 @@ class AudioController:
             self.audio_processor.resume()
 
     def cleanup(self):
+        self.save_automation()
         self.audio_processor.cleanup()
@@ -1,57 +1,190 @@
 import numpy as np
 from pydub import AudioSegment
-from typing import Dict
+import threading
+from typing import Dict, Optional, Tuple
 from modules import constants as C
 from audio.reverb_effect import ReverbEffect
+from audio.fdn_reverb import FDNReverb
+from audio.resampler import PolyphaseResampler
+from audio.pitch_shifter import PitchShifter
+from audio.audio_sink import segment_to_array, float_to_int16
+from audio.master_bus import MasterBus, dry_levels
+from audio.dsp_graph import FilterNode, dj_filter_sos
+from audio.render_scheduler import check_cancelled
 
 
 class AudioEffects:
-    # This is the audio effects processor which manages volume, pitch, and reverb
+    # This is the audio effects processor which manages volume, pitch, the DJ filter and reverb
     
-    def __init__(self):
-        self.reverb = ReverbEffect()
+    def __init__(self, reverb_engine: str = C.REVERB_ENGINE, pitch_mode: str = C.PITCH_MODE):
+        self.reverb_engines = {'convolution': ReverbEffect(), 'fdn': FDNReverb()}
+        self.set_reverb_engine(reverb_engine)
+        self.set_pitch_mode(pitch_mode)
 
-    def apply(self, audio: AudioSegment, params: Dict) -> AudioSegment:
+    def set_reverb_engine(self, name: str):
+        # Convolution (default) or the cheaper feedback delay network; both share apply(audio, amount)
+        if name not in self.reverb_engines:
+            raise ValueError(f"Unknown reverb engine: {name}")
+        self.reverb_engine = name
+        self.reverb = self.reverb_engines[name]
+
+    def set_pitch_mode(self, mode: str):
+        # 'varispeed' (pitch and tempo together) or 'keylock' (pitch only, phase vocoder)
+        if mode not in ('varispeed', 'keylock'):
+            raise ValueError(f"Unknown pitch mode: {mode}")
+        self.pitch_mode = mode
+
+    def apply(self, audio: AudioSegment, params: Dict, cancel: Optional[threading.Event] = None) -> AudioSegment:
         # Apply all audio effects based on provided parameters.
-        
+        # AudioSegment wrapper around process(): one conversion in, one int16 conversion out.
+
         if not isinstance(audio, AudioSegment):
             raise TypeError("Input must be a pydub AudioSegment")
 
+        target_sample_rate = params.get('sample_rate', C.DEFAULT_SAMPLE_RATE)
+        y = self.process(segment_to_array(audio), audio.frame_rate, params, cancel)
+        return AudioSegment(float_to_int16(y).tobytes(), frame_rate=target_sample_rate,
+                            sample_width=2, channels=y.shape[1])
+
+    def process(self, x: np.ndarray, sample_rate: int, params: Dict,
+                cancel: Optional[threading.Event] = None, offset: int = 0) -> np.ndarray:
+        # Effect chain on a float32 (frames, channels) track, which is only read. The result is
+        # one new float32 array at params['sample_rate']: pitch (when it resamples) or the gain
+        # stage makes the single copy, everything after works in place on it.
+        # A set cancel event aborts between stages, and inside the reverb stage between its
+        # segments, with RenderCancelled. When x is a slice of the track, offset is the output
+        # frame its render starts at, which puts the master bus on the whole render's block grid.
+
         # Extract parameters with defaults
         volume = params.get('volume', C.DEFAULT_VOLUME)
         pitch = params.get('pitch', C.DEFAULT_PITCH)
         reverb = params.get('reverb', C.DEFAULT_REVERB)
         target_sample_rate = params.get('sample_rate', C.DEFAULT_SAMPLE_RATE)
 
-        # Apply effects in optimal order (volume -> pitch -> reverb)
-        processed_audio = self.apply_volume(audio, volume)
-        processed_audio = self.apply_pitch(processed_audio, pitch, target_sample_rate)
-        processed_audio = self.apply_reverb(processed_audio, reverb)
-        
-        return processed_audio
-
-    def apply_volume(self, audio: AudioSegment, volume: float) -> AudioSegment:
-        # Apply volume adjustment using logarithmic scaling.
-        if abs(volume - 1.0) < 0.001: 
-            return audio
-            
-        if volume > 0.001:
-            db_change = 20 * np.log10(volume)
-            db_change = np.clip(db_change, -60, 12)  
-            return audio + db_change
+        # Pitch -> volume -> filter -> reverb -> master bus, the live graph's order. Gain is linear,
+        # so it is applied after the resampler and the filter, and with reverb it is folded into
+        # the mix instead of costing a pass of its own. The bus matches the reverb mix to the dry
+        # levels block by block, as the live engine does.
+        y = self.apply_pitch(x, sample_rate, pitch, target_sample_rate)
+        check_cancelled(cancel)
+        y = self.apply_filter(y, params.get('filter', C.DEFAULT_FILTER), target_sample_rate, copy=y is x)
+        check_cancelled(cancel)
+        dry = None
+        if reverb > 0.0:
+            gain = self.volume_gain(volume)
+            dry = dry_levels(y, gain, offset=offset)
+            y = self.apply_reverb(y, reverb, target_sample_rate, gain, cancel)
         else:
-            return audio - 60
+            y = self.apply_volume(y, volume, copy=y is x)
+        check_cancelled(cancel)
+        return self.apply_master(y, target_sample_rate, dry, offset)
+
+    def output_step(self, source_rate: int, params: Dict) -> float:
+        # Source frames consumed per output frame for these parameters
+        step = source_rate / params.get('sample_rate', C.DEFAULT_SAMPLE_RATE)
+        pitch = params.get('pitch', C.DEFAULT_PITCH)
+        if self.pitch_mode == 'varispeed' and abs(pitch - 1.0) >= 0.001:
+            step *= pitch
+        return step
+
+    def render_context(self, sample_rate: int, params: Dict) -> Tuple[int, int]:
+        # Source frames of pre-roll and post-roll a range render needs to match the whole render:
+        # resampler and filter history, and with reverb the tail on both sides (the convolution
+        # is centred) plus, before it, the master bus's level window
+        preroll = C.PROGRESSIVE_PREROLL_S * sample_rate
+        postroll = C.PROGRESSIVE_POSTROLL_S * sample_rate
+        reverb = params.get('reverb', C.DEFAULT_REVERB)
+        if reverb > 0.0:
+            target_sample_rate = params.get('sample_rate', C.DEFAULT_SAMPLE_RATE)
+            source_per_s = target_sample_rate * self.output_step(sample_rate, params)
+            tail_s = self.reverb.tail_s(reverb, target_sample_rate)
+            window_s = C.MASTER_RMS_WINDOW_S + 2 * C.MASTER_RENDER_BLOCK / target_sample_rate
+            preroll = max(preroll, (tail_s + window_s) * source_per_s)
+            postroll = max(postroll, tail_s * source_per_s)
+        return int(np.ceil(preroll)), int(np.ceil(postroll))
+
+    def render_window(self, sample_rate: int, params: Dict, start: int, end: int, frames: int) -> Tuple[int, int]:
+        # Track frames [a, b) a range render of track frames [start, end) reads from a track of
+        # frames: the render_context around it, starting on a source frame the resampler maps
+        # exactly onto an output frame
+        preroll, postroll = self.render_context(sample_rate, params)
+        a, b = max(0, start - preroll), min(frames, end + postroll)
+        step = self.output_step(sample_rate, params)
+        if step != 1.0:
+            a -= a % PolyphaseResampler(C.STREAM_CHANNELS, C.PITCH_RESAMPLER_TIER).ratio(step).numerator
+        return a, b
+
+    def render_range(self, x: np.ndarray, sample_rate: int, params: Dict, start: int, end: int,
+                     cancel: Optional[threading.Event] = None, origin: int = 0) -> np.ndarray:
+        # Render source frames [start, end) as float32 output frames
+        # [round(start / step), round(end / step)). The slice (a view of the track) is rendered
+        # over its render_window and then trimmed, with the master bus on the whole render's block
+        # grid, so neighbouring ranges get the same levels and meet without a step. When x is
+        # itself a window of the track, origin is the track frame of x[0], so the frames round
+        # the same way.
+        a, b = self.render_window(sample_rate, params, origin + start, origin + end, origin + len(x))
+        a, b = max(0, a - origin), b - origin
+        step = self.output_step(sample_rate, params)
+        rendered = self.process(x[a:b], sample_rate, params, cancel, int(round((origin + a) / step)))
+
+        lead = int(round((origin + start) / step)) - int(round((origin + a) / step))
+        length = int(round((origin + end) / step)) - int(round((origin + start) / step))
+        out = rendered[lead:lead + length]
+        if len(out) < length:
+            out = np.concatenate([out, np.zeros((length - len(out), out.shape[1]), dtype=np.float32)])
+        return out
+
+    @staticmethod
+    def volume_gain(volume: float) -> float:
+        # Logarithmic volume mapped to a linear gain, limited to -60..+12 dB
+        if abs(volume - 1.0) < 0.001:
+            return 1.0
+        if volume <= 0.001:
+            return 10 ** (-60 / 20)
+        db_change = np.clip(20 * np.log10(volume), -60, 12)
+        return float(10 ** (db_change / 20))
+
+    def apply_volume(self, x: np.ndarray, volume: float, copy: bool = False) -> np.ndarray:
+        # Apply volume adjustment using logarithmic scaling; in place unless copy is set
+        gain = self.volume_gain(volume)
+        if copy:
+            return np.multiply(x, np.float32(gain), dtype=np.float32)
+        if gain != 1.0:
+            x *= np.float32(gain)
+        return x
+
+    def apply_pitch(self, x: np.ndarray, sample_rate: int, pitch: float, target_sample_rate: int) -> np.ndarray:
+
+        # Varispeed pitch: read the track `pitch` times faster through the polyphase resampler.
+        # Returns x itself when there is nothing to do.
+        if abs(pitch - 1.0) < 0.001 and sample_rate == target_sample_rate:
+            return x
+
+        resampler = PolyphaseResampler(x.shape[1], C.PITCH_RESAMPLER_TIER)
+        if self.pitch_mode == 'keylock':
+            # Convert the rate first, then shift pitch at constant tempo
+            if sample_rate != target_sample_rate:
+                x = resampler.resample(x, sample_rate / target_sample_rate)
+            return PitchShifter(x.shape[1], tier=C.PITCH_RESAMPLER_TIER).apply(x, pitch)
+        return resampler.resample(x, pitch * sample_rate / target_sample_rate)
 
-    def apply_pitch(self, audio: AudioSegment, pitch: float, target_sample_rate: int) -> AudioSegment:
+    def apply_filter(self, x: np.ndarray, value: float, sample_rate: int, copy: bool = False) -> np.ndarray:
+        # DJ filter sweep held at value (the live FilterNode run over the whole array); in place
+        # unless copy is set, and x itself when the value is in the dead zone
+        if dj_filter_sos(value, sample_rate) is None:
+            return x
+        y = x.copy() if copy else x
+        return FilterNode(sample_rate, y.shape[1]).run(y, value)
 
-        # Applies pitch by altering frame rate
-        if abs(pitch - 1.0) < 0.001:  
-            return audio
-        
-        new_frame_rate = int(audio.frame_rate * pitch)
-        pitched_audio = audio._spawn(audio.raw_data, overrides={'frame_rate': new_frame_rate})
-        return pitched_audio.set_frame_rate(target_sample_rate)
+    def apply_reverb(self, x: np.ndarray, reverb: float, sample_rate: int, gain: float = 1.0,
+                     cancel: Optional[threading.Event] = None) -> np.ndarray:
+        # Using reverb class, apply reverb to audio into a new array (x is only read); the level
+        # stages are left to apply_master. cancel is checked between the reverb's segments.
+        return self.reverb.apply_array(x, reverb, sample_rate, gain, normalize=False, cancel=cancel)
 
-    def apply_reverb(self, audio: AudioSegment, reverb: float) -> AudioSegment:
-        # Using reverb class, apply reverb to audio
-        return self.reverb.apply(audio, reverb)
+    def apply_master(self, y: np.ndarray, sample_rate: int, dry: Optional[np.ndarray] = None,
+                     offset: int = 0) -> np.ndarray:
+        # Master bus over a whole render (or a slice of one starting at output frame offset), in
+        # place: RMS match against the dry levels (per MASTER_RENDER_BLOCK block, see dry_levels)
+        # when given, then the look-ahead limiter
+        return MasterBus(sample_rate, y.shape[1], C.MASTER_RENDER_BLOCK).run(y, dry, offset)
@@ -1,102 +1,461 @@
 
 import threading
+import numpy as np
 from pydub import AudioSegment
 import io
-from typing import Optional, Callable, Dict
+from typing import Optional, Callable, Dict, Tuple, Union
 from audio.audio_effects import AudioEffects
-from audio.playback_manager import PlaybackManager
+from audio.playback_manager import PlaybackManager, blend_region
+from audio.stream_engine import StreamEngine
+from audio.deck_mixer import DeckMixer
+from audio.audio_sink import AudioSink, segment_to_array, match_channels
+from audio.render_scheduler import RenderScheduler, check_cancelled
+from audio.render_speculator import RenderSpeculator
+from audio.render_cache import RenderCache, quantize_params, track_hash
+from audio.render_worker import RenderWorker, RenderWorkerDied
+from audio.parallel_render import ParallelRenderer
+from audio import track_store
 from modules.constants import *
 
 class AudioProcessor:
 
     # Heart of the audio system that handles file loading, effects, and playback coordination
 
-    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE, buffer_size: int = DEFAULT_BUFFER_SIZE):
-        self.original_audio: Optional[AudioSegment] = None
+    def __init__(self, sample_rate: int = DEFAULT_SAMPLE_RATE, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 sink: Optional[AudioSink] = None, decks: int = MIXER_DECKS):
+        # The decoded track, held once as float32 (frames, channels) and shared with the stream engine.
+        # With TRACK_STORAGE = 'mmap' it is a view of a memory-mapped temporary file.
+        self.track: Optional[np.ndarray] = None
+        self.track_rate = sample_rate
+        self.track_id: Optional[str] = None
         self.params: Dict[str, float] = self.default_params()
         self.effects_engine = AudioEffects()
-        self.playback_manager = PlaybackManager(sample_rate=sample_rate, buffer_size=buffer_size, status_callback=self.on_playback_status)
+        # Block streaming engine by default, render-then-replay when disabled; both write to an AudioSink.
+        # With more than one deck a DeckMixer stands in for the engine: the loaded track and the
+        # parameters go to its focused deck, transport to the whole mix.
+        self.stream_engine: Optional[Union[StreamEngine, DeckMixer]] = None
+        self.mixer: Optional[DeckMixer] = None
+        self.playback_manager: Optional[PlaybackManager] = None
+        if USE_STREAM_ENGINE and decks > 1:
+            self.mixer = DeckMixer(decks, sample_rate=sample_rate, sink=sink, status_callback=self.on_playback_status)
+            self.stream_engine = self.mixer
+        elif USE_STREAM_ENGINE:
+            self.stream_engine = StreamEngine(sample_rate=sample_rate, sink=sink, status_callback=self.on_playback_status)
+        else:
+            self.playback_manager = PlaybackManager(sample_rate=sample_rate, buffer_size=buffer_size, status_callback=self.on_playback_status, sink=sink)
         self.parameter_lock = threading.Lock()
-        self.effects_thread: Optional[threading.Thread] = None
-        self.is_processing_effects = False
+        # Whole-track re-renders for the fallback path: newest parameters win, stale renders are cancelled
+        self.render_scheduler: Optional[RenderScheduler] = None
+        if self.playback_manager is not None:
+            self.render_scheduler = RenderScheduler(self.render_effects, self.deliver_render)
+        # Render process for the fallback path; in-memory tracks and their renders are shared with it
+        self.render_worker: Optional[RenderWorker] = None
+        if self.playback_manager is not None and RENDER_WORKER_PROCESS:
+            self.render_worker = RenderWorker()
+        # Process pool for whole-track renders, split into chunks
+        self.parallel_renderer: Optional[ParallelRenderer] = None
+        if self.playback_manager is not None and PARALLEL_RENDER:
+            self.parallel_renderer = ParallelRenderer()
+        # Finished renders by track content and quantized parameters, for settings returned to
+        self.render_cache: Optional[RenderCache] = None
+        if self.playback_manager is not None and RENDER_CACHE:
+            self.render_cache = RenderCache()
+        # Likely next parameter states pre-rendered in worker processes, for progressive re-renders
+        self.speculator: Optional[RenderSpeculator] = None
+        if self.playback_manager is not None and SPECULATIVE_RENDER:
+            self.speculator = RenderSpeculator(self.effects_engine.output_step, self.effects_engine.render_window)
         self.status_callback: Optional[Callable[[str], None]] = None
 
     def default_params(self) -> Dict[str, float]:
  
-        return {'volume': DEFAULT_VOLUME, 'pitch': DEFAULT_PITCH, 'reverb': DEFAULT_REVERB}
+        return {'volume': DEFAULT_VOLUME, 'pitch': DEFAULT_PITCH, 'reverb': DEFAULT_REVERB, 'filter': DEFAULT_FILTER,
+                'echo': DEFAULT_ECHO}
 
     def load_file(self, file_path: str) -> bool:
 
         try:
-            self.original_audio = AudioSegment.from_file(file_path)
+            self.set_track(*self.decode_file(file_path))
             self.notify_status('File loaded successfully')
             return True
         except Exception as e:
             self.notify_status(f'Error loading file: {e}')
             return False
 
+    def decode_file(self, file_path: str) -> Tuple[np.ndarray, int]:
+        # Canonical float32 track and its sample rate
+        if TRACK_STORAGE == 'mmap':
+            # Decoded chunk by chunk into the mapped file; the whole track is never in memory
+            return track_store.decode_file(file_path, self.output.sample_rate, STREAM_CHANNELS)
+        audio = AudioSegment.from_file(file_path)
+        return match_channels(segment_to_array(audio), STREAM_CHANNELS), audio.frame_rate
+
+    def load_deck(self, index: int, file_path: str) -> bool:
+        # Load a file on one of the mixer's decks; the focused deck's track is this processor's track
+        if self.mixer is None:
+            return index == 0 and self.load_file(file_path)
+        if index == self.mixer.focused:
+            return self.load_file(file_path)
+        try:
+            self.mixer.load_deck(index, *self.decode_file(file_path))
+            self.notify_status(f'Deck {index + 1} loaded')
+            return True
+        except Exception as e:
+            self.notify_status(f'Error loading deck {index + 1}: {e}')
+            return False
+
+    def play_deck(self, index: int, start_position_s: float = 0.0) -> bool:
+        # Start one deck (from the top by default) alongside the others, starting the output if needed
+        if self.mixer is None:
+            return index == 0 and self.play(start_position_s)
+        try:
+            self.mixer.play_deck(index, start_position_s)
+        except ValueError as e:
+            self.notify_status(str(e))
+            return False
+        self.mixer.resume()
+        return True
+
+    def set_crossfader(self, position: float):
+
+        if self.mixer is not None:
+            self.mixer.set_crossfader(position)
+
+    def get_mixer_stats(self) -> Dict:
+        # Decks, crossfader and per-block cost of the mixer; empty with a single track
+        return self.mixer.get_mixer_stats() if self.mixer is not None else {}
+
+    @property
+    def deck_count(self) -> int:
+        return len(self.mixer.decks) if self.mixer is not None else 1
+
     def load_from_bytes(self, audio_data: bytes, format: str = 'wav') -> bool:
 
         try:
-            self.original_audio = AudioSegment.from_file(io.BytesIO(audio_data), format=format)
+            self.load_track(AudioSegment.from_file(io.BytesIO(audio_data), format=format))
             self.notify_status('Audio loaded from bytes')
             return True
         except Exception as e:
             self.notify_status(f'Error loading from bytes: {e}')
             return False
 
+    def load_track(self, audio: AudioSegment):
+
+        # Decode straight to the canonical float32 buffer; the PCM segment is dropped afterwards
+        if TRACK_STORAGE == 'mmap':
+            self.set_track(track_store.from_segment(audio, STREAM_CHANNELS), audio.frame_rate)
+        elif self.render_worker is not None:
+            # Straight into the shared memory the render process reads
+            shared = self.render_worker.allocate(int(audio.frame_count()), STREAM_CHANNELS)
+            self.set_track(track_store.segment_into(audio, shared), audio.frame_rate)
+        else:
+            self.set_track(match_channels(segment_to_array(audio), STREAM_CHANNELS), audio.frame_rate)
+
+    def set_track(self, track: np.ndarray, track_rate: int):
+
+        if self.render_worker is not None and not track_store.is_mapped(track) and not self.render_worker.is_shared(track):
+            # Moved into shared memory once, so each render reads it in place
+            track = self.render_worker.share(track)
+        self.track = track
+        self.track_rate = track_rate
+        if self.stream_engine is not None:
+            self.stream_engine.load_array(self.track, self.track_rate)
+        if self.speculator is not None:
+            shared_name = self.render_worker.name_of(self.track) if self.render_worker is not None else None
+            self.speculator.set_track(self.track, self.track_rate, shared_name)
+        self.track_id = None
+        if self.render_cache is not None:
+            # Hashed once per load in the background, so reloading the same audio finds its
+            # earlier renders; until then renders skip the cache
+            threading.Thread(target=self.hash_track, args=(self.track,), daemon=True).start()
+
+    def hash_track(self, track: np.ndarray):
+        track_id = track_hash(track)
+        with self.parameter_lock:
+            if self.track is track:
+                self.track_id = track_id
+
+    def set_playback_volume(self):
+        # Replay path: renders are made at unity volume and the volume is a gain on playback,
+        # on the same law (AudioEffects.volume_gain) as the streaming gain node
+        self.playback_manager.set_volume(self.effects_engine.volume_gain(self.params['volume']))
+
     def set_param(self, name: str, value: float):
 
+        if name not in self.params:
+            return
+        if self.stream_engine is not None:
+            # Posted to the engine's mailbox and ramped in over the next block; no lock, no re-render
+            self.params[name] = value
+            self.stream_engine.set_param(name, value)
+            return
+
         with self.parameter_lock:
-            if name in self.params:
-                self.params[name] = value
-  
-            if name == 'volume':
-                self.playback_manager.set_volume(self.params['volume'])
-        
-            elif self.playback_manager.is_playing:
-                self.apply_effects_async()
-    
+            self.params[name] = value
+            current_params = dict(self.params, sample_rate=self.playback_manager.sample_rate)
+        if name == 'volume':
+            self.set_playback_volume()
+        if name == 'volume' or name in STREAM_ONLY_PARAMS:
+            return
+
+        if self.speculator is not None and self.playback_manager.is_playing:
+            self.speculator.observe(current_params, self.playback_manager.get_source_frame())
+        # Re-render is kicked off outside the lock so a slow start never holds up the caller
+        if self.playback_manager.is_playing:
+            self.apply_effects_async()
+
     def set_params(self, new_params: Dict[str, float]):
 
+        if self.stream_engine is not None:
+            self.params.update(new_params)
+            self.stream_engine.set_params(new_params)
+            return
+
         with self.parameter_lock:
             self.params.update(new_params)
-  
+            current_params = dict(self.params, sample_rate=self.playback_manager.sample_rate)
         if 'volume' in new_params:
-            self.playback_manager.set_volume(self.params['volume'])
+            self.set_playback_volume()
+        if set(new_params) <= {'volume', *STREAM_ONLY_PARAMS}:
+            return
+
+        if self.speculator is not None and self.playback_manager.is_playing:
+            self.speculator.observe(current_params, self.playback_manager.get_source_frame())
 
         if self.playback_manager.is_playing:
             self.apply_effects_async()
 
+    def set_reverb_engine(self, name: str):
+
+        self.effects_engine.set_reverb_engine(name)
+        if self.speculator is not None:
+            self.speculator.set_engine(self.effects_engine.reverb_engine, self.effects_engine.pitch_mode)
+        if self.stream_engine is not None:
+            self.stream_engine.set_reverb_engine(name)
+        elif self.playback_manager.is_playing:
+            self.apply_effects_async()
+
+    def set_pitch_mode(self, mode: str):
+
+        self.effects_engine.set_pitch_mode(mode)
+        if self.speculator is not None:
+            self.speculator.set_engine(self.effects_engine.reverb_engine, self.effects_engine.pitch_mode)
+        if self.stream_engine is not None:
+            self.stream_engine.set_pitch_mode(mode)
+        elif self.playback_manager.is_playing:
+            self.apply_effects_async()
+
+    def set_delay_division(self, name: str):
+
+        if self.stream_engine is not None:
+            self.stream_engine.set_delay_division(name)
+
+    def get_tempo(self) -> Optional[float]:
+        # Estimated BPM of the loaded track (streaming engine only)
+        return self.stream_engine.get_tempo() if self.stream_engine is not None else None
+
     def play(self, start_position_s: float = 0.0) -> bool:
 
-        if self.original_audio is None:
+        if self.track is None:
             self.notify_status('No audio loaded.')
             return False
 
-        processed_audio = self.effects_engine.apply(self.original_audio, self.params)
-        return self.playback_manager.play(processed_audio, start_position_s)
+        if self.stream_engine is not None:
+            self.stream_engine.set_params(self.params)
+            return self.stream_engine.play(start_position_s)
 
-    def apply_effects_async(self):
+        self.set_playback_volume()
+        params = quantize_params(dict(self.params, sample_rate=self.playback_manager.sample_rate))
+        step = self.effects_engine.output_step(self.track_rate, params)
+        key = self.render_key(params)
+        cached = self.render_cache.get(key) if key is not None else None
+        if cached is not None:
+            return self.playback_manager.play(cached, start_position_s, step)
+        if track_store.is_mapped(self.track):
+            # Out of core the track is never rendered in one piece: playback starts on an empty
+            # mapped buffer and the progressive renderer fills it in from the playhead
+            started = self.playback_manager.play(self.allocate_buffer(int(len(self.track) / step)), start_position_s, step)
+            self.apply_effects_async()
+            return started
+        processed = self.render_whole(params, step)
+        if key is not None:
+            self.render_cache.put(key, processed)
+        return self.playback_manager.play(processed, start_position_s, step)
 
-        if self.is_processing_effects or (self.effects_thread and self.effects_thread.is_alive()):
+    def seek(self, position_s: float):
+        # Move the playhead to a point of the source track, landing on the exact output frame
+        if self.track is None:
             return
-        self.effects_thread = threading.Thread(target=self.effects_thread_target, daemon=True)
-        self.effects_thread.start()
-
-    def effects_thread_target(self):
+        if self.stream_engine is not None:
+            if self.stream_engine.is_playing:
+                self.stream_engine.play(position_s)
+            else:
+                self.stream_engine.seek_frames(int(position_s * self.track_rate))
+            return
+        manager = self.playback_manager
+        manager.seek(position_s * self.track_rate / manager.buffer_step / manager.sample_rate)
 
-        self.is_processing_effects = True
+    def apply_effects_async(self):
 
-        current_pos_s = self.playback_manager.get_current_position_s()
-       
         with self.parameter_lock:
             current_params = self.params.copy()
-       
-        processed_audio = self.effects_engine.apply(self.original_audio, current_params)
+        self.render_scheduler.request(current_params)
+
+    def render_effects(self, params: Dict[str, float], cancel: threading.Event) -> Optional[Tuple[np.ndarray, float]]:
+
+        # Rendered on the parameter grid, so speculative and cached renders match exactly
+        params = quantize_params(dict(params, sample_rate=self.playback_manager.sample_rate))
+        step = self.effects_engine.output_step(self.track_rate, params)
+        progressive = PROGRESSIVE_RENDER or track_store.is_mapped(self.track)
+        key = self.render_key(params)
+        cached = self.render_cache.get(key) if key is not None else None
+        if cached is not None:
+            # A setting rendered before in full: nothing to render
+            if progressive:
+                self.playback_manager.swap_buffer(cached, step)
+                return None
+            return cached, step
+        if progressive:
+            buffer = self.render_progressive(params, cancel)
+            if key is not None and self.playback_manager.buffer is buffer:
+                self.render_cache.put(key, buffer)
+            return None
+        processed = self.render_whole(params, step, cancel)
+        if key is not None:
+            self.render_cache.put(key, processed)
+        return processed, step
+
+    def render_whole(self, params: Dict[str, float], step: float, cancel: Optional[threading.Event] = None) -> np.ndarray:
+        # The whole track in one piece: in chunks across the process pool when there is one, else
+        # through the render process when the track is shared with it
+        if self.parallel_renderer is not None:
+            return self.parallel_renderer.render(self.effects_engine, self.track, self.track_rate, params, cancel)
+        if self.render_worker is None or not self.render_worker.is_shared(self.track):
+            return self.effects_engine.process(self.track, self.track_rate, params, cancel)
+        buffer = self.allocate_buffer(int(len(self.track) / step), self.track.shape[1])
+        self.render_into(buffer, params, 0, len(self.track), 0, cancel)
+        return buffer
+
+    def render_key(self, params: Dict[str, float]):
+        # Render cache key for the current track and engine settings, or None without a cache
+        if self.render_cache is None or self.track_id is None:
+            return None
+        return self.render_cache.key(self.track_id, self.track_rate, params,
+                                     self.effects_engine.reverb_engine, self.effects_engine.pitch_mode)
+
+    def render_progressive(self, params: Dict[str, float], cancel: threading.Event) -> np.ndarray:
+        # Playhead first: a short window is rendered and crossfaded in within a few hundred ms, then
+        # the rest of the track is filled forward in doubling chunks and finally the part already
+        # played. Every chunk is checked against cancel, so a newer request takes over at once.
+        # A mapped track gets a mapped output buffer, and both are paged out chunk by chunk.
+        # When the speculator already holds these parameters from the playhead on, its buffer
+        # stands in for the first window and the forward fill starts where it ends.
+        # Returns the output buffer once every chunk is in.
+        track, rate = self.track, self.track_rate
+        total = len(track)
+        step = self.effects_engine.output_step(rate, params)
+        playhead = min(self.playback_manager.get_source_frame(), total)
+        window = max(1, int(PROGRESSIVE_WINDOW_S * rate))
+        max_chunk = int(PROGRESSIVE_CHUNK_MAX_S * rate)
+        tail = int(SWAP_CROSSFADE_MS * rate / 1000) + 1
+
+        buffer = self.allocate_buffer(int(total / step), track.shape[1])
+
+        def render(start: int, end: int, blend_head: bool = False, blend_tail: bool = False) -> int:
+            # Each chunk runs a little past its end so the next one can crossfade over the seam
+            start_out = int(round(start / step))
+            self.render_into(buffer, params, start, min(total, end + tail), start_out, cancel, blend_head, blend_tail)
+            return start_out
+
+        first_end = min(total, playhead + window)
+        ready = self.speculator.take(params, playhead, window) if self.speculator is not None else None
+        if ready is not None:
+            first, first_end = ready
+            start_out = int(round(playhead / step))
+            buffer[start_out:start_out + len(first)] = first[:len(buffer) - start_out]
+        else:
+            render(playhead, first_end)
+        check_cancelled(cancel)
+        self.playback_manager.swap_buffer(buffer, step)
 
-        self.playback_manager.play(processed_audio, start_position_s=current_pos_s)
-        self.is_processing_effects = False
+        # Forward from the end of the window, then the already-played part up to the window
+        spans = []
+        a, size = first_end, window * 2
+        while a < total:
+            spans.append((a, min(total, a + size), True, False))
+            a, size = a + size, min(size * 2, max_chunk)
+        a, size = 0, window * 2
+        while a < playhead:
+            b = min(playhead, a + size)
+            spans.append((a, b, a > 0, b == playhead))
+            a, size = b, min(size * 2, max_chunk)
+
+        for start, end, blend_head, blend_tail in spans:
+            start_out = render(start, end, blend_head, blend_tail)
+            track_store.release_pages(track, start, end)
+            track_store.release_pages(buffer, start_out, int(round(end / step)))
+        return buffer
+
+    def render_into(self, buffer: np.ndarray, params: Dict[str, float], start: int, end: int, start_out: int,
+                    cancel: Optional[threading.Event] = None, blend_head: bool = False, blend_tail: bool = False):
+        # Render track frames [start, end) into buffer from output frame start_out, crossfading the
+        # chosen edges with what is there. Runs in the render process when it shares both arrays.
+        crossfade = self.playback_manager.crossfade_frames
+        if self.render_worker is not None and self.render_worker.is_shared(self.track) and self.render_worker.is_shared(buffer):
+            engine = (self.effects_engine.reverb_engine, self.effects_engine.pitch_mode)
+            try:
+                self.render_worker.render_into(self.track, buffer, self.track_rate, params, engine, start, end,
+                                               start_out, crossfade, blend_head, blend_tail, cancel)
+                return
+            except RenderWorkerDied as e:
+                # This range renders here instead; later ones go to a fresh render process
+                self.notify_status(f"{e}; restarting it")
+                self.render_worker.restart()
+        block = self.effects_engine.render_range(self.track, self.track_rate, params, start, end, cancel)
+        check_cancelled(cancel)
+        with self.playback_manager.buffer_lock:
+            blend_region(buffer, block, start_out, crossfade, blend_head, blend_tail)
+
+    def allocate_buffer(self, frames: int, channels: int = STREAM_CHANNELS) -> np.ndarray:
+        # Output buffer for the replay path: on disk when the track is, else in shared memory when
+        # there is a render process
+        if track_store.is_mapped(self.track):
+            return track_store.allocate(frames, channels)
+        if self.render_worker is not None:
+            return self.render_worker.allocate(frames, channels)
+        return np.zeros((frames, channels), dtype=np.float32)
+
+    def deliver_render(self, result: Optional[Tuple[np.ndarray, float]]):
+
+        if result is None:
+            # Progressive renders have already been written into the playing buffer
+            return
+        # Resume from the same point of the source track the playhead has reached
+        processed_audio, step = result
+        current_pos_s = self.playback_manager.get_source_frame() / step / self.playback_manager.sample_rate
+        self.playback_manager.play(processed_audio, start_position_s=current_pos_s, step=step)
+
+    @property
+    def is_streaming(self) -> bool:
+        # Parameters go to the stream engine's mailbox rather than into whole-track re-renders
+        return self.stream_engine is not None
+
+    @property
+    def is_processing_effects(self) -> bool:
+
+        return self.render_scheduler is not None and self.render_scheduler.is_busy
+
+    def get_render_stats(self) -> Dict[str, int]:
+        # Re-render counters (started / cancelled / completed / coalesced) for the fallback path,
+        # with render cache counters under 'cache' and the speculative pre-render hit rate and
+        # budget under 'speculation'
+        if self.render_scheduler is None:
+            return {}
+        stats = self.render_scheduler.get_stats()
+        if self.render_cache is not None:
+            stats['cache'] = self.render_cache.get_stats()
+        if self.speculator is not None:
+            stats['speculation'] = self.speculator.get_stats()
+        return stats
 
     def on_playback_status(self, message: str):
 
@@ -107,19 +466,56 @@ class AudioProcessor:
         if self.status_callback:
             self.status_callback(message)
 
+    @property
+    def output(self):
+        # Whichever backend is driving the audio device
+        return self.stream_engine if self.stream_engine is not None else self.playback_manager
+
+    def get_sink_stats(self) -> Dict[str, float]:
+        # Throughput and deadline-miss counters from the output sink
+        return self.output.sink.get_stats()
+
+    def get_graph_stats(self) -> Dict:
+        # Per-node block cost and CPU budget counters of the streaming effect graph
+        return self.stream_engine.get_graph_stats() if self.stream_engine is not None else {}
+
+    def get_transport_stats(self) -> Dict[str, float]:
+        # Transport position in output frames and its drift from wall clock (see TransportClock)
+        return self.output.get_transport_stats()
+
+    def get_current_position_s(self) -> float:
+        # Seconds into the source track being heard on either path, the unit seek() takes
+        if self.stream_engine is not None:
+            return self.stream_engine.get_current_position_s()
+        if self.track is None:
+            return self.playback_manager.get_current_position_s()
+        return self.playback_manager.get_source_position_s(self.track_rate)
+
+    def get_output_time_s(self) -> float:
+        # Seconds of audio sent to the output so far; seeks and pauses do not move it
+        return self.output.clock.output_s()
+
     def cleanup(self):
 
-        self.playback_manager.cleanup()
+        if self.render_scheduler is not None:
+            self.render_scheduler.stop()
+        if self.speculator is not None:
+            self.speculator.stop()
+        if self.render_worker is not None:
+            self.render_worker.stop()
+        if self.parallel_renderer is not None:
+            self.parallel_renderer.stop()
+        self.output.cleanup()
         
     @property
     def is_playing(self) -> bool:
      
-        return self.playback_manager.is_playing
+        return self.output.is_playing
 
     def pause(self):
    
-        self.playback_manager.pause()
+        self.output.pause()
 
     def resume(self):
 
-        self.playback_manager.resume()
+        self.output.resume()
@@ -0,0 +1,423 @@
+import time
+import wave
+import threading
+import numpy as np
+from pydub import AudioSegment
+from typing import Optional, Callable, Dict
+from modules import constants as C
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    sd = None
+
+try:
+    import pygame
+except ImportError:
+    pygame = None
+
+
+# A render function returns the next (frames, channels) float32 block, or None once the source is exhausted
+RenderFunction = Callable[[int], Optional[np.ndarray]]
+
+
+PCM_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def segment_to_array(audio: AudioSegment) -> np.ndarray:
+    # PCM AudioSegment -> float32 (frames, channels) in [-1, 1]. The PCM bytes are viewed in
+    # place and converted with a single float32 allocation.
+    scale = float(1 << (8 * audio.sample_width - 1))
+    dtype = PCM_DTYPES.get(audio.sample_width)
+    pcm = np.frombuffer(audio.raw_data, dtype=dtype) if dtype else np.array(audio.get_array_of_samples())
+    arr = pcm.astype(np.float32)
+    arr *= 1.0 / scale
+    return arr.reshape((-1, audio.channels))
+
+
+def match_channels(x: np.ndarray, channels: int) -> np.ndarray:
+    # Up-mix mono by repetition or keep the first `channels`; a no-op view when already matching
+    if x.shape[1] == channels:
+        return x
+    if x.shape[1] == 1:
+        return np.repeat(x, channels, axis=1)
+    return np.ascontiguousarray(x[:, :channels])
+
+
+def float_to_int16(block: np.ndarray) -> np.ndarray:
+    # float32 [-1, 1] -> interleavable int16, done only at the output
+    return np.ascontiguousarray((np.clip(block, -1.0, 1.0) * 32767.0).astype(np.int16))
+
+
+class AudioSink:
+    # Output sink interface. A sink pulls blocks from a render function and delivers them
+    # somewhere. Push-style sinks only implement write(); the base class runs the pump thread
+    # and keeps throughput / deadline statistics so renders can be measured without a sound card.
+    # realtime sinks are played as they are pulled; the others wait for every block (files, tests).
+    realtime = True
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS,
+                 block_size: int = C.STREAM_BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.render: Optional[RenderFunction] = None
+        self.finished_callback: Optional[Callable[[], None]] = None
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        self.exhausted = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames_written = 0
+        self.blocks_written = 0
+        self.deadline_misses = 0
+        self.render_time_s = 0.0
+
+    def start(self, render: RenderFunction, finished_callback: Optional[Callable[[], None]] = None):
+        # Begin pulling from render on a background thread
+        self.render = render
+        self.finished_callback = finished_callback
+        self.exhausted = False
+        self.open()
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.pump, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # Stop pulling but keep the output open (used for pause)
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def drain(self, render: RenderFunction) -> int:
+        # Synchronously pull until the source is exhausted; returns frames written
+        self.render = render
+        self.exhausted = False
+        self.open()
+        start_frames = self.frames_written
+        while True:
+            block = self.pull(self.block_size)
+            if block is None:
+                break
+            self.write(block)
+        return self.frames_written - start_frames
+
+    def pump(self):
+        while self.running:
+            block = self.pull(self.block_size)
+            if block is None:
+                break
+            self.write(block)
+        self.running = False
+        if self.exhausted and self.finished_callback:
+            self.finished_callback()
+
+    def pull(self, frames: int) -> Optional[np.ndarray]:
+        # Call the render function and account for how long it took against the block's duration
+        t0 = time.perf_counter()
+        block = self.render(frames)
+        elapsed = time.perf_counter() - t0
+        if block is None:
+            self.exhausted = True
+            return None
+        self.render_time_s += elapsed
+        if elapsed > len(block) / self.sample_rate:
+            self.deadline_misses += 1
+        self.blocks_written += 1
+        self.frames_written += len(block)
+        return block
+
+    @property
+    def is_active(self) -> bool:
+        return self.running
+
+    @property
+    def latency_frames(self) -> int:
+        # Frames already pulled that have not been heard yet
+        return 0
+
+    def open(self):
+        pass
+
+    def write(self, block: np.ndarray):
+        raise NotImplementedError
+
+    def close(self):
+        self.stop()
+
+    def get_stats(self) -> Dict[str, float]:
+        audio_s = self.frames_written / self.sample_rate
+        return {
+            'frames_written': self.frames_written,
+            'blocks_written': self.blocks_written,
+            'deadline_misses': self.deadline_misses,
+            'render_time_s': self.render_time_s,
+            'realtime_factor': audio_s / self.render_time_s if self.render_time_s > 0 else 0.0,
+        }
+
+
+class NullSink(AudioSink):
+    # Discards audio. Paces itself to wall clock when realtime, otherwise consumes as fast as rendered.
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS,
+                 block_size: int = C.STREAM_BLOCK_SIZE, realtime: bool = True):
+        super().__init__(sample_rate, channels, block_size)
+        self.realtime = realtime
+        self.clock_start: Optional[float] = None
+        self.clock_frames = 0
+
+    def open(self):
+        self.clock_start = None
+
+    def write(self, block: np.ndarray):
+        if not self.realtime:
+            return
+        if self.clock_start is None:
+            self.clock_start = time.perf_counter()
+            self.clock_frames = 0
+        self.clock_frames += len(block)
+        delay = self.clock_start + self.clock_frames / self.sample_rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class WavFileSink(AudioSink):
+    # Writes 16-bit PCM to a WAV file as fast as blocks are rendered
+    realtime = False
+
+    def __init__(self, path: str, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS,
+                 block_size: int = C.STREAM_BLOCK_SIZE):
+        super().__init__(sample_rate, channels, block_size)
+        self.path = path
+        self.wav: Optional[wave.Wave_write] = None
+
+    def open(self):
+        if self.wav is None:
+            self.wav = wave.open(self.path, 'wb')
+            self.wav.setnchannels(self.channels)
+            self.wav.setsampwidth(2)
+            self.wav.setframerate(self.sample_rate)
+
+    def write(self, block: np.ndarray):
+        self.wav.writeframes(float_to_int16(block).tobytes())
+
+    def close(self):
+        super().close()
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+
+
+class RingBufferSink(AudioSink):
+    # Keeps the most recent output in a fixed in-memory ring that tests can read back.
+    # With overwrite=False the pump waits for the reader instead of dropping frames.
+
+    def __init__(self, capacity_frames: Optional[int] = None, sample_rate: int = C.DEFAULT_SAMPLE_RATE,
+                 channels: int = C.STREAM_CHANNELS, block_size: int = C.STREAM_BLOCK_SIZE, overwrite: bool = False):
+        super().__init__(sample_rate, channels, block_size)
+        self.capacity = capacity_frames or sample_rate * C.RING_BUFFER_SECONDS
+        self.buffer = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.overwrite = overwrite
+        self.write_index = 0
+        self.read_index = 0
+        self.overruns = 0
+        self.space_available = threading.Condition()
+
+    def write(self, block: np.ndarray):
+        if not self.overwrite and len(block) > self.capacity:
+            # A waiting write has to fit the ring, so longer blocks go in capacity-sized pieces
+            for start in range(0, len(block), self.capacity):
+                self.write(block[start:start + self.capacity])
+            return
+        n = len(block)
+        with self.space_available:
+            if not self.overwrite:
+                while self.running and self.write_index + n - self.read_index > self.capacity:
+                    self.space_available.wait(0.05)
+            if n > self.capacity:
+                block = block[-self.capacity:]
+                self.write_index += n - self.capacity
+                n = self.capacity
+            start = self.write_index % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start:start + first] = block[:first]
+            self.buffer[:n - first] = block[first:]
+            self.write_index += n
+            lost = self.write_index - self.read_index - self.capacity
+            if lost > 0:
+                self.overruns += lost
+                self.read_index += lost
+
+    def available(self) -> int:
+        with self.space_available:
+            return self.write_index - self.read_index
+
+    def read(self, frames: Optional[int] = None) -> np.ndarray:
+        # Return (and consume) up to frames of the oldest unread output
+        with self.space_available:
+            n = self.write_index - self.read_index
+            if frames is not None:
+                n = min(n, frames)
+            idx = (self.read_index + np.arange(n)) % self.capacity
+            out = self.buffer[idx]
+            self.read_index += n
+            self.space_available.notify_all()
+            return out
+
+    def stop(self):
+        with self.space_available:
+            self.running = False
+            self.space_available.notify_all()
+        super().stop()
+
+
+class SoundDeviceSink(AudioSink):
+    # Callback-driven PortAudio output; blocks are rendered inside the audio callback
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS,
+                 block_size: int = C.STREAM_BLOCK_SIZE):
+        super().__init__(sample_rate, channels, block_size)
+        self.stream = None
+        self.underruns = 0
+
+    def start(self, render: RenderFunction, finished_callback: Optional[Callable[[], None]] = None):
+        self.render = render
+        self.finished_callback = finished_callback
+        self.exhausted = False
+        if self.stream is None:
+            self.stream = sd.OutputStream(
+                samplerate=self.sample_rate, blocksize=self.block_size, channels=self.channels,
+                dtype='float32', callback=self.callback, finished_callback=self.on_stream_finished
+            )
+        elif not self.stream.stopped:
+            # A stream that ended via CallbackStop must be stopped before it can restart
+            self.stream.stop()
+        self.stream.start()
+        self.running = True
+
+    def callback(self, outdata, frames, time_info, status):
+        if status.output_underflow:
+            self.underruns += 1
+        block = self.pull(frames)
+        if block is None:
+            outdata.fill(0)
+            raise sd.CallbackStop
+        outdata[:len(block)] = block
+        outdata[len(block):] = 0
+
+    @property
+    def latency_frames(self) -> int:
+        return int(self.stream.latency * self.sample_rate) if self.stream is not None else 0
+
+    def on_stream_finished(self):
+        self.running = False
+        if self.exhausted and self.finished_callback:
+            self.finished_callback()
+
+    def stop(self):
+        if self.stream is not None and not self.stream.stopped:
+            self.stream.stop()
+        self.running = False
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        self.running = False
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = super().get_stats()
+        stats['underruns'] = self.underruns
+        return stats
+
+
+class PygameSink(AudioSink):
+    # Streams blocks through a pygame mixer channel by queueing one Sound behind the playing one
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS,
+                 block_size: int = C.PYGAME_SINK_BLOCK_SIZE, buffer_size: int = C.DEFAULT_BUFFER_SIZE):
+        super().__init__(sample_rate, channels, block_size)
+        self.buffer_size = buffer_size
+        self.channel = None
+
+    def open(self):
+        if pygame.mixer.get_init() is None:
+            pygame.mixer.pre_init(frequency=self.sample_rate, size=-16, channels=self.channels, buffer=self.buffer_size)
+            pygame.mixer.init()
+        if self.channel is None:
+            self.channel = pygame.mixer.Channel(0)
+        else:
+            self.channel.unpause()
+
+    def write(self, block: np.ndarray):
+        sound = pygame.sndarray.make_sound(float_to_int16(block))
+        while self.running and self.channel.get_queue() is not None:
+            time.sleep(0.005)
+        if self.channel.get_busy():
+            self.channel.queue(sound)
+        else:
+            self.channel.play(sound)
+
+    @property
+    def latency_frames(self) -> int:
+        # The queued block behind the playing one, plus the mixer's own buffer
+        return self.block_size + self.buffer_size
+
+    def stop(self):
+        super().stop()
+        if self.channel is not None:
+            self.channel.pause()
+
+    def close(self):
+        super().close()
+        if self.channel is not None:
+            self.channel.stop()
+            self.channel = None
+        if pygame.mixer.get_init() is not None:
+            pygame.mixer.quit()
+
+
+SINK_TYPES = {
+    'sounddevice': SoundDeviceSink,
+    'pygame': PygameSink,
+    'null': NullSink,
+    'wav': WavFileSink,
+    'ring': RingBufferSink,
+}
+
+
+def pygame_has_output() -> bool:
+    # SDL refuses to open the mixer when there is no output device
+    if pygame.mixer.get_init() is not None:
+        return True
+    try:
+        pygame.mixer.init()
+        pygame.mixer.quit()
+        return True
+    except pygame.error:
+        return False
+
+
+def default_sink_kind() -> str:
+    # Prefer PortAudio, then pygame, then a wall-clock null sink on machines without an output device
+    if sd is not None:
+        try:
+            sd.query_devices(kind='output')
+            return 'sounddevice'
+        except Exception:
+            pass
+    if pygame is not None and pygame_has_output():
+        return 'pygame'
+    return 'null'
+
+
+def create_sink(kind: str = C.DEFAULT_SINK, sample_rate: int = C.DEFAULT_SAMPLE_RATE, **kwargs) -> AudioSink:
+    if kind == 'auto':
+        kind = default_sink_kind()
+    if kind not in SINK_TYPES:
+        raise ValueError(f"Unknown audio sink: {kind}")
+    return SINK_TYPES[kind](sample_rate=sample_rate, **kwargs)
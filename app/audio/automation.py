@@ -0,0 +1,78 @@
+import csv
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+AUTOMATION_PARAMS = ('volume', 'pitch', 'reverb', 'filter', 'echo')
+
+
+class AutomationLog:
+    # Timestamped parameter changes of a performance, (seconds from the start, name, value) in
+    # time order. Recorded live by AudioController and replayed offline by render_automation.py.
+    # Stored as CSV with a time,param,value header, one change per row.
+    # Live recordings are timed on the audio output (seconds of audio sent since the start), the
+    # time base the offline render posts changes on, so pauses and scheduling jitter don't shift them.
+
+    def __init__(self, events: Optional[List[Tuple[float, str, float]]] = None):
+        self.events: List[Tuple[float, str, float]] = sorted(events or [], key=lambda event: event[0])
+        self.clock: Callable[[], float] = time.monotonic
+        self.clock_start: Optional[float] = None
+        self.last: Dict[str, float] = {}
+
+    def start(self, params: Dict[str, float], clock: Callable[[], float] = time.monotonic):
+        # Start a new recording on clock (seconds) and record the starting values at 0 s.
+        # Events recorded so far are dropped: save them first.
+        self.events.clear()
+        self.last.clear()
+        self.clock = clock
+        self.clock_start = clock()
+        for name, value in params.items():
+            self.record(name, value, 0.0)
+
+    def record(self, name: str, value: float, t: Optional[float] = None):
+        # Append a change at t, or now on the running clock; repeats of the last value are skipped
+        if name not in AUTOMATION_PARAMS or self.last.get(name) == value:
+            return
+        if t is None:
+            if self.clock_start is None:
+                return
+            t = self.clock() - self.clock_start
+        self.last[name] = value
+        self.events.append((float(t), name, float(value)))
+
+    def changes(self, index: int, t: float) -> Tuple[Dict[str, float], int]:
+        # Newest value per parameter among events[index:] up to time t, and the index to go on from
+        changes = {}
+        while index < len(self.events) and self.events[index][0] <= t:
+            _, name, value = self.events[index]
+            changes[name] = value
+            index += 1
+        return changes, index
+
+    @property
+    def duration(self) -> float:
+        return self.events[-1][0] if self.events else 0.0
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @classmethod
+    def load(cls, path: str) -> 'AutomationLog':
+        events = []
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None or not {'time', 'param', 'value'} <= set(reader.fieldnames):
+                raise ValueError(f"{path}: expected a time,param,value header")
+            for line, row in enumerate(reader, start=2):
+                name = row['param'].strip()
+                if name not in AUTOMATION_PARAMS:
+                    raise ValueError(f"{path}:{line}: unknown parameter '{name}'")
+                events.append((float(row['time']), name, float(row['value'])))
+        return cls(events)
+
+    def save(self, path: str):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'param', 'value'])
+            for t, name, value in self.events:
+                writer.writerow([f"{t:.4f}", name, f"{value:.6g}"])
@@ -0,0 +1,280 @@
+import time
+import numpy as np
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from modules import constants as C
+from audio.audio_sink import AudioSink, NullSink, create_sink
+from audio.master_bus import MasterBus
+from audio.param_mailbox import ParameterMailbox, ParameterRamp
+from audio.stream_engine import StreamEngine
+from audio.transport_clock import TransportClock
+
+
+def crossfader_gains(position: float, sides: Sequence[str]) -> np.ndarray:
+    # Constant-power crossfader: 0 is all 'A', 1 all 'B', the middle both at -3 dB; 'thru' decks
+    # are not on the crossfader
+    angle = 0.5 * np.pi * float(np.clip(position, 0.0, 1.0))
+    curve = {'A': np.cos(angle), 'B': np.sin(angle), 'thru': 1.0}
+    return np.array([curve[side] for side in sides], dtype=np.float32)
+
+
+class DeckMixer:
+    # Several decks mixed into one output stream. Each deck is a StreamEngine with its own track,
+    # parameters and effect graph, minus the master node; the decks never start their own sinks.
+    # The mixer's sink pulls a block, every playing deck renders straight into its row of one
+    # (decks, frames, channels) stack. A deck with reverb on is RMS matched to its own dry
+    # signal, as the master node would, so reverb on one deck does not raise the mix. The rows
+    # are summed with the crossfader gains (gliding per sample when the fader moves) in a single
+    # einsum, then limited by one MasterBus. Per block that is one graph per deck and one sum
+    # over the stack, so the cost grows linearly with the deck count; stopped decks are skipped
+    # and weighted 0.
+    # Transport and parameter calls match StreamEngine's, so AudioProcessor drives either the
+    # same way: transport acts on the mix, parameters on the focused deck (the hands' deck).
+    # Loads, cues and stops only touch deck state on the render thread: the caller prepares
+    # what is slow and queues a command that the next block carries out, so the other decks
+    # keep playing and a deck never plays before its cue.
+
+    def __init__(self, decks: int = C.MIXER_DECKS, sample_rate: int = C.DEFAULT_SAMPLE_RATE,
+                 block_size: int = C.STREAM_BLOCK_SIZE, sink: Optional[AudioSink] = None,
+                 status_callback: Optional[Callable[[str], None]] = None):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.channels = C.STREAM_CHANNELS
+        self.sink = sink if sink is not None else create_sink(sample_rate=sample_rate)
+        self.status_callback = status_callback
+
+        order = tuple(name for name in C.STREAM_GRAPH if name != 'master')
+        self.decks: List[StreamEngine] = []
+        for _ in range(decks):
+            deck = StreamEngine(sample_rate=sample_rate, block_size=block_size, sink=NullSink(sample_rate=sample_rate))
+            deck.set_graph_order(order)
+            deck.convolution_reverb.wait_for_ir = not self.sink.realtime
+            deck.graph.enforce_budget = self.sink.realtime
+            self.decks.append(deck)
+        self.sides = [C.MIXER_CROSSFADER_SIDES[i] if i < len(C.MIXER_CROSSFADER_SIDES) else 'thru'
+                      for i in range(decks)]
+        # Written by the render thread only
+        self.playing = [False] * decks
+        # Decks with a track loaded or on its way, for the caller's checks
+        self.loaded = [False] * decks
+        self.focused = 0
+        # (command, deck, argument) for the next block: 'load' (prepared track), 'play' (start
+        # second), 'seek' (source frame) or 'stop'
+        self.commands: Deque[Tuple[str, int, object]] = deque()
+
+        self.mailbox = ParameterMailbox({'crossfader': C.DEFAULT_CROSSFADER})
+        self.ramp = ParameterRamp({'crossfader': C.DEFAULT_CROSSFADER}, block_size)
+        self.matches = [MasterBus(sample_rate, self.channels, block_size) for _ in range(decks)]
+        self.bus = MasterBus(sample_rate, self.channels, block_size)
+        self.clock = TransportClock(sample_rate)
+        self.allocate(block_size)
+
+        self.blocks = 0
+        self.deck_time_s = 0.0
+        self.mix_time_s = 0.0
+        self.is_playing = False
+
+    def allocate(self, frames: int):
+        # Each deck renders into its own row of the stack, so nothing is copied before the sum
+        self.capacity = frames
+        self.stack = np.zeros((len(self.decks), frames, self.channels), dtype=np.float32)
+        self.gains = np.empty((len(self.decks), frames), dtype=np.float32)
+        self.fade = np.arange(1, frames + 1, dtype=np.float32) / frames
+        self.mix = np.zeros((frames, self.channels), dtype=np.float32)
+        for deck, row in zip(self.decks, self.stack):
+            deck.out_block = row
+
+    def render(self, frames: int) -> Optional[np.ndarray]:
+        # Next block of the mix, or None once no deck is playing. The block is mixer scratch,
+        # valid until the next call.
+        if frames > self.capacity:
+            self.allocate(frames)
+        while self.commands:
+            self.run_command(*self.commands.popleft())
+
+        t0 = time.perf_counter()
+        for index, deck in enumerate(self.decks):
+            if not self.playing[index]:
+                continue
+            block = deck.render(frames)
+            if block is None:
+                self.playing[index] = False
+                self.notify_status(f"Deck {index + 1} finished")
+                continue
+            if not np.may_share_memory(block, self.stack[index]):
+                self.stack[index, :frames] = block
+            self.matches[index].match(self.stack[index, :frames], deck.reverb_node.dry_ms)
+        if not any(self.playing):
+            return None
+        t1 = time.perf_counter()
+
+        _, targets = self.mailbox.read()
+        start, end = self.ramp.next(targets)['crossfader']
+        live = np.array(self.playing, dtype=np.float32)
+        stack, mix = self.stack[:, :frames], self.mix[:frames]
+        if start == end:
+            gains = crossfader_gains(end, self.sides) * live
+            if frames == self.capacity:
+                # A full block is one matrix-vector product over the flattened rows
+                np.dot(gains, self.stack.reshape(len(self.decks), -1), out=self.mix.reshape(-1))
+            else:
+                np.einsum('d,dfc->fc', gains, stack, out=mix)
+        else:
+            g0 = crossfader_gains(start, self.sides) * live
+            g1 = crossfader_gains(end, self.sides) * live
+            fade = self.fade if frames == self.capacity else np.arange(1, frames + 1, dtype=np.float32) / frames
+            gains = np.multiply((g1 - g0)[:, None], fade[None, :frames], out=self.gains[:, :frames])
+            gains += g0[:, None]
+            np.einsum('df,dfc->fc', gains, stack, out=mix)
+        # The decks are matched already; the bus only limits
+        self.bus.process(mix, None, out=mix)
+
+        self.blocks += 1
+        self.deck_time_s += t1 - t0
+        self.mix_time_s += time.perf_counter() - t1
+        self.clock.advance(frames)
+        return mix
+
+    def run_command(self, command: str, index: int, argument):
+        # On the render thread, between blocks
+        deck = self.decks[index]
+        if command == 'load':
+            self.playing[index] = False
+            deck.install_track(*argument)
+        elif command == 'play':
+            deck.seek_frames(int(argument * deck.track_rate))
+            self.matches[index].reset()
+            self.playing[index] = True
+        elif command == 'seek':
+            deck.seek_frames(argument)
+            self.matches[index].reset()
+        elif command == 'stop':
+            self.playing[index] = False
+
+    # Decks
+
+    def load_deck(self, index: int, track: np.ndarray, track_rate: int):
+        # Stops the deck and loads a decoded float32 (frames, channels) track on it
+        prepared = self.decks[index].prepare_track(track, track_rate)
+        self.loaded[index] = True
+        self.commands.append(('load', index, prepared))
+
+    def play_deck(self, index: int, start_position_s: float = 0.0):
+        # Cue the deck at a point of its track and let it play from there
+        if not self.loaded[index]:
+            raise ValueError(f"Deck {index + 1} has no track")
+        self.commands.append(('play', index, float(start_position_s)))
+
+    def stop_deck(self, index: int):
+        self.commands.append(('stop', index, None))
+
+    def focus(self, index: int):
+        # The deck parameter calls go to from now on
+        if not 0 <= index < len(self.decks):
+            raise ValueError(f"No deck {index + 1}")
+        self.focused = index
+
+    def set_crossfader(self, position: float):
+        self.mailbox.post('crossfader', position)
+
+    # StreamEngine interface
+
+    def load_array(self, track: np.ndarray, track_rate: int):
+        self.load_deck(self.focused, track, track_rate)
+
+    def set_param(self, name: str, value: float):
+        self.decks[self.focused].set_param(name, value)
+
+    def set_params(self, new_params: Dict[str, float]):
+        self.decks[self.focused].set_params(new_params)
+
+    def set_reverb_engine(self, name: str):
+        for deck in self.decks:
+            deck.set_reverb_engine(name)
+
+    def set_pitch_mode(self, mode: str):
+        for deck in self.decks:
+            deck.set_pitch_mode(mode)
+
+    def set_delay_division(self, name: str):
+        self.decks[self.focused].set_delay_division(name)
+
+    def get_tempo(self) -> float:
+        return self.decks[self.focused].get_tempo()
+
+    def set_graph_order(self, order: Sequence[str]):
+        for deck in self.decks:
+            deck.set_graph_order(order)
+
+    def get_graph_stats(self) -> Dict:
+        return self.decks[self.focused].get_graph_stats()
+
+    def seek_frames(self, frame: int):
+        self.commands.append(('seek', self.focused, int(frame)))
+
+    def on_sink_finished(self):
+        self.clock.pause()
+        self.is_playing = False
+        self.notify_status("Finished")
+
+    def play(self, start_position_s: float = 0.0) -> bool:
+        # Cue the focused deck and start the output if it is not running; other decks carry on
+        try:
+            self.play_deck(self.focused, start_position_s)
+            if not self.sink.is_active:
+                self.start_output()
+            self.is_playing = True
+            self.notify_status("Playing")
+            return True
+        except Exception as e:
+            self.notify_status(f"Playback error: {e}")
+            return False
+
+    def pause(self):
+        # Halts every deck where it is
+        if self.is_playing:
+            self.sink.stop()
+            self.clock.pause()
+            self.is_playing = False
+            self.notify_status("Paused")
+
+    def resume(self):
+        # Also starts the output for decks cued while it was stopped
+        if not self.is_playing and (any(self.playing) or self.commands):
+            self.start_output()
+            self.is_playing = True
+            self.notify_status("Resumed")
+
+    def start_output(self):
+        # The render thread is not running, so the crossfader can jump to where it was set
+        # while stopped instead of gliding there over the first block
+        self.ramp.snap(self.mailbox.read()[1])
+        self.sink.start(self.render, self.on_sink_finished)
+
+    def get_current_position_s(self) -> float:
+        # The decks render into the mixer's sink, so its queue is what they are heard behind
+        latency = self.sink.latency_frames if self.is_playing else 0
+        return self.decks[self.focused].get_current_position_s(latency)
+
+    def get_transport_stats(self) -> Dict[str, float]:
+        return self.clock.get_stats()
+
+    def get_mixer_stats(self) -> Dict:
+        # Mean time per block spent in the decks' graphs and in the sum plus master bus (microseconds)
+        blocks = max(1, self.blocks)
+        return {
+            'decks': len(self.decks),
+            'playing': list(self.playing),
+            'focused': self.focused,
+            'crossfader': self.mailbox.read()[1]['crossfader'],
+            'deck_us': self.deck_time_s * 1e6 / blocks,
+            'mix_us': self.mix_time_s * 1e6 / blocks,
+        }
+
+    def notify_status(self, message: str):
+        if self.status_callback:
+            self.status_callback(message)
+
+    def cleanup(self):
+        self.sink.close()
+        self.is_playing = False
@@ -0,0 +1,480 @@
+import time
+import numpy as np
+from scipy import signal
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from modules import constants as C
+
+
+# Per-block parameter spans as produced by ParameterRamp.next: name -> (start, end)
+Spans = Dict[str, Tuple[float, float]]
+
+
+def dj_filter_sos(value: float, sample_rate: int, sections: int = 2) -> Optional[Tuple[str, np.ndarray]]:
+    # One-knob DJ filter as ('low' | 'high', Butterworth SOS of order 2 * sections), or None in the
+    # dead zone around 0. Below zero a low-pass closes from 20 kHz towards FILTER_LOWPASS_MIN_HZ,
+    # above zero a high-pass opens from 20 Hz towards FILTER_HIGHPASS_MAX_HZ, both on a log scale.
+    # The biquads come from closed-form (bilinear) formulas: cheap enough to redo every block.
+    depth = (abs(value) - C.FILTER_DEADZONE) / (1.0 - C.FILTER_DEADZONE)
+    if depth <= 0.0:
+        return None
+    depth = min(depth, 1.0)
+    if value < 0.0:
+        kind, cutoff = 'low', 20000.0 * (C.FILTER_LOWPASS_MIN_HZ / 20000.0) ** depth
+    else:
+        kind, cutoff = 'high', 20.0 * (C.FILTER_HIGHPASS_MAX_HZ / 20.0) ** depth
+    w0 = 2.0 * np.pi * min(cutoff, 0.45 * sample_rate) / sample_rate
+    cos_w0, sin_w0 = np.cos(w0), np.sin(w0)
+    sos = np.empty((sections, 6))
+    for k in range(sections):
+        # Butterworth pole pair k of order 2 * sections
+        q = 1.0 / (2.0 * np.cos(np.pi * (2 * k + 1) / (4 * sections)))
+        alpha = sin_w0 / (2.0 * q)
+        b1 = 1.0 - cos_w0 if kind == 'low' else -(1.0 + cos_w0)
+        b0 = abs(b1) / 2.0
+        a0 = 1.0 + alpha
+        sos[k] = [b0 / a0, b1 / a0, b0 / a0, 1.0, -2.0 * cos_w0 / a0, (1.0 - alpha) / a0]
+    return kind, sos
+
+
+class Node:
+    # Stateful block processor in a DSPGraph: takes a (frames, channels) float32 block and the
+    # block's parameter spans and returns the same number of frames, in place where it can.
+    # State (filter memory, tails) carries from one block to the next until reset().
+
+    def process(self, block: np.ndarray, spans: Spans) -> np.ndarray:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+    def degrade(self) -> bool:
+        # Switch to a cheaper setting when the graph runs over its CPU budget; False if there is none
+        return False
+
+    def restore(self) -> bool:
+        # Back to the full setting once the graph has headroom; False if not degraded
+        return False
+
+
+class GainNode(Node):
+    # Volume, gliding per sample from the last block's value to the newest. When it is the first
+    # stage after a varispeed read the engine folds the curve into the resampler instead.
+
+    def __init__(self, volume_gain: Callable[[float], float], ramp, block_size: int):
+        self.volume_gain = volume_gain
+        self.ramp = ramp
+        self.gain_curve = np.zeros(block_size, dtype=np.float32)
+
+    def curve(self, spans: Spans, frames: int):
+        # Scalar or (frames, 1) gain for the block
+        if frames > len(self.gain_curve):
+            self.gain_curve = np.zeros(frames, dtype=np.float32)
+        volume_start, volume_end = spans['volume']
+        return self.ramp.curve(self.volume_gain(volume_start), self.volume_gain(volume_end), frames, self.gain_curve)
+
+    def process(self, block: np.ndarray, spans: Spans) -> np.ndarray:
+        gain = self.curve(spans, len(block))
+        if not np.isscalar(gain) or gain != 1.0:
+            block *= gain
+        return block
+
+
+class PitchShiftNode(Node):
+    # Tempo-locked pitch shift (phase vocoder); passes blocks through unless active (keylock mode)
+
+    def __init__(self, shifter):
+        self.shifter = shifter
+        self.active = False
+
+    def process(self, block: np.ndarray, spans: Spans) -> np.ndarray:
+        if self.active:
+            self.shifter.process(block, *spans['pitch'], out=block)
+        return block
+
+    def reset(self):
+        self.shifter.reset()
+
+
+class FilterNode(Node):
+    # DJ filter sweep driven by the 'filter' parameter (see dj_filter_sos). Causal SOS sections
+    # whose zi carries across blocks, redesigned only when the value moves. Entering the filter
+    # from bypass (or flipping between low- and high-pass) starts from the steady state for the
+    # current sample instead of from silence, so the sweep comes in without a thump.
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sections = 2
+        self.design_key: Optional[Tuple[float, int]] = None
+        self.design: Optional[Tuple[str, np.ndarray]] = None
+        self.kind: Optional[str] = None
+        self.zi: Optional[np.ndarray] = None
+
+    def process(self, block: np.ndarray, spans: Spans) -> np.ndarray:
+        value = spans.get('filter', (0.0, 0.0))[1]
+        if (value, self.sections) != self.design_key:
+            self.design_key = (value, self.sections)
+            self.design = dj_filter_sos(value, self.sample_rate, self.sections)
+        if self.design is None:
+            self.reset()
+            return block
+        kind, sos = self.design
+        if self.zi is None or kind != self.kind or len(self.zi) != len(sos):
+            self.zi = signal.sosfilt_zi(sos)[:, :, None] * block[0]
+            self.kind = kind
+        y, self.zi = signal.sosfilt(sos, block, axis=0, zi=self.zi)
+        block[...] = y
+        return block
+
+    def run(self, y: np.ndarray, value: float, chunk: int = C.MASTER_RENDER_BLOCK) -> np.ndarray:
+        # Whole array through the filter from a fresh state, in place, a chunk at a time so no
+        # float64 copy of the whole track is made
+        self.reset()
+        spans = {'filter': (value, value)}
+        for start in range(0, len(y), chunk):
+            self.process(y[start:start + chunk], spans)
+        self.reset()
+        return y
+
+    def reset(self):
+        self.zi = None
+        self.kind = None
+
+    def degrade(self) -> bool:
+        # 24 dB/octave -> 12 dB/octave halves the per-block cost
+        if self.sections == 1:
+            return False
+        self.sections = 1
+        self.zi = None
+        return True
+
+    def restore(self) -> bool:
+        if self.sections == 2:
+            return False
+        self.sections = 2
+        self.zi = None
+        return True
+
+
+class DelayNode(Node):
+    # Tempo-synced feedback echo driven by the 'echo' send. One circular buffer of DELAY_MAX_S,
+    # allocated up front, holds what is fed back; the delay is a note length (DELAY_DIVISIONS)
+    # at the track's tempo times the read speed, so it never reallocates when either changes.
+    # A new delay is glided to at most DELAY_GLIDE frames per frame (reads interpolated), like
+    # a tape echo's head moving. Repeats pass a one-pole low-pass on the way back in. With the
+    # send closed the node keeps running until a whole delay's worth of echoes has gone quiet,
+    # then clears the buffer and passes blocks through untouched.
+    # Every working array is sized up front for the block, so a block allocates nothing. The
+    # low-pass runs on spans long enough for its impulse response to fall under float32
+    # precision: one batched matrix product filters every span from rest, then each span adds
+    # the decay of the output the span before it ended on.
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS,
+                 block_size: int = C.STREAM_BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.capacity = int(C.DELAY_MAX_S * sample_rate)
+        self.buffer = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.tempo_bpm = C.DELAY_DEFAULT_BPM
+        self.speed = 1.0
+        self.division = C.DELAY_DIVISION
+        # Output of the low-pass over a span is damping @ input + decay * (last output before it)
+        pole = np.exp(-2.0 * np.pi * C.DELAY_DAMPING_HZ / sample_rate)
+        self.span = max(8, int(np.ceil(np.log(1e-8) / np.log(pole))))
+        lags = np.subtract.outer(np.arange(self.span), np.arange(self.span))
+        self.damping = np.where(lags >= 0, (1.0 - pole) * pole ** np.maximum(lags, 0), 0.0).astype(np.float32)
+        self.decay = (pole ** np.arange(1, self.span + 1))[:, None].astype(np.float32)
+        self.allocate(block_size)
+        self.reset()
+
+    def allocate(self, frames: int):
+        self.block_capacity = frames
+        self.echo = np.empty((frames, self.channels), dtype=np.float32)
+        self.damped = np.empty((frames, self.channels), dtype=np.float32)
+        self.feed = np.empty((frames, self.channels), dtype=np.float32)
+        self.ramp = np.empty(frames, dtype=np.float64)
+        self.send = np.empty((frames, 1), dtype=np.float32)
+        self.feedback = np.empty((frames, 1), dtype=np.float32)
+        self.positions = np.empty(frames, dtype=np.float64)
+        self.index = np.empty(frames, dtype=np.int64)
+        self.frac = np.empty((frames, 1), dtype=np.float32)
+        self.steps = np.arange(frames + 1, dtype=np.float64)
+        spans = -(-frames // self.span)
+        self.spans_in = np.empty((spans, self.span, self.channels), dtype=np.float32)
+        self.spans_out = np.empty((spans, self.span, self.channels), dtype=np.float32)
+        self.carry = np.empty((spans, self.span, self.channels), dtype=np.float32)
+        self.ends = np.empty((spans, 1, self.channels), dtype=np.float32)
+
+    def reset(self):
+        self.buffer.fill(0.0)
+        self.write = 0
+        self.delay: Optional[float] = None
+        self.state = np.zeros((1, self.channels), dtype=np.float32)
+        self.quiet = 0
+        self.idle = True
+
+    def set_division(self, name: str):
+        if name not in C.DELAY_DIVISIONS:
+            raise ValueError(f"Unknown delay division: {name}")
+        self.division = name
+
+    def target_delay(self) -> float:
+        # Frames of one note at the current tempo, within what the buffer can hold
+        seconds = 60.0 / (self.tempo_bpm * self.speed) * C.DELAY_DIVISIONS[self.division]
+        return float(np.clip(round(seconds * self.sample_rate), 2 * self.block_capacity + 2,
+                             self.capacity - 2 * self.block_capacity))
+
+    def process(self, block: np.ndarray, spans: Spans) -> np.ndarray:
+        send_start, send_end = spans.get('echo', (0.0, 0.0))
+        if self.idle and send_start <= 0.0 and send_end <= 0.0:
+            return block
+        self.idle = False
+        n = len(block)
+        if n > self.block_capacity:
+            self.allocate(n)
+        target = self.target_delay()
+        if self.delay is None:
+            self.delay = target
+        glide = C.DELAY_GLIDE * n
+        delay_end = self.delay + float(np.clip(target - self.delay, -glide, glide))
+
+        # Reads stay at least a chunk behind the write, so each chunk only reads frames already
+        # written; with the planned block size a block is a single chunk
+        done = 0
+        loudest = 0.0
+        while done < n:
+            m = min(n - done, int(min(self.delay, delay_end)) - 2)
+            loudest = max(loudest, self.run_chunk(block[done:done + m], done, n, send_start, send_end, delay_end))
+            done += m
+        self.delay = delay_end
+
+        # Idle once the send is closed and a full delay line of output stayed under -100 dB
+        if send_end <= 0.0 and loudest < 1e-5:
+            self.quiet += n
+            if self.quiet >= self.delay:
+                self.reset()
+        else:
+            self.quiet = 0
+        return block
+
+    def run_chunk(self, x: np.ndarray, offset: int, n: int, send_start: float, send_end: float,
+                  delay_end: float) -> float:
+        # Frames [offset, offset + len(x)) of an n-frame block, in place; returns the echo's peak
+        m = len(x)
+        ramp = self.ramp[:m]
+        np.divide(self.steps[offset + 1:offset + m + 1], n, out=ramp)
+        echo = self.echo[:m]
+        if delay_end == self.delay:
+            # Whole-frame delay: a straight (possibly wrapped) copy out of the buffer
+            start = (self.write - int(self.delay)) % self.capacity
+            self.read_span(start, echo)
+        else:
+            positions = self.positions[:m]
+            np.multiply(ramp, delay_end - self.delay, out=positions)
+            positions += self.delay
+            np.subtract(self.steps[:m] + self.write, positions, out=positions)
+            positions %= self.capacity
+            index, frac, after = self.index[:m], self.frac[:m], self.damped[:m]
+            index[:] = positions
+            np.subtract(positions, index, out=frac[:, 0])
+            np.take(self.buffer, index, axis=0, out=echo)
+            index += 1
+            index %= self.capacity
+            np.take(self.buffer, index, axis=0, out=after)
+            after -= echo
+            after *= frac
+            echo += after
+
+        # What goes back in: the send times the input plus the damped repeats times the feedback
+        send, feedback, damped, feed = self.send[:m], self.feedback[:m], self.damped[:m], self.feed[:m]
+        np.multiply(ramp, send_end - send_start, out=send[:, 0])
+        send += send_start
+        np.multiply(send, C.DELAY_FEEDBACK_MAX - C.DELAY_FEEDBACK_MIN, out=feedback)
+        feedback += C.DELAY_FEEDBACK_MIN
+        self.damp(echo, damped)
+        damped *= feedback
+        np.multiply(x, send, out=feed)
+        feed += damped
+        self.write_span(self.write, feed)
+        self.write = (self.write + m) % self.capacity
+
+        peak = max(float(echo.max()), -float(echo.min())) if m else 0.0
+        np.multiply(echo, C.DELAY_WET, out=damped)
+        x += damped
+        return peak
+
+    def damp(self, x: np.ndarray, out: np.ndarray):
+        # One-pole low-pass of x into out; the last span is zero-padded
+        m = len(x)
+        spans = -(-m // self.span)
+        padded = self.spans_in[:spans]
+        flat = padded.reshape(-1, self.channels)
+        flat[:m] = x
+        flat[m:] = 0.0
+        y = self.spans_out[:spans]
+        np.matmul(self.damping, padded, out=y)
+        ends = self.ends[:spans]
+        ends[0] = self.state
+        ends[1:] = y[:-1, -1:]
+        carry = self.carry[:spans]
+        np.multiply(self.decay, ends, out=carry)
+        y += carry
+        out[:] = y.reshape(-1, self.channels)[:m]
+        self.state[0] = out[m - 1]
+
+    def read_span(self, start: int, out: np.ndarray):
+        first = min(len(out), self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        out[first:] = self.buffer[:len(out) - first]
+
+    def write_span(self, start: int, data: np.ndarray):
+        first = min(len(data), self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        self.buffer[:len(data) - first] = data[first:]
+
+
+class ReverbNode(Node):
+    # Whichever streaming reverb is selected; remembers the mean square of its dry input for the
+    # master bus's RMS match
+
+    def __init__(self, reverb):
+        self.reverb = reverb
+        self.dry_ms: Optional[float] = None
+
+    def process(self, block: np.ndarray, spans: Spans) -> np.ndarray:
+        start, amount = spans['reverb']
+        self.dry_ms = None
+        if amount > 0.0:
+            flat = block.reshape(-1)
+            self.dry_ms = float(np.dot(flat, flat)) / max(1, flat.size)
+        return self.reverb.process(block, amount, out=block, start_amount=start)
+
+    def reset(self):
+        self.reverb.reset()
+
+
+class MasterNode(Node):
+    # MasterBus after the reverb, matched to the reverb's dry input
+
+    def __init__(self, bus, reverb_node: ReverbNode):
+        self.bus = bus
+        self.reverb_node = reverb_node
+
+    def process(self, block: np.ndarray, spans: Spans) -> np.ndarray:
+        return self.bus.process(block, self.reverb_node.dry_ms, out=block)
+
+    def reset(self):
+        self.bus.reset()
+
+
+class DSPGraph:
+    # Named nodes run in a configurable order, one block at a time. Each node is timed, in total
+    # and as a running average over the last few blocks. When the whole graph takes more than
+    # GRAPH_CPU_BUDGET of a block's duration for GRAPH_OVER_BUDGET_BLOCKS blocks in a row, the
+    # costliest node whose recent cost covers the overrun degrades (a cheap node degrading would
+    # cost quality without getting back under budget). A degraded node is restored, newest first,
+    # once the graph's recent cost with the node's cost from before it degraded stays under
+    # GRAPH_RESTORE_HEADROOM of the budget for GRAPH_RESTORE_BLOCKS blocks.
+    # Offline renders turn enforce_budget off: wall-clock time there says nothing about keeping
+    # up, and degrading on it would make the output depend on the machine's load.
+
+    def __init__(self, nodes: Dict[str, Node], order: Sequence[str], sample_rate: int = C.DEFAULT_SAMPLE_RATE,
+                 enforce_budget: bool = True):
+        self.nodes = nodes
+        self.sample_rate = sample_rate
+        self.enforce_budget = enforce_budget
+        self.set_order(order)
+        self.cost_s = {name: 0.0 for name in nodes}
+        self.recent_s = {name: 0.0 for name in nodes}
+        self.smoothing = 2.0 / (C.GRAPH_OVER_BUDGET_BLOCKS + 1)
+        self.blocks = 0
+        self.over_budget = 0
+        self.over_streak = 0
+        self.headroom_streak = 0
+        # Degraded nodes in order, with their recent cost just before they degraded
+        self.degraded: List[str] = []
+        self.full_cost_s: Dict[str, float] = {}
+
+    def set_order(self, order: Sequence[str]):
+        unknown = [name for name in order if name not in self.nodes]
+        if unknown or len(set(order)) != len(order):
+            raise ValueError(f"Invalid node order: {list(order)}")
+        self.order = tuple(order)
+
+    def leads(self, name: str, passive: Iterable[str] = ()) -> bool:
+        # Whether name comes before every node not listed as passive
+        for node in self.order:
+            if node == name:
+                return True
+            if node not in passive:
+                return False
+        return False
+
+    def process(self, block: np.ndarray, spans: Spans, skip: Iterable[str] = ()) -> np.ndarray:
+        total = 0.0
+        for name in self.order:
+            if name in skip:
+                continue
+            t0 = time.perf_counter()
+            block = self.nodes[name].process(block, spans)
+            elapsed = time.perf_counter() - t0
+            self.cost_s[name] += elapsed
+            self.recent_s[name] += self.smoothing * (elapsed - self.recent_s[name])
+            total += elapsed
+        self.blocks += 1
+        if self.enforce_budget:
+            self.check_budget(total, len(block))
+        return block
+
+    def check_budget(self, total: float, frames: int):
+        budget = C.GRAPH_CPU_BUDGET * frames / self.sample_rate
+        if total <= budget:
+            self.over_streak = 0
+            self.check_headroom(budget)
+            return
+        self.over_budget += 1
+        self.over_streak += 1
+        self.headroom_streak = 0
+        if self.over_streak < C.GRAPH_OVER_BUDGET_BLOCKS:
+            return
+        self.over_streak = 0
+        overrun = sum(self.recent_s[name] for name in self.order) - budget
+        for name in sorted(self.order, key=lambda n: self.recent_s[n], reverse=True):
+            if self.recent_s[name] < overrun:
+                break
+            cost = self.recent_s[name]
+            if self.nodes[name].degrade():
+                self.degraded.append(name)
+                self.full_cost_s[name] = cost
+                break
+
+    def check_headroom(self, budget: float):
+        # Restore the last node degraded once the graph would fit with it back at full cost
+        if not self.degraded:
+            return
+        name = self.degraded[-1]
+        recent = sum(self.recent_s[n] for n in self.order)
+        if recent - self.recent_s[name] + self.full_cost_s[name] > C.GRAPH_RESTORE_HEADROOM * budget:
+            self.headroom_streak = 0
+            return
+        self.headroom_streak += 1
+        if self.headroom_streak >= C.GRAPH_RESTORE_BLOCKS:
+            self.headroom_streak = 0
+            if self.nodes[name].restore():
+                self.degraded.pop()
+                del self.full_cost_s[name]
+
+    def reset(self):
+        for node in self.nodes.values():
+            node.reset()
+
+    def get_stats(self) -> Dict:
+        # Mean time per block of each node (microseconds), blocks over budget and degraded nodes
+        blocks = max(1, self.blocks)
+        return {
+            'order': list(self.order),
+            'node_us': {name: self.cost_s[name] * 1e6 / blocks for name in self.order},
+            'blocks': self.blocks,
+            'over_budget': self.over_budget,
+            'degraded': list(self.degraded),
+        }
@@ -0,0 +1,190 @@
+import threading
+import numpy as np
+from pydub import AudioSegment
+from scipy import signal
+from typing import Tuple, Optional
+from modules import constants as C
+from audio.audio_sink import segment_to_array, float_to_int16
+from audio.reverb_effect import soft_clip, preset_for_amount, wet_dry_gains, WetDryGlide
+from audio.master_bus import MasterBus, dry_levels
+from audio.render_scheduler import check_cancelled
+
+
+# Base delay-line lengths in ms (mutually prime-ish so echoes do not pile up)
+FDN_BASE_DELAYS_MS = [29.7, 37.1, 41.1, 43.7, 53.3, 59.9, 67.7, 73.1]
+
+
+class FDNReverb:
+    # Low-CPU algorithmic reverb: an 8-line feedback delay network with a Householder
+    # feedback matrix and one-pole damping per line. Follows the same apply(audio, amount)
+    # contract and room/hall/plate presets as ReverbEffect, and can also run block by block.
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS):
+        self.types = {
+            'room': {'rt60_scale': 0.8, 'room_size': 0.3, 'damping': 0.7},
+            'hall': {'rt60_scale': 1.4, 'room_size': 0.7, 'damping': 0.5},
+            'plate': {'rt60_scale': 0.6, 'room_size': 0.4, 'damping': 0.8},
+        }
+        self.lines = len(FDN_BASE_DELAYS_MS)
+        # Alternating input / output taps decorrelate the two output channels
+        self.input_taps = np.array([1, -1, 1, -1, 1, -1, 1, -1], dtype=np.float32)
+        self.output_taps = np.array([
+            [1, 1, -1, -1, 1, 1, -1, -1],
+            [1, -1, -1, 1, 1, -1, -1, 1],
+        ], dtype=np.float32) / np.sqrt(self.lines)
+        self.channels = channels
+        self.glide = WetDryGlide()
+        self.configure(sample_rate)
+
+    def configure(self, sample_rate: int):
+        # Delay memory is sized for the largest preset so switching presets never reallocates
+        self.sample_rate = sample_rate
+        largest = max(cfg['room_size'] for cfg in self.types.values())
+        self.size = int(max(FDN_BASE_DELAYS_MS) * (0.5 + largest) * sample_rate / 1000) + 1
+        # Stored twice back to back so any delayed read is one contiguous slice per line
+        self.buffer = np.zeros((self.lines, 2 * self.size), dtype=np.float32)
+        self.delayed = np.zeros((self.lines, self.size), dtype=np.float32)
+        nyq = sample_rate / 2.0
+        self.hp_sos = signal.butter(2, min(0.99, 120.0 / nyq), 'high', output='sos')
+        self.reset()
+
+    def reset(self):
+        self.buffer.fill(0)
+        self.write_index = 0
+        self.lp_state = np.zeros((self.lines, 1), dtype=np.float32)
+        self.hp_zi = np.zeros((self.hp_sos.shape[0], 2, self.channels))
+        self.active = False
+        self.amount = 0.0
+        self.tail_left = 0
+
+    def pick_type(self, reverb_amount: float) -> str:
+        return preset_for_amount(reverb_amount)
+
+    def wet_dry(self, amount: float) -> Tuple[float, float]:
+        return wet_dry_gains(amount)
+
+    def line_settings(self, reverb_amount: float):
+        # Delay lengths from the preset's room size, per-line gains from the target RT60
+        cfg = self.types[self.pick_type(reverb_amount)]
+        delays = (np.array(FDN_BASE_DELAYS_MS) * (0.5 + cfg['room_size']) * self.sample_rate / 1000).astype(np.int64)
+        rt60 = float(np.interp(reverb_amount, [0.0, 2.0], [0.3, 3.0])) * cfg['rt60_scale']
+        gains = 10.0 ** (-3.0 * delays / (rt60 * self.sample_rate))
+        return delays, gains.astype(np.float32), cfg['damping'] * 0.6
+
+    def process(self, x: np.ndarray, reverb_amount: float, out: Optional[np.ndarray] = None,
+                start_amount: Optional[float] = None) -> np.ndarray:
+        # x is a (frames, channels) float32 block; state carries across calls. The mix is written
+        # into out when given (out may be x itself), gliding from start_amount's when given.
+        # When the amount drops to 0 the network stops taking input and rings out over the dry
+        # signal for tail_s before it is cleared.
+        if reverb_amount <= 0.0:
+            if self.active:
+                return self.release(x, out, start_amount)
+            return x
+        self.active = True
+        self.amount = reverb_amount
+        self.tail_left = 0
+
+        mono = x.mean(axis=1) if x.shape[1] > 1 else x[:, 0]
+        wet = self.run_network(mono, reverb_amount, x.shape[1])
+        wet_gain, dry_gain = self.glide.gains(start_amount, reverb_amount, len(x))
+        if out is None:
+            out = np.empty_like(x)
+        wet *= wet_gain
+        np.multiply(x, dry_gain, out=out)
+        out += wet
+        return soft_clip(out)
+
+    def release(self, x: np.ndarray, out: Optional[np.ndarray], start_amount: Optional[float] = None) -> np.ndarray:
+        # Silence in at the last amount's settings; the remaining tail is added to the dry block,
+        # whose gain glides up to 1
+        if self.tail_left <= 0:
+            self.tail_left = int(self.tail_s(self.amount, self.sample_rate) * self.sample_rate)
+        wet = self.run_network(np.zeros(len(x), dtype=np.float32), self.amount, x.shape[1])
+        wet *= self.wet_dry(self.amount)[0]
+        if out is None:
+            out = np.empty_like(x)
+        np.multiply(x, self.glide.gains(start_amount, 0.0, len(x))[1], out=out)
+        out += wet
+        self.tail_left -= len(x)
+        if self.tail_left <= 0:
+            self.reset()
+        return out
+
+    def run_network(self, mono: np.ndarray, reverb_amount: float, channels: int) -> np.ndarray:
+        # Wet output (frames, channels) of the network fed a mono block, high-passed
+        delays, gains, damp = self.line_settings(reverb_amount)
+        wet = np.empty((len(mono), 2), dtype=np.float32)
+
+        # Work in chunks no longer than the shortest delay: every sample read in a chunk
+        # was written before it started, so the whole chunk is computed with array ops
+        chunk = int(delays.min())
+        b = np.array([1.0 - damp], dtype=np.float32)
+        a = np.array([1.0, -damp], dtype=np.float32)
+        for start in range(0, len(mono), chunk):
+            n = min(chunk, len(mono) - start)
+            delayed = self.delayed[:, :n]
+            for line, read_index in enumerate((self.write_index - delays) % self.size):
+                delayed[line] = self.buffer[line, read_index:read_index + n]
+            delayed, self.lp_state = signal.lfilter(b, a, delayed, axis=1, zi=self.lp_state)
+            delayed *= gains[:, None]
+
+            wet[start:start + n] = (self.output_taps @ delayed).T
+            feedback = delayed - (2.0 / self.lines) * delayed.sum(axis=0)
+            feedback += self.input_taps[:, None] * mono[start:start + n]
+            self.write(feedback)
+
+        if channels != 2:
+            wet = wet.mean(axis=1, keepdims=True)
+        k = wet.shape[1]
+        wet, self.hp_zi[:, :, :k] = signal.sosfilt(self.hp_sos, wet, axis=0, zi=self.hp_zi[:, :, :k])
+        return wet
+
+    def write(self, block: np.ndarray):
+        # Append to every line, keeping both copies of the ring in sync
+        n = block.shape[1]
+        first = min(n, self.size - self.write_index)
+        for offset, part in ((self.write_index, block[:, :first]), (0, block[:, first:])):
+            width = part.shape[1]
+            if width:
+                self.buffer[:, offset:offset + width] = part
+                self.buffer[:, offset + self.size:offset + self.size + width] = part
+        self.write_index = (self.write_index + n) % self.size
+
+    def apply(self, audio: AudioSegment, reverb_amount: float) -> AudioSegment:
+        # Whole-track contract shared with ReverbEffect
+        if reverb_amount <= 0.0:
+            return audio
+        y = self.apply_array(segment_to_array(audio), reverb_amount, audio.frame_rate)
+        return audio._spawn(float_to_int16(y).tobytes())
+
+    def apply_array(self, x: np.ndarray, reverb_amount: float, sr: int, gain: float = 1.0,
+                    normalize: bool = True, cancel: Optional[threading.Event] = None) -> np.ndarray:
+        # Whole float32 (frames, channels) array through the network from an empty state; x is only read.
+        # normalize runs the result through a MasterBus matched to the (gained) dry input;
+        # False leaves the level stages to the caller. The array goes through in segments of
+        # REVERB_RENDER_SEGMENT_S (state carries across), and a set cancel event stops it between
+        # them with RenderCancelled.
+        if reverb_amount <= 0.0 or gain != 1.0:
+            x = x * np.float32(gain)
+        if reverb_amount <= 0.0:
+            return x
+        if sr != self.sample_rate:
+            self.configure(sr)
+        self.reset()
+        y = np.empty_like(x)
+        segment = max(1, int(C.REVERB_RENDER_SEGMENT_S * sr))
+        try:
+            for start in range(0, len(x), segment):
+                check_cancelled(cancel)
+                self.process(x[start:start + segment], reverb_amount, out=y[start:start + segment])
+        finally:
+            self.reset()
+        if normalize:
+            MasterBus(sr, y.shape[1], C.MASTER_RENDER_BLOCK).run(y, dry_levels(x))
+        return y
+
+    def tail_s(self, reverb_amount: float, sr: int) -> float:
+        # Time for the network to ring down by 120 dB (twice the RT60)
+        rt60 = float(np.interp(reverb_amount, [0.0, 2.0], [0.3, 3.0]))
+        return 2.0 * rt60 * self.types[self.pick_type(reverb_amount)]['rt60_scale']
@@ -0,0 +1,58 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+from typing import Callable
+from modules import constants as C
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()[:16]
+
+
+class IRBank:
+    # Persistent store of precomputed impulse responses as .npy files, memory-mapped on load.
+    # Names encode form, sample rate, block size and a content hash, so stale entries are never reused.
+
+    def __init__(self, directory: str = C.IR_BANK_DIR):
+        self.directory = directory
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.enabled = True
+        except OSError:
+            # Read-only home or similar; everything is simply rebuilt in memory
+            self.enabled = False
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def get(self, name: str, build: Callable[[], np.ndarray]) -> np.ndarray:
+        # Map the stored array if present, otherwise build it and store it for next time
+        if not self.enabled:
+            return build()
+        path = self.path_for(name)
+        if os.path.exists(path):
+            try:
+                return np.load(path, mmap_mode='r')
+            except (OSError, ValueError):
+                pass
+        value = build()
+        self.save(path, value)
+        return value
+
+    def save(self, path: str, value: np.ndarray):
+        # Write to a temp file of its own and rename so a concurrent reader never maps a
+        # half-written file, and two threads saving the same entry never share a temp file
+        try:
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, value)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
@@ -0,0 +1,22 @@
+import numpy as np
+from typing import Callable, Hashable, Optional
+from modules import constants as C
+from audio.lru_cache import ByteLRUCache
+
+
+class IRCache(ByteLRUCache):
+    # LRU cache for impulse responses (time-domain or partitioned spectra), capped in bytes
+
+    def __init__(self, max_bytes: int = C.IR_CACHE_MAX_BYTES):
+        super().__init__(max_bytes)
+
+    def get(self, key: Hashable, build: Callable[[], np.ndarray]) -> np.ndarray:
+        # Return the cached array for key, building and inserting it on a miss
+        value = self.lookup(key)
+        if value is not None:
+            return value
+        return self.insert(key, build(), replace=False)
+
+    def peek(self, key: Hashable) -> Optional[np.ndarray]:
+        # The cached array for key, or None without building it
+        return self.lookup(key, count_miss=False)
@@ -0,0 +1,71 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class ByteLRUCache:
+    # LRU cache of arrays capped in bytes, shared by the IR and render caches. Thread-safe; the
+    # newest entry is always kept, so a single oversized entry still goes in.
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key: Hashable, count_miss: bool = True) -> Optional[np.ndarray]:
+        # The cached array for key (now the most recently used), or None
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def insert(self, key: Hashable, value: np.ndarray, replace: bool = True) -> np.ndarray:
+        # Store value under key and return what is stored there: with replace off, an entry
+        # another thread stored first wins
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                if not replace:
+                    self.entries[key] = old
+                    return old
+                self.bytes_used -= old.nbytes
+            self.entries[key] = value
+            self.bytes_used += value.nbytes
+            self.evict()
+            return value
+
+    def evict(self):
+        # Drop least recently used entries until under budget (always keep the newest)
+        while self.bytes_used > self.max_bytes and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.bytes_used -= old.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes_used = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes_used,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
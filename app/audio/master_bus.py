@@ -0,0 +1,224 @@
+import numpy as np
+from scipy import ndimage
+from typing import Optional, Tuple
+from modules import constants as C
+
+
+def block_energy(x: np.ndarray, block_size: int, offset: int = 0) -> Tuple[int, np.ndarray]:
+    # Sum of squares (all channels) of x per block of a grid of block_size frames on which x[0]
+    # is frame offset. Returns the index of the first block touched and one float64 sum per block;
+    # blocks cut by either end of x only count the frames inside it.
+    head = min(len(x), (-offset) % block_size)
+    full = (len(x) - head) // block_size
+    body = x[head:head + full * block_size].reshape(full, block_size * x.shape[1])
+
+    def edge(part: np.ndarray) -> list:
+        flat = part.reshape(-1).astype(np.float64)
+        return [np.dot(flat, flat)] if len(part) else []
+
+    sums = np.einsum('ij,ij->i', body, body, dtype=np.float64)
+    return offset // block_size, np.concatenate([edge(x[:head]), sums, edge(x[head + full * block_size:])])
+
+
+def block_counts(frames: int, block_size: int, offset: int = 0) -> np.ndarray:
+    # Frames of a signal of frames, starting at frame offset of the grid, in each block it touches
+    # (the blocks block_energy returns sums for)
+    head = min(frames, (-offset) % block_size)
+    full = (frames - head) // block_size
+    rest = frames - head - full * block_size
+    return np.array(([head] if head else []) + [block_size] * full + ([rest] if rest else []), dtype=np.int64)
+
+
+def mean_squares(sums: np.ndarray, frames: int, channels: int, block_size: int, offset: int = 0) -> np.ndarray:
+    # Block sums from block_energy over a signal of frames starting at grid frame offset -> mean
+    # square per block
+    counts = block_counts(frames, block_size, offset).astype(np.float64) * channels
+    return sums / np.maximum(counts, 1.0)
+
+
+def dry_levels(x: np.ndarray, gain: float = 1.0, block_size: int = C.MASTER_RENDER_BLOCK,
+               offset: int = 0) -> np.ndarray:
+    # Mean square per block of the dry signal x after gain, the reference for MasterBus.run;
+    # offset is the frame of x[0] on the block grid
+    _, sums = block_energy(x, block_size, offset)
+    return mean_squares(sums, len(x), x.shape[1], block_size, offset) * (gain * gain)
+
+
+class MasterBus:
+    # Streaming level stages for the output, one block at a time with bounded latency:
+    #   - RMS match: exponentially weighted mean squares of the mix and of the dry signal it was
+    #     made from (over about MASTER_RMS_WINDOW_S); the mix is turned down, never up, so the
+    #     reverb doesn't make it louder than the dry input. The gain glides across each block.
+    #     Whole renders (run) compare plain sums over the last MASTER_RMS_WINDOW_S of blocks
+    #     instead, so a gain depends only on a bounded stretch of the render behind it.
+    #   - Look-ahead peak limiter: the output is delayed by MASTER_LOOKAHEAD_MS, and each frame's
+    #     gain is the minimum needed over the look-ahead and a MASTER_RELEASE_MS hold behind it,
+    #     smoothed by a moving average as long as the look-ahead. The average covers only frames
+    #     whose minimum included this one, so no frame can leave above MASTER_CEILING.
+    # All history is kept in fixed buffers; nothing looks at more than the current block.
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = C.STREAM_CHANNELS,
+                 block_size: int = C.STREAM_BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.lookahead = max(1, int(C.MASTER_LOOKAHEAD_MS * sample_rate / 1000))
+        self.hold = int(C.MASTER_RELEASE_MS * sample_rate / 1000)
+        self.ceiling = C.MASTER_CEILING
+        self.rms_window = C.MASTER_RMS_WINDOW_S * sample_rate
+        self.allocate(block_size)
+        self.reset()
+
+    def allocate(self, frames: int):
+        # Block scratch with the history each stage needs in front of it
+        L, H = self.lookahead, self.hold
+        self.capacity = frames
+        self.delay = np.zeros((L + frames, self.channels), dtype=np.float32)
+        self.required = np.ones(L + H + frames, dtype=np.float32)
+        self.held = np.ones(L - 1 + frames, dtype=np.float32)
+        self.scratch = np.empty(L + H + frames, dtype=np.float32)
+        self.smoothed = np.empty(L - 1 + frames, dtype=np.float32)
+        self.ramp = np.arange(1, frames + 1, dtype=np.float32) / frames
+        self.peak = np.empty(frames, dtype=np.float32)
+
+    def reset(self):
+        # Empty the look-ahead and forget the levels (seek, new track)
+        self.delay.fill(0.0)
+        self.required.fill(1.0)
+        self.held.fill(1.0)
+        self.mix_level: Optional[float] = None
+        self.dry_level: Optional[float] = None
+        self.match_gain = 1.0
+
+    @property
+    def latency(self) -> int:
+        # Frames by which the output trails the input
+        return self.lookahead
+
+    def process(self, x: np.ndarray, dry_ms: Optional[float] = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # x is a (frames, channels) float32 block of the mix; dry_ms the mean square of the dry
+        # signal behind it, or None when there is nothing to match (reverb off). Returns the block
+        # latency frames behind, written into out when given (out may be x itself).
+        if len(x) > self.capacity:
+            self.grow(len(x))
+        self.match(x, dry_ms)
+        return self.limit(x, out)
+
+    def match(self, x: np.ndarray, dry_ms: Optional[float]):
+        # Running RMS match, in place
+        n = len(x)
+        if dry_ms is None:
+            self.mix_level = self.dry_level = None
+            target = 1.0
+        else:
+            flat = np.ascontiguousarray(x).reshape(-1)
+            mix_ms = float(np.dot(flat, flat)) / max(1, flat.size)
+            if self.mix_level is None:
+                self.mix_level, self.dry_level = mix_ms, dry_ms
+            else:
+                alpha = 1.0 - np.exp(-n / self.rms_window)
+                self.mix_level += alpha * (mix_ms - self.mix_level)
+                self.dry_level += alpha * (dry_ms - self.dry_level)
+            target = min(1.0, float(np.sqrt((self.dry_level + 1e-12) / (self.mix_level + 1e-12))))
+        self.glide(x, target)
+
+    def glide(self, x: np.ndarray, target: float):
+        # Match gain from where the last block left it to target across x, in place
+        n = len(x)
+        if target == 1.0 and self.match_gain == 1.0:
+            return
+        if n == self.capacity:
+            ramp = self.ramp
+        else:
+            ramp = np.arange(1, n + 1, dtype=np.float32) / n
+        x *= (self.match_gain + (target - self.match_gain) * ramp)[:, None]
+        self.match_gain = target
+
+    def limit(self, x: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Look-ahead limiter: emits the n frames that entered latency frames ago
+        n, L, H = len(x), self.lookahead, self.hold
+        window = H + L
+
+        # Gain each new frame needs on its own, behind the history the hold and look-ahead reach
+        required = self.required[:L + H + n]
+        # (per channel: a max across the short channel axis is far slower)
+        peak = np.abs(x[:, 0], out=self.peak[:n])
+        for c in range(1, x.shape[1]):
+            np.maximum(peak, np.abs(x[:, c]), out=peak)
+        np.maximum(peak, self.ceiling, out=peak)
+        np.divide(self.ceiling, peak, out=required[L + H:])
+
+        # Minimum over frames [k - H, k + L - 1] for each output frame k. The filter's window is
+        # centred, so the window starting at m is read at m + window // 2.
+        minimum = self.scratch[:L + H + n]
+        ndimage.minimum_filter1d(required, window, output=minimum, mode='nearest')
+        held = self.held[:L - 1 + n]
+        held[L - 1:] = minimum[window // 2:window // 2 + n]
+
+        # Average of the last L minima (L - 1 of them from earlier blocks)
+        smoothed = self.smoothed[:L - 1 + n]
+        ndimage.uniform_filter1d(held, L, output=smoothed, mode='nearest')
+        gain = smoothed[L // 2:L // 2 + n]
+
+        # Through the delay line, then keep the tails for the next block
+        delay = self.delay[:L + n]
+        delay[L:] = x
+        if out is None:
+            out = np.empty_like(x)
+        np.multiply(delay[:n], gain[:, None], out=out)
+        delay[:L] = delay[n:n + L]
+        required[:L + H] = required[n:n + L + H]
+        if L > 1:
+            held[:L - 1] = held[n:n + L - 1]
+        return out
+
+    def run(self, y: np.ndarray, dry_ms: Optional[np.ndarray] = None, offset: int = 0) -> np.ndarray:
+        # Whole array through the bus block by block from an empty state, in place, with the
+        # latency taken back out. offset is the frame of y[0] on the whole render's block grid
+        # when y is a chunk of it; dry_ms holds one mean square per grid block y touches (see
+        # dry_levels), or None to only limit. A chunk with MASTER_RMS_WINDOW_S of pre-roll comes
+        # out with the gains the whole render gives it.
+        self.reset()
+        L = self.lookahead
+        counts = block_counts(len(y), self.block_size, offset)
+        targets = None if dry_ms is None else self.window_targets(y, dry_ms, counts, offset)
+        start = 0
+        for i, n in enumerate(counts):
+            block = y[start:start + n]
+            if targets is not None:
+                self.glide(block, float(targets[i]))
+            limited = self.limit(block)
+            # Output trails by L frames; the first L are the empty delay line
+            a, b = start - L, start - L + len(limited)
+            if b > 0:
+                y[max(0, a):b] = limited[max(0, -a):]
+            start += n
+        flush = self.limit(np.zeros((L, y.shape[1]), dtype=np.float32))
+        y[max(0, len(y) - L):] = flush[max(0, L - len(y)):]
+        self.reset()
+        return y
+
+    def window_targets(self, y: np.ndarray, dry_ms: np.ndarray, counts: np.ndarray, offset: int) -> np.ndarray:
+        # Match gain per grid block of y: dry against mix mean square over the window of blocks
+        # ending with it
+        _, mix = block_energy(y, self.block_size, offset)
+        weights = counts.astype(np.float64) * y.shape[1]
+        window = max(1, int(round(self.rms_window / self.block_size)))
+
+        def moving(v: np.ndarray) -> np.ndarray:
+            total = np.concatenate([[0.0], np.cumsum(v)])
+            ends = np.arange(1, len(v) + 1)
+            return total[ends] - total[np.maximum(0, ends - window)]
+
+        frames = np.maximum(moving(weights), 1.0)
+        dry, wet = moving(dry_ms * weights) / frames, moving(mix) / frames
+        return np.minimum(1.0, np.sqrt((dry + 1e-12) / (wet + 1e-12)))
+
+    def grow(self, frames: int):
+        # A sink asked for a block bigger than planned: larger buffers, same history
+        L, H = self.lookahead, self.hold
+        delay, required, held = self.delay[:L].copy(), self.required[:L + H].copy(), self.held[:L - 1].copy()
+        self.allocate(frames)
+        self.delay[:L] = delay
+        self.required[:L + H] = required
+        self.held[:L - 1] = held
@@ -0,0 +1,133 @@
+import os
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from modules import constants as C
+from audio.resampler import PolyphaseResampler
+from audio.render_scheduler import check_cancelled
+from audio.master_bus import block_energy, mean_squares
+from audio.dsp_graph import dj_filter_sos
+
+
+# Per-process effects engine for pool workers, built on first use
+worker_effects = None
+
+
+def render_chunk(x: np.ndarray, sample_rate: int, params: Dict, lead: int, length: int, out0: int,
+                 reverb_engine: str) -> Tuple[np.ndarray, Optional[Tuple[int, np.ndarray]]]:
+    # Runs in a pool worker: the window x through pitch and the gain / reverb mix, stopping short
+    # of the master bus. Returns output frames [lead, lead + length), which are frames out0 on of
+    # the whole render, and with reverb the gained dry input's block_energy over them on the
+    # bus's block grid, for the parent's RMS match.
+    global worker_effects
+    from audio.audio_effects import AudioEffects
+    if worker_effects is None:
+        worker_effects = AudioEffects(reverb_engine, 'varispeed')
+    effects = worker_effects
+    effects.set_reverb_engine(reverb_engine)
+    volume = params.get('volume', C.DEFAULT_VOLUME)
+    reverb = params.get('reverb', C.DEFAULT_REVERB)
+    target_sample_rate = params.get('sample_rate', C.DEFAULT_SAMPLE_RATE)
+
+    y = effects.apply_pitch(x, sample_rate, params.get('pitch', C.DEFAULT_PITCH), target_sample_rate)
+    y = effects.apply_filter(y, params.get('filter', C.DEFAULT_FILTER), target_sample_rate, copy=y is x)
+    energy = None
+    if reverb > 0.0:
+        gain = effects.volume_gain(volume)
+        first, sums = block_energy(y[lead:lead + length], C.MASTER_RENDER_BLOCK, out0)
+        energy = (first, sums * (gain * gain))
+        y = effects.apply_reverb(y, reverb, target_sample_rate, gain)
+    else:
+        y = effects.apply_volume(y, volume, copy=y is x)
+    out = y[lead:lead + length]
+    if len(out) < length:
+        out = np.concatenate([out, np.zeros((length - len(out), out.shape[1]), dtype=np.float32)])
+    return out, energy
+
+
+class ParallelRenderer:
+    # Whole-track renders split into chunks across a process pool. Every chunk is rendered with
+    # enough context on each side for the reverb tail and the resampler filter, and starts on a
+    # source frame that lands exactly on an output frame, so the chunks line up with the serial
+    # render. The master bus is sequential and runs once over the joined result, matched to the
+    # dry levels the chunks report.
+    # Keylock renders keep their phase vocoder state across the whole track and stay serial.
+
+    def __init__(self, workers: Optional[int] = C.PARALLEL_RENDER_WORKERS,
+                 chunk_s: float = C.PARALLEL_RENDER_CHUNK_S):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_s = chunk_s
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def pool(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked: the parent may be running audio and GUI threads
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def render(self, effects, x: np.ndarray, sample_rate: int, params: Dict,
+               cancel: Optional[threading.Event] = None) -> np.ndarray:
+        # Same contract as AudioEffects.process (whose engine settings are used)
+        pitch = params.get('pitch', C.DEFAULT_PITCH)
+        reverb = params.get('reverb', C.DEFAULT_REVERB)
+        target_sample_rate = params.get('sample_rate', C.DEFAULT_SAMPLE_RATE)
+        resamples = abs(pitch - 1.0) >= 0.001 or sample_rate != target_sample_rate
+        if self.workers == 1 or (resamples and effects.pitch_mode == 'keylock'):
+            return effects.process(x, sample_rate, params, cancel)
+
+        # Output frame of source frame s is s * up / down, exact on multiples of down
+        if resamples:
+            step = pitch * sample_rate / target_sample_rate
+            ratio = PolyphaseResampler(x.shape[1], C.PITCH_RESAMPLER_TIER).ratio(step)
+            up, down = ratio.denominator, ratio.numerator
+            # The serial resampler's length, from the same ratio
+            total_out = len(x) * up // down
+            context = int(np.ceil(10 * max(up, down) / up)) + 1
+        else:
+            step, up, down, total_out, context = 1.0, 1, 1, len(x), 0
+        if reverb > 0.0:
+            context += int(np.ceil(effects.reverb.tail_s(reverb, target_sample_rate) * target_sample_rate * step))
+        if dj_filter_sos(params.get('filter', C.DEFAULT_FILTER), target_sample_rate) is not None:
+            # For the filter's state to settle before the chunk starts
+            context += int(C.FILTER_SETTLE_S * target_sample_rate * step)
+        context = -(-context // down) * down
+
+        spans = self.spans(len(x), sample_rate, down)
+        if len(spans) < 2:
+            return effects.process(x, sample_rate, params, cancel)
+        futures = []
+        for s0, s1 in spans:
+            a, b = max(0, s0 - context), min(len(x), s1 + context)
+            out0 = s0 * up // down
+            out1 = total_out if s1 == len(x) else s1 * up // down
+            futures.append((out0, self.pool().submit(render_chunk, np.ascontiguousarray(x[a:b]), sample_rate, params,
+                                                     out0 - a * up // down, out1 - out0, out0, effects.reverb_engine)))
+
+        y = np.empty((total_out, x.shape[1]), dtype=np.float32)
+        sums = np.zeros(-(-total_out // C.MASTER_RENDER_BLOCK), dtype=np.float64)
+        try:
+            for out0, future in futures:
+                check_cancelled(cancel)
+                block, energy = future.result()
+                y[out0:out0 + len(block)] = block
+                if energy is not None:
+                    first, chunk_sums = energy
+                    sums[first:first + len(chunk_sums)] += chunk_sums
+        finally:
+            for _, future in futures:
+                future.cancel()
+        dry = mean_squares(sums, total_out, y.shape[1], C.MASTER_RENDER_BLOCK) if reverb > 0.0 else None
+        return effects.apply_master(y, target_sample_rate, dry)
+
+    def spans(self, frames: int, sample_rate: int, quantum: int) -> List[Tuple[int, int]]:
+        # Source ranges of at most chunk_s, at least one per worker, starting on multiples of quantum
+        size = min(int(self.chunk_s * sample_rate), -(-frames // self.workers))
+        size = max(quantum, -(-size // quantum) * quantum)
+        return [(s, min(frames, s + size)) for s in range(0, frames, size)]
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,79 @@
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+
+class ParameterMailbox:
+    # Latest-value channel carrying parameter values from the control side (tracking loop, GUI
+    # reset, volume gesture) to the audio renderer. Producers update the pending values and publish
+    # a fresh snapshot under a lock, so concurrent posts never publish a half-updated dict. The
+    # single consumer only ever reads the snapshot reference; reference assignment is atomic in
+    # CPython, so the renderer never takes the lock or waits, and a burst of updates collapses to
+    # the newest.
+
+    def __init__(self, defaults: Dict[str, float]):
+        self.pending = dict(defaults)
+        self.sequence = 0
+        self.snapshot: Tuple[int, Dict[str, float]] = (0, dict(defaults))
+        self.producer_lock = threading.Lock()
+
+    def post(self, name: str, value: float):
+        # Producer side; unknown names are ignored like the old params dict did
+        if name in self.pending:
+            with self.producer_lock:
+                self.pending[name] = float(value)
+                self.publish()
+
+    def post_many(self, values: Dict[str, float]):
+        with self.producer_lock:
+            changed = False
+            for name, value in values.items():
+                if name in self.pending:
+                    self.pending[name] = float(value)
+                    changed = True
+            if changed:
+                self.publish()
+
+    def publish(self):
+        # Called with producer_lock held. Published dicts are never mutated again, so the reader
+        # can use them without copying.
+        self.sequence += 1
+        self.snapshot = (self.sequence, dict(self.pending))
+
+    def read(self) -> Tuple[int, Dict[str, float]]:
+        # Consumer side: (sequence number, latest values)
+        return self.snapshot
+
+
+class ParameterRamp:
+    # Renderer-side state that turns the newest mailbox values into per-block linear ramps, so a
+    # jump from the tracker is spread over one block instead of stepping (zipper noise)
+
+    def __init__(self, defaults: Dict[str, float], block_size: int):
+        self.current = dict(defaults)
+        self.block_size = block_size
+        self.ramp = (np.arange(1, block_size + 1) / block_size).astype(np.float32)
+
+    def next(self, targets: Dict[str, float]) -> Dict[str, Tuple[float, float]]:
+        # (start, end) for each parameter over the coming block; end becomes the new current value
+        spans = {}
+        for name, end in targets.items():
+            spans[name] = (self.current.get(name, end), end)
+            self.current[name] = end
+        return spans
+
+    def snap(self, targets: Dict[str, float]):
+        # Jump straight to the targets (after a seek there is nothing to ramp from)
+        self.current.update(targets)
+
+    def curve(self, start: float, end: float, frames: int, out: Optional[np.ndarray] = None):
+        # Per-frame values from just after start to exactly end; a scalar when nothing moves.
+        # With out (at least `frames` long) the ramp is written there instead of a new array.
+        if start == end:
+            return start
+        ramp = self.ramp if frames == self.block_size else np.arange(1, frames + 1, dtype=np.float32) / frames
+        if out is None:
+            return (start + (end - start) * ramp)[:, None]
+        values = np.multiply(ramp, end - start, out=out[:frames])
+        values += start
+        return values[:, None]
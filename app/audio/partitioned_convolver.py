@@ -0,0 +1,118 @@
+import numpy as np
+from scipy import fft
+from typing import Optional
+from modules import constants as C
+
+
+def partition_ir(ir: np.ndarray, block_size: int) -> np.ndarray:
+    # Split the IR into block-sized pieces and precompute each piece's spectrum -> (P, B + 1) complex64
+    n_parts = max(1, -(-len(ir) // block_size))
+    pieces = np.zeros(n_parts * block_size, dtype=np.float32)
+    pieces[:len(ir)] = ir
+    padded = np.zeros((n_parts, 2 * block_size), dtype=np.float32)
+    padded[:, :block_size] = pieces.reshape(n_parts, block_size)
+    return fft.rfft(padded, axis=1).astype(np.complex64)
+
+
+class PartitionedConvolver:
+    # Uniformly-partitioned overlap-save convolution. The IR is split into block-sized
+    # partitions whose spectra are precomputed, and a frequency-domain delay line (FDL)
+    # keeps the spectra of recent input blocks, so each block costs one forward FFT,
+    # P complex multiply-adds and one inverse FFT regardless of track length.
+
+    def __init__(self, block_size: int = C.STREAM_BLOCK_SIZE, channels: int = C.STREAM_CHANNELS):
+        self.block_size = block_size
+        self.channels = channels
+        self.bins = block_size + 1
+        self.partitions: Optional[np.ndarray] = None
+        self.previous_partitions: Optional[np.ndarray] = None
+        self.fade_in = ((np.arange(block_size) + 0.5) / block_size).astype(np.float32)[:, None]
+        self.input_buffer = np.zeros((2 * block_size, channels), dtype=np.float32)
+        self.in_fifo = np.zeros((0, channels), dtype=np.float32)
+        self.out_fifo = np.zeros((0, channels), dtype=np.float32)
+        self.fdl: Optional[np.ndarray] = None
+        self.spectrum = np.zeros((self.bins, channels), dtype=np.complex64)
+        self.allocate(1)
+
+    def allocate(self, max_partitions: int):
+        # The FDL is stored twice back to back so the newest P spectra are always one contiguous view.
+        # Growing it keeps the existing input history so the tail is not cut.
+        fdl = np.zeros((2 * max_partitions, self.bins, self.channels), dtype=np.complex64)
+        if self.fdl is not None:
+            recent = self.fdl[self.fdl_index:self.fdl_index + self.max_partitions]
+            fdl[:len(recent)] = recent
+            fdl[max_partitions:max_partitions + len(recent)] = recent
+        self.fdl = fdl
+        self.fdl_index = 0
+        self.max_partitions = max_partitions
+
+    def reset(self):
+        self.fdl.fill(0)
+        self.input_buffer.fill(0)
+        self.in_fifo = self.in_fifo[:0]
+        self.out_fifo = self.out_fifo[:0]
+        self.previous_partitions = None
+
+    def set_ir(self, ir: np.ndarray):
+        self.set_partitions(partition_ir(ir, self.block_size))
+
+    def set_partitions(self, partitions: np.ndarray):
+        # Swap the IR; the next block crossfades from the old filter to the new one
+        if partitions is self.partitions:
+            return
+        if len(partitions) > self.max_partitions:
+            self.allocate(len(partitions))
+        if self.partitions is not None:
+            self.previous_partitions = self.partitions
+        self.partitions = partitions
+
+    def filter_block(self, partitions: np.ndarray) -> np.ndarray:
+        # Multiply-accumulate the newest P input spectra against the IR partitions, then back to time domain
+        n_parts = len(partitions)
+        recent = self.fdl[self.fdl_index:self.fdl_index + n_parts]
+        np.einsum('pkc,pk->kc', recent, partitions, out=self.spectrum)
+        return fft.irfft(self.spectrum, n=2 * self.block_size, axis=0)[self.block_size:]
+
+    def process_block(self, x: np.ndarray) -> np.ndarray:
+        # Exactly one block of block_size frames
+        B = self.block_size
+        self.input_buffer[:B] = self.input_buffer[B:]
+        self.input_buffer[B:] = x
+
+        self.fdl_index = (self.fdl_index - 1) % self.max_partitions
+        spectrum = fft.rfft(self.input_buffer, axis=0)
+        self.fdl[self.fdl_index] = spectrum
+        self.fdl[self.fdl_index + self.max_partitions] = spectrum
+
+        y = self.filter_block(self.partitions)
+        if self.previous_partitions is not None:
+            y_old = self.filter_block(self.previous_partitions)
+            y -= y_old
+            y *= self.fade_in
+            y += y_old
+            self.previous_partitions = None
+        return y
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        # Any number of frames; whole blocks pass straight through with no added latency
+        if self.partitions is None:
+            return np.zeros_like(x)
+        n = len(x)
+        B = self.block_size
+        if n % B == 0 and len(self.in_fifo) == 0 and len(self.out_fifo) == 0:
+            if n == B:
+                return self.process_block(x)
+            return np.concatenate([self.process_block(x[i:i + B]) for i in range(0, n, B)])
+
+        # Unaligned request sizes go through small FIFOs primed with one block of silence,
+        # which fixes the wet-path latency at block_size from then on
+        if len(self.in_fifo) == 0 and len(self.out_fifo) == 0:
+            self.out_fifo = np.zeros((B, self.channels), dtype=np.float32)
+        self.in_fifo = np.concatenate([self.in_fifo, x])
+        done = [self.out_fifo]
+        while len(self.in_fifo) >= B:
+            done.append(self.process_block(self.in_fifo[:B]))
+            self.in_fifo = self.in_fifo[B:]
+        out = np.concatenate(done)
+        self.out_fifo = out[n:]
+        return out[:n]
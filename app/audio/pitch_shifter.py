@@ -0,0 +1,193 @@
+import numpy as np
+from scipy import fft
+from typing import Optional
+from modules import constants as C
+from audio.resampler import PolyphaseResampler
+
+
+class PitchShifter:
+    # Tempo-preserving pitch shift for streaming blocks: a phase vocoder stretches every analysis
+    # hop of Ha input frames to Hs = round(pitch * Ha) frames, then the polyphase resampler reads
+    # the stretched signal at step Hs / Ha, which restores the length and moves every partial by
+    # pitch. Frames, windows, spectra and overlap-add rings are allocated once up front.
+
+    def __init__(self, channels: int = C.STREAM_CHANNELS, frame_size: int = C.PITCH_SHIFT_FRAME_SIZE,
+                 overlap: int = C.PITCH_SHIFT_OVERLAP, tier: str = 'live'):
+        if frame_size % overlap:
+            raise ValueError("Frame size must be a multiple of the overlap factor")
+        self.channels = channels
+        self.frame_size = N = frame_size
+        self.hop = H = frame_size // overlap
+        self.bins = N // 2 + 1
+        # The largest synthesis hop (pitch 2.0) must still overlap the next frame
+        self.max_synthesis_hop = N // 2
+
+        self.window = np.hanning(N + 1)[:N].astype(np.float32)
+        self.window_squared = self.window ** 2
+        self.bin_index = np.arange(self.bins, dtype=np.float64)
+        self.expected = 2.0 * np.pi * H / N * self.bin_index
+        self.bins_per_radian = N / (2.0 * np.pi * H)
+        self.resampler = PolyphaseResampler(channels, tier)
+
+        # Input ring stored twice back to back so the last N frames are always one contiguous slice
+        self.input_ring = np.zeros((channels, 2 * N), dtype=np.float32)
+        self.frame = np.zeros((channels, N), dtype=np.float32)
+        self.stage_in = np.zeros((channels, H), dtype=np.float32)
+        self.stage_out = np.zeros((H, channels), dtype=np.float32)
+        # Overlap-add ring and the matching sum of squared windows, so any synthesis hop normalises
+        self.ola_ring = np.zeros((channels, N), dtype=np.float32)
+        self.norm_ring = np.zeros(N, dtype=np.float32)
+        # Stretched frames waiting for the resampler, (frames, channels) like every other block
+        self.stretched = np.zeros((2 * N, channels), dtype=np.float32)
+        self.out_block = np.zeros((C.STREAM_BLOCK_SIZE, channels), dtype=np.float32)
+
+        shape = (channels, self.bins)
+        self.magnitude = np.zeros(shape)
+        self.phase = np.zeros(shape)
+        self.last_phase = np.zeros(shape)
+        self.frequency = np.zeros(shape)
+        self.synth_phase = np.zeros(shape)
+        self.scratch = np.zeros(shape)
+        self.spectrum = np.zeros(shape, dtype=np.complex128)
+        self.reset()
+
+    @property
+    def latency(self) -> int:
+        # Output frames between an input frame and its shifted copy: one staged hop, N - Ha inside
+        # the vocoder, and the zeros primed ahead of the resampler
+        return self.frame_size + self.priming
+
+    def reset(self):
+        for buf in (self.input_ring, self.stage_out, self.ola_ring, self.norm_ring, self.last_phase, self.synth_phase):
+            buf.fill(0)
+        self.position = 0
+        self.ola_position = 0
+        self.staged = 0
+        self.resampler.reset()
+        # Enough stretched zeros up front that the resampler's kernel never runs dry
+        self.priming = self.resampler.max_half + 2
+        self.stretched[:self.priming] = 0
+        self.stretched_count = self.priming
+
+    def synthesis_hop(self, pitch: float) -> int:
+        return int(np.clip(round(pitch * self.hop), 1, self.max_synthesis_hop))
+
+    def analyse(self):
+        # Magnitude and true frequency (radians per frame) of every bin from its phase advance over Ha
+        spectrum = fft.rfft(self.frame, axis=1)
+        np.abs(spectrum, out=self.magnitude)
+        np.arctan2(spectrum.imag, spectrum.real, out=self.phase)
+        np.subtract(self.phase, self.last_phase, out=self.frequency)
+        self.last_phase[...] = self.phase
+        self.frequency -= self.expected
+        self.frequency += np.pi
+        np.mod(self.frequency, 2.0 * np.pi, out=self.frequency)
+        self.frequency -= np.pi
+        self.frequency *= self.bins_per_radian
+        self.frequency += self.bin_index
+        self.frequency *= 2.0 * np.pi / self.frame_size
+
+    def advance_phases(self, synthesis_hop: int):
+        # Peaks advance at their own frequency over Hs; the bins around each peak keep their
+        # analysed offset from it (identity phase locking), so partials stay coherent
+        np.multiply(self.frequency, synthesis_hop, out=self.scratch)
+        self.scratch += self.synth_phase
+        for ch in range(self.channels):
+            row = self.magnitude[ch]
+            peaks = np.flatnonzero((row[1:-1] > row[:-2]) & (row[1:-1] >= row[2:])) + 1
+            if not len(peaks):
+                self.synth_phase[ch] = self.scratch[ch]
+                continue
+            # Region boundaries sit halfway between neighbouring peaks
+            nearest = peaks[np.searchsorted((peaks[1:] + peaks[:-1]) / 2.0, self.bin_index)]
+            np.subtract(self.phase[ch], self.phase[ch][nearest], out=self.synth_phase[ch])
+            self.synth_phase[ch] += self.scratch[ch][nearest]
+        np.mod(self.synth_phase, 2.0 * np.pi, out=self.synth_phase)
+
+    def process_hop(self, pitch: float):
+        # Consume stage_in, stretch it by one vocoder frame and leave Ha shifted frames in stage_out
+        N, H = self.frame_size, self.hop
+        p = self.position
+        self.input_ring[:, p:p + H] = self.stage_in
+        self.input_ring[:, p + N:p + N + H] = self.stage_in
+        self.position = (p + H) % N
+        np.multiply(self.input_ring[:, p + H:p + H + N], self.window, out=self.frame)
+
+        hs = self.synthesis_hop(pitch)
+        self.analyse()
+        self.advance_phases(hs)
+        np.cos(self.synth_phase, out=self.scratch)
+        np.multiply(self.magnitude, self.scratch, out=self.spectrum.real)
+        np.sin(self.synth_phase, out=self.scratch)
+        np.multiply(self.magnitude, self.scratch, out=self.spectrum.imag)
+        frame = fft.irfft(self.spectrum, n=N, axis=1).astype(np.float32, copy=False)
+        frame *= self.window
+
+        # Overlap-add at the synthesis position; the first Hs frames of it are then final
+        q = self.ola_position
+        self.ola_ring[:, q:] += frame[:, :N - q]
+        self.ola_ring[:, :q] += frame[:, N - q:]
+        self.norm_ring[q:] += self.window_squared[:N - q]
+        self.norm_ring[:q] += self.window_squared[N - q:]
+        self.emit_stretched(q, hs)
+        self.ola_position = (q + hs) % N
+
+        # Read the stretched signal back at step Hs / Ha: exactly Ha output frames per hop
+        step = hs / H
+        need = self.resampler.input_needed(H, step)
+        if need > self.stretched_count:
+            self.stage_out.fill(0)
+            return
+        self.resampler.process(self.stretched[:need], step, H, out=self.stage_out)
+        rest = self.stretched_count - need
+        self.stretched[:rest] = self.stretched[need:self.stretched_count]
+        self.stretched_count = rest
+
+    def emit_stretched(self, q: int, count: int):
+        # Move `count` finished frames from the ring into the stretched queue and clear them
+        N = self.frame_size
+        c = self.stretched_count
+        for start, width in ((q, min(count, N - q)), (0, count - min(count, N - q))):
+            if not width:
+                continue
+            norm = np.maximum(self.norm_ring[start:start + width], 1e-3)
+            np.divide(self.ola_ring[:, start:start + width].T, norm[:, None], out=self.stretched[c:c + width])
+            self.ola_ring[:, start:start + width] = 0
+            self.norm_ring[start:start + width] = 0
+            c += width
+        self.stretched_count = c
+
+    def process(self, x: np.ndarray, pitch: float, end_pitch: Optional[float] = None,
+                out: Optional[np.ndarray] = None) -> np.ndarray:
+        # x is (frames, channels) float32 of any length; returns as many frames, `latency` behind.
+        # With end_pitch the pitch glides from pitch to end_pitch across x, one value per hop.
+        # The result goes into out when given (which may be x itself), otherwise into shifter
+        # scratch that is valid until the next call.
+        if out is None:
+            if len(x) > len(self.out_block):
+                self.out_block = np.zeros((len(x), self.channels), dtype=np.float32)
+            out = self.out_block[:len(x)]
+        H = self.hop
+        i = 0
+        while i < len(x):
+            take = min(H - self.staged, len(x) - i)
+            s = self.staged
+            self.stage_in[:, s:s + take] = x[i:i + take].T
+            out[i:i + take] = self.stage_out[s:s + take]
+            self.staged += take
+            i += take
+            if self.staged == H:
+                self.process_hop(pitch if end_pitch is None else pitch + (end_pitch - pitch) * i / len(x))
+                self.staged = 0
+        return out
+
+    def apply(self, x: np.ndarray, pitch: float, block_size: int = C.STREAM_BLOCK_SIZE) -> np.ndarray:
+        # Whole array through the streaming path, with the latency trimmed off the front
+        self.reset()
+        latency = self.latency
+        padded = np.concatenate([x, np.zeros((latency, x.shape[1]), dtype=np.float32)])
+        out = np.empty_like(padded)
+        for start in range(0, len(padded), block_size):
+            self.process(padded[start:start + block_size], pitch, out=out[start:start + block_size])
+        self.reset()
+        return out[latency:]
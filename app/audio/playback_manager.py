@@ -1,149 +1,265 @@
-
-import os
-import pygame
 import threading
 import time
-import tempfile
+import numpy as np
 from pydub import AudioSegment
-from typing import Optional, Callable
+from typing import Optional, Callable, Union, Dict
+from audio.audio_sink import AudioSink, create_sink, segment_to_array, match_channels
+from audio.track_store import ResidentWindow
+from audio.transport_clock import TransportClock
+from modules import constants as C
 
 
-TEMP_FILE_PREFIX = 'hand_dj_temp_'
-TEMP_FILE_SUFFIX = '.wav'
 PROGRESS_UPDATE_INTERVAL_S = 0.1
-MAX_TEMP_FILES = 2
+
+
+def blend_region(buffer: np.ndarray, block: np.ndarray, start: int, crossfade: int,
+                 blend_head: bool = False, blend_tail: bool = False):
+    # Write block into buffer at start in place. blend_head / blend_tail crossfade the first /
+    # last frames with what is already there, hiding seams between render chunks.
+    block = block[:max(0, len(buffer) - start)]
+    xf = min(crossfade, len(block) // 2)
+    region = buffer[start:start + len(block)]
+    head, tail = (xf if blend_head else 0), (xf if blend_tail else 0)
+    region[head:len(block) - tail] = block[head:len(block) - tail]
+    if head:
+        ramp = (np.arange(1, head + 1, dtype=np.float32) / (head + 1))[:, None]
+        region[:head] += (block[:head] - region[:head]) * ramp
+    if tail:
+        ramp = (np.arange(1, tail + 1, dtype=np.float32) / (tail + 1))[:, None]
+        region[-tail:] = block[-tail:] + (region[-tail:] - block[-tail:]) * ramp
+
 
 class PlaybackManager:
-    def __init__(self, sample_rate: int, buffer_size: int, 
+    def __init__(self, sample_rate: int, buffer_size: int,
                  progress_callback: Optional[Callable[[float, float], None]] = None,
-                 status_callback: Optional[Callable[[str], None]] = None):
-        # Initialize pygame mixer with specified audio settings
-        pygame.mixer.pre_init(frequency=sample_rate, size=-16, channels=2, buffer=buffer_size)
-        pygame.mixer.init()
-        
+                 status_callback: Optional[Callable[[str], None]] = None,
+                 sink: Optional[AudioSink] = None):
+        # Rendered audio is streamed block by block into an output sink (pygame, sounddevice, null, ...)
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.sink = sink if sink is not None else create_sink(sample_rate=sample_rate)
 
         self.is_playing = False
-        self.current_position_ms = 0.0
         self.audio_length_ms = 0.0
-  
-        self.temp_files = []
+        self.volume = 1.0
+
+        self.buffer: Optional[np.ndarray] = None
+        # Read position in the buffer, advanced only by the frames rendered out to the sink
+        self.clock = TransportClock(sample_rate)
+        # Source-track frames per buffer frame, so a re-render at another pitch resumes at the same spot
+        self.buffer_step = 1.0
+        self.buffer_lock = threading.Lock()
+        # A memory-mapped buffer only keeps the part around the read position resident
+        self.resident = ResidentWindow(int(C.TRACK_RESIDENT_S * sample_rate))
+        # Outgoing buffer and read position while a swap crossfades into the new one
+        self.crossfade_frames = int(C.SWAP_CROSSFADE_MS * sample_rate / 1000)
+        self.fade_buffer: Optional[np.ndarray] = None
+        self.fade_frame = 0
+        self.fade_done = 0
+        # Output scratch the sink reads each block from, valid until the next render
+        self.allocate(buffer_size)
 
         self.playback_thread: Optional[threading.Thread] = None
         self.stop_thread = False
-  
+
         self.progress_callback = progress_callback
         self.status_callback = status_callback
 
-    def play(self, audio: AudioSegment, start_position_s: float = 0.0) -> bool:
-        # Start playing audio from a specific position with progress tracking
-        if not isinstance(audio, AudioSegment):
+    def play(self, audio: Union[np.ndarray, AudioSegment], start_position_s: float = 0.0, step: float = 1.0) -> bool:
+        # Start playing audio from a specific position with progress tracking. Rendered audio is a
+        # float32 (frames, channels) array at the sink rate; it is converted to int16 only by the sink.
+        if isinstance(audio, AudioSegment):
+            if audio.frame_rate != self.sample_rate:
+                audio = audio.set_frame_rate(self.sample_rate)
+            audio = segment_to_array(audio)
+        if not isinstance(audio, np.ndarray) or audio.ndim != 2:
             self.notify_status("Error: Invalid audio data")
             return False
 
-
-        temp_file = self.save_to_temp(audio)
-        if not temp_file:
-            return False
-
         try:
-  
-            pygame.mixer.music.load(temp_file)
-            pygame.mixer.music.play(start=start_position_s)
+            # Swap the buffer under the running sink instead of restarting the output
+            buffer = match_channels(audio, self.sink.channels)
+            self.swap_buffer(buffer, step, int(start_position_s * self.sample_rate))
 
             self.is_playing = True
-            self.audio_length_ms = len(audio)
-            self.current_position_ms = start_position_s * 1000
+
+            if not self.sink.is_active:
+                self.sink.start(self.render, self.on_sink_finished)
 
             self.start_progress_tracking()
             self.notify_status("Playing")
             return True
-        except pygame.error as e:
+        except Exception as e:
             self.notify_status(f"Playback error: {e}")
             return False
 
+    def swap_buffer(self, buffer: np.ndarray, step: float, read_frame: Optional[int] = None):
+        # Replace the playing buffer. With no read_frame, playback continues from the same point
+        # of the source track. While the sink is running the old buffer crossfades into the new one.
+        with self.buffer_lock:
+            if read_frame is None:
+                read_frame = int(round(self.clock.frame * self.buffer_step / step))
+            if self.buffer is not None and self.sink.is_active and self.crossfade_frames:
+                self.fade_buffer, self.fade_frame, self.fade_done = self.buffer, self.clock.frame, 0
+            self.buffer = buffer
+            self.buffer_step = step
+            self.clock.seek(read_frame)
+            self.resident.reset(read_frame)
+        self.audio_length_ms = len(buffer) * 1000.0 / self.sample_rate
+
+    def seek(self, position_s: float):
+        # Jump the playhead to a frame of the playing buffer; the next block starts exactly there
+        with self.buffer_lock:
+            if self.buffer is None:
+                return
+            frame = min(int(round(position_s * self.sample_rate)), len(self.buffer))
+            if self.sink.is_active and self.crossfade_frames:
+                self.fade_buffer, self.fade_frame, self.fade_done = self.buffer, self.clock.frame, 0
+            self.clock.seek(frame)
+            self.resident.reset(frame)
+        self.report_progress()
+
+    def write_region(self, block: np.ndarray, start: int, blend_head: bool = False, blend_tail: bool = False):
+        # Write rendered frames into the playing buffer in place (see blend_region)
+        with self.buffer_lock:
+            if self.buffer is None:
+                return
+            blend_region(self.buffer, block, start, self.crossfade_frames, blend_head, blend_tail)
+
+    def get_source_frame(self) -> int:
+        # Source-track frame under the playhead
+        with self.buffer_lock:
+            return int(self.clock.frame * self.buffer_step)
+
+    def allocate(self, frames: int):
+        self.out_capacity = frames
+        self.out_block = np.zeros((frames, self.sink.channels), dtype=np.float32)
+        self.fade_block = np.zeros((frames, self.sink.channels), dtype=np.float32)
+        self.fade_ramp = np.empty((frames, 1), dtype=np.float32)
+        self.steps = np.arange(1, frames + 1, dtype=np.float32)[:, None]
+
+    def render(self, frames: int) -> Optional[np.ndarray]:
+        # Sink-facing render function: next slice of the rendered buffer at the current volume,
+        # scaled into the output scratch (valid until the next call)
+        if frames > self.out_capacity:
+            self.allocate(frames)
+        with self.buffer_lock:
+            read_frame = self.clock.frame
+            if self.buffer is None or read_frame >= len(self.buffer):
+                return None
+            out = self.out_block[:frames]
+            self.scale_into(self.buffer[read_frame:read_frame + frames], out)
+            self.clock.advance(frames)
+            self.resident.advance(self.buffer, read_frame + frames)
+            if self.fade_buffer is not None:
+                self.crossfade(out, frames)
+        return out
+
+    def scale_into(self, block: np.ndarray, out: np.ndarray):
+        # block at the current volume into out, zero past its end
+        np.multiply(block, np.float32(self.volume), out=out[:len(block)])
+        if self.volume > 1.0:
+            np.clip(out[:len(block)], -C.MASTER_CEILING, C.MASTER_CEILING, out=out[:len(block)])
+        out[len(block):] = 0.0
+
+    def crossfade(self, out: np.ndarray, frames: int):
+        # Linear fade from the outgoing buffer to the new one over crossfade_frames, in place
+        old = self.fade_block[:frames]
+        self.scale_into(self.fade_buffer[self.fade_frame:self.fade_frame + frames], old)
+        ramp = self.fade_ramp[:frames]
+        np.add(self.steps[:frames], self.fade_done, out=ramp)
+        ramp /= self.crossfade_frames
+        np.minimum(ramp, 1.0, out=ramp)
+        out -= old
+        out *= ramp
+        out += old
+        self.fade_frame += frames
+        self.fade_done += frames
+        if self.fade_done >= self.crossfade_frames:
+            self.fade_buffer = None
+
+    def on_sink_finished(self):
+        # Called on the sink's own thread (inside PortAudio's finished_callback for sounddevice),
+        # where stopping the stream can deadlock, so the stop is handed to a thread of its own
+        threading.Thread(target=self.finish, daemon=True).start()
+
+    def finish(self):
+        # Unless playback was restarted in the meantime
+        if not self.sink.exhausted:
+            return
+        self.stop()
+        self.notify_status("Finished")
+
     def set_volume(self, volume: float):
 
-        if self.is_playing:
-            pygame.mixer.music.set_volume(volume)
+        # Linear gain on the rendered buffer (AudioEffects.volume_gain of the volume), kept for
+        # the next play when stopped. Above unity the output is held to MASTER_CEILING, as the
+        # master bus after the streaming gain node would.
+        self.volume = max(0.0, float(volume))
 
     def pause(self):
 
         if self.is_playing:
-            pygame.mixer.music.pause()
+            # Once the sink has stopped pulling the clock sits on the first frame not yet rendered
+            self.sink.stop()
+            self.clock.pause()
             self.is_playing = False
             self.stop_thread = True
+            self.report_progress()
             self.notify_status("Paused")
 
     def resume(self):
 
         if not self.is_playing and self.audio_length_ms > 0:
-            pygame.mixer.music.unpause()
+            self.sink.start(self.render, self.on_sink_finished)
             self.is_playing = True
             self.start_progress_tracking()
             self.notify_status("Resumed")
 
     def stop(self):
 
-        pygame.mixer.music.stop()
+        self.sink.stop()
+        self.clock.pause()
         self.is_playing = False
-        self.current_position_ms = 0.0
+        with self.buffer_lock:
+            self.clock.seek(0)
+            self.resident.reset(0)
+            self.fade_buffer = None
         self.stop_thread = True
         self.notify_status("Stopped")
 
     def get_current_position_s(self) -> float:
+        # Position being heard: frames rendered out, less those still queued in the sink
+        return self.clock.position_s(self.sink.latency_frames if self.is_playing else 0)
 
-        return self.current_position_ms / 1000.0
+    def get_source_position_s(self, source_rate: int) -> float:
+        # The same position in seconds of the source track the buffer was rendered from
+        with self.buffer_lock:
+            step = self.buffer_step
+        return self.get_current_position_s() * self.sample_rate * step / source_rate
 
-    def save_to_temp(self, audio: AudioSegment) -> Optional[str]:
-        # Save audio to temporary file for pygame playback
-        try:
-            temp_fd, temp_path = tempfile.mkstemp(suffix=TEMP_FILE_SUFFIX, prefix=TEMP_FILE_PREFIX)
-            os.close(temp_fd)
-
-            audio.export(temp_path, format='wav')
-
-            self.temp_files.append(temp_path)
-            self.cleanup_old_temp_files()
-            return temp_path
-        except Exception as e:
-            self.notify_status(f"Temp file error: {e}")
-            return None
-
-    def cleanup_old_temp_files(self):
-
-        while len(self.temp_files) > MAX_TEMP_FILES:
-            old_file = self.temp_files.pop(0)
-            try:
-                if os.path.exists(old_file):
-                    os.unlink(old_file)
-            except OSError:
-                pass  
+    def get_transport_stats(self) -> Dict[str, float]:
+        # Position in frames and how far the frames delivered have drifted from wall clock
+        return self.clock.get_stats()
 
     def start_progress_tracking(self):
-  
+
         self.stop_thread = False
         if self.playback_thread is None or not self.playback_thread.is_alive():
             self.playback_thread = threading.Thread(target=self.track_progress, daemon=True)
             self.playback_thread.start()
 
     def track_progress(self):
-        # Background thread that monitors playback progress and updates callbacks
+        # Background thread that reports the transport position to the progress callback. It only
+        # reads the clock, so a late wake-up delays the report but never moves the position.
         while self.is_playing and not self.stop_thread:
+            self.report_progress()
+            time.sleep(PROGRESS_UPDATE_INTERVAL_S)
 
-            if not pygame.mixer.music.get_busy():
-                self.stop()
-                self.notify_status("Finished")
-                break
-            
-
-            self.current_position_ms += (PROGRESS_UPDATE_INTERVAL_S * 1000)
-
-            if self.progress_callback:
-                current_s = self.get_current_position_s()
-                total_s = self.audio_length_ms / 1000.0
-                self.progress_callback(current_s, total_s)
+    def report_progress(self):
 
-            time.sleep(PROGRESS_UPDATE_INTERVAL_S)
+        if self.progress_callback:
+            self.progress_callback(self.get_current_position_s(), self.audio_length_ms / 1000.0)
 
     def notify_status(self, message: str):
 
@@ -153,13 +269,4 @@ class PlaybackManager:
     def cleanup(self):
 
         self.stop()
-
-        for temp_file in self.temp_files:
-            try:
-                if os.path.exists(temp_file):
-                    os.unlink(temp_file)
-            except OSError:
-                pass  
-        self.temp_files.clear()
-
-        pygame.mixer.quit()
+        self.sink.close()
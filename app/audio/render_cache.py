@@ -0,0 +1,52 @@
+import hashlib
+import numpy as np
+from typing import Dict, Hashable, Optional
+from modules import constants as C
+from audio import track_store
+from audio.lru_cache import ByteLRUCache
+
+
+def quantize_params(params: Dict[str, float]) -> Dict[str, float]:
+    # Snap rendered parameters to the re-render grid. Renders, speculative renders and cache
+    # lookups all use it, so a setting the hand comes back to gives the same key. Volume is not
+    # rendered: playback applies it to whatever buffer is playing, cached or not.
+    q = dict(params)
+    q['pitch'] = round(round(params['pitch'] / C.RENDER_PITCH_STEP) * C.RENDER_PITCH_STEP, 4)
+    q['reverb'] = round(round(params['reverb'] / C.REVERB_GRID_STEP) * C.REVERB_GRID_STEP, 4)
+    q['volume'] = C.DEFAULT_VOLUME
+    q['filter'] = round(round(params.get('filter', C.DEFAULT_FILTER) / C.RENDER_FILTER_STEP) * C.RENDER_FILTER_STEP, 4)
+    return q
+
+
+def track_hash(track: np.ndarray) -> str:
+    # Content hash of a float32 track, read a chunk at a time (a mapped track is paged out behind
+    # it). Reads the whole track, so it runs off the GUI thread (AudioProcessor.hash_track).
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.asarray(track.shape, dtype=np.int64).tobytes())
+    chunk = max(1, int(C.TRACK_DECODE_CHUNK_S * C.DEFAULT_SAMPLE_RATE))
+    for start in range(0, len(track), chunk):
+        digest.update(np.ascontiguousarray(track[start:start + chunk]).data)
+        track_store.release_pages(track, start, start + chunk)
+    return digest.hexdigest()
+
+
+class RenderCache(ByteLRUCache):
+    # LRU cache of whole-track renders for the replay path, capped in bytes. Keyed by the track's
+    # content hash, the quantized parameters and everything else that changes the output.
+
+    def __init__(self, max_bytes: int = C.RENDER_CACHE_MAX_BYTES):
+        super().__init__(max_bytes)
+
+    def key(self, track_id: str, track_rate: int, params: Dict[str, float], reverb_engine: str,
+            pitch_mode: str) -> Hashable:
+        q = quantize_params(params)
+        engine = (C.RENDER_ENGINE_VERSION, C.IR_GENERATOR_VERSION, reverb_engine, pitch_mode, C.PITCH_RESAMPLER_TIER)
+        return track_id, track_rate, q['pitch'], q['reverb'], q['filter'], q.get('sample_rate'), engine
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        return self.lookup(key)
+
+    def put(self, key: Hashable, value: np.ndarray):
+        # Store a finished render; a render larger than the whole budget is not kept
+        if value.nbytes <= self.max_bytes:
+            self.insert(key, value)
@@ -0,0 +1,98 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class RenderCancelled(Exception):
+    # Raised from inside a render when its cancel event is set
+    pass
+
+
+def check_cancelled(cancel: Optional[threading.Event]):
+    # Cooperative cancellation point for long renders
+    if cancel is not None and cancel.is_set():
+        raise RenderCancelled()
+
+
+class RenderScheduler:
+    # Latest-value-wins scheduler for whole-track re-renders. One worker thread renders the newest
+    # requested parameters; requests that arrive while one is waiting replace it (coalesced), and a
+    # request that arrives mid-render cancels that render at its next checkpoint so the worker moves
+    # straight on to the newest values. render(params, cancel) builds the result, deliver(result)
+    # hands it to playback.
+
+    def __init__(self, render: Callable[[Dict, threading.Event], Any], deliver: Callable[[Any], None]):
+        self.render = render
+        self.deliver = deliver
+        self.condition = threading.Condition()
+        self.pending: Optional[Dict] = None
+        self.current_cancel: Optional[threading.Event] = None
+        self.running = True
+        self.started = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def request(self, params: Dict):
+        # Never blocks on a render: stores the newest params and cancels whatever is now stale
+        with self.condition:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = dict(params)
+            if self.current_cancel is not None:
+                self.current_cancel.set()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.pending is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                params, self.pending = self.pending, None
+                cancel = self.current_cancel = threading.Event()
+                self.started += 1
+
+            try:
+                result = self.render(params, cancel)
+                # A newer request may have landed after the last checkpoint
+                check_cancelled(cancel)
+                self.deliver(result)
+                outcome = 'completed'
+            except RenderCancelled:
+                outcome = 'cancelled'
+            except Exception:
+                outcome = 'failed'
+
+            with self.condition:
+                self.current_cancel = None
+                setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @property
+    def is_busy(self) -> bool:
+        with self.condition:
+            return self.pending is not None or self.current_cancel is not None
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.condition:
+            return {
+                'started': self.started,
+                'cancelled': self.cancelled,
+                'completed': self.completed,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'pending': int(self.pending is not None),
+            }
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.pending = None
+            if self.current_cancel is not None:
+                self.current_cancel.set()
+            self.condition.notify()
+        if threading.current_thread() is not self.worker:
+            self.worker.join(timeout=1.0)
@@ -0,0 +1,263 @@
+import os
+import time
+import threading
+import multiprocessing
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple
+from modules import constants as C
+from audio.render_cache import quantize_params
+
+
+# Per-process effects engine for pool workers, built on first use, and the shared memory block
+# of the track they last read
+worker_effects = None
+worker_track: Optional[shared_memory.SharedMemory] = None
+
+
+def attach_track(name: str, shape: Tuple[int, int]) -> np.ndarray:
+    # Runs in a pool worker: view of the track in a shared memory block, keeping one attached
+    global worker_track
+    if worker_track is None or worker_track.name != name:
+        if worker_track is not None:
+            worker_track.close()
+        worker_track = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=np.float32, buffer=worker_track.buf)
+
+
+def render_job(x, origin: int, sample_rate: int, params: Dict, start: int, end: int,
+               reverb_engine: str, pitch_mode: str) -> np.ndarray:
+    # Runs in a pool worker: render track frames [start, end) from x, the window starting at
+    # origin, or the whole shared track when x is its (name, shape)
+    global worker_effects
+    from audio.audio_effects import AudioEffects
+    if isinstance(x, tuple):
+        x = attach_track(*x)
+    if worker_effects is None:
+        worker_effects = AudioEffects(reverb_engine, pitch_mode)
+    worker_effects.set_reverb_engine(reverb_engine)
+    worker_effects.set_pitch_mode(pitch_mode)
+    return worker_effects.render_range(x, sample_rate, params, start - origin, end - origin, origin=origin)
+
+
+class RenderSpeculator:
+    # Pre-renders the next few seconds for the parameter states the hand is heading towards, so a
+    # re-render on the replay path can start from a ready buffer instead of a cold render.
+    # Pitch and reverb trajectories are extrapolated a few lookaheads ahead and snapped to a grid;
+    # each predicted state not already covered is rendered from the playhead in a process pool.
+    # At most `workers` jobs run at once and ready plus in-flight buffers stay under max_bytes.
+    # Predictions run at most every SPECULATIVE_OBSERVE_INTERVAL_S. A track in shared memory is
+    # read in place by the pool; otherwise each job is sent its window.
+
+    def __init__(self, output_step: Callable[[int, Dict], float], render_window: Callable[[int, Dict, int, int, int], Tuple[int, int]],
+                 workers: int = C.SPECULATIVE_WORKERS, max_bytes: int = C.SPECULATIVE_MAX_BYTES,
+                 horizon_s: float = C.SPECULATIVE_HORIZON_S):
+        # output_step(source_rate, params) and render_window(source_rate, params, start, end,
+        # frames) are the AudioEffects methods of the engine being served
+        self.output_step = output_step
+        self.render_window = render_window
+        self.workers = max(1, min(workers, (os.cpu_count() or 2) - 1))
+        self.max_bytes = max_bytes
+        self.horizon_s = horizon_s
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+        self.history: Dict[str, Deque[Tuple[float, float]]] = {'pitch': deque(maxlen=16), 'reverb': deque(maxlen=16)}
+        # key -> (source start, source end, rendered output frames)
+        self.ready: "OrderedDict[Hashable, Tuple[int, int, np.ndarray]]" = OrderedDict()
+        self.in_flight: Dict[Hashable, int] = {}
+        self.ready_bytes = 0
+        self.generation = 0
+        self.track: Optional[np.ndarray] = None
+        self.track_rate = C.DEFAULT_SAMPLE_RATE
+        # (shared memory name, shape) of the track when the pool can attach it
+        self.shared: Optional[Tuple[str, Tuple[int, int]]] = None
+        self.last_observed = 0.0
+        self.engine: Tuple[str, str] = (C.REVERB_ENGINE, C.PITCH_MODE)
+        self.submitted = 0
+        self.completed = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.skipped = 0
+
+    def quantize(self, params: Dict[str, float]) -> Dict[str, float]:
+        # Snap the rendered parameters to the re-render grid, so a ready buffer is exact
+        return quantize_params(params)
+
+    def key(self, params: Dict[str, float]) -> Hashable:
+        q = self.quantize(params)
+        return q['pitch'], q['reverb'], q['filter'], q.get('sample_rate')
+
+    def set_track(self, track: Optional[np.ndarray], track_rate: int, shared_name: Optional[str] = None):
+        # shared_name: the shared memory block track lives in, if it does
+        with self.lock:
+            self.track, self.track_rate = track, track_rate
+            self.shared = (shared_name, track.shape) if shared_name is not None and track is not None else None
+        self.clear()
+
+    def set_engine(self, reverb_engine: str, pitch_mode: str):
+        # Buffers rendered with another reverb engine or pitch mode are no use
+        if (reverb_engine, pitch_mode) != self.engine:
+            self.engine = (reverb_engine, pitch_mode)
+            self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.ready.clear()
+            self.in_flight.clear()
+            self.ready_bytes = 0
+
+    def observe(self, params: Dict[str, float], playhead: int):
+        # Record the newest smoothed values and, at most every SPECULATIVE_OBSERVE_INTERVAL_S,
+        # top up the speculative renders around them
+        now = time.monotonic()
+        with self.lock:
+            for name in self.history:
+                self.history[name].append((now, params[name]))
+            if self.track is None or now - self.last_observed < C.SPECULATIVE_OBSERVE_INTERVAL_S:
+                return
+            self.last_observed = now
+            self.expire(playhead)
+            candidates = {}
+            for state in self.predict():
+                candidate = dict(params, **state)
+                candidates.setdefault(self.key(candidate), candidate)
+        for candidate in list(candidates.values())[:C.SPECULATIVE_MAX_STATES]:
+            self.submit(candidate, playhead)
+
+    def predict(self) -> List[Dict[str, float]]:
+        # Straight-line extrapolation of each parameter over the last few hundred ms, nearest
+        # lookahead first. The current state is the scheduler's own render, so it only comes up
+        # when the hand is at rest and every lookahead lands on it.
+        velocity = {}
+        for name, points in self.history.items():
+            recent = [(t, v) for t, v in points if points[-1][0] - t <= 0.3]
+            if len(recent) >= 2 and recent[-1][0] > recent[0][0]:
+                velocity[name] = (recent[-1][1] - recent[0][1]) / (recent[-1][0] - recent[0][0])
+            else:
+                velocity[name] = 0.0
+        states = []
+        for lookahead in C.SPECULATIVE_LOOKAHEAD_S:
+            state = {
+                'pitch': float(np.clip(self.history['pitch'][-1][1] + velocity['pitch'] * lookahead,
+                                       C.PITCH_RANGE_MIN, C.PITCH_RANGE_MAX)),
+                'reverb': float(np.clip(self.history['reverb'][-1][1] + velocity['reverb'] * lookahead,
+                                        C.REVERB_RANGE_MIN, C.REVERB_RANGE_MAX)),
+            }
+            states.append(state)
+        return states
+
+    def submit(self, params: Dict[str, float], playhead: int):
+        # Start one pre-render unless the state is covered, the pool is full or it would not fit
+        params = self.quantize(params)
+        key = self.key(params)
+        step = self.output_step(self.track_rate, params)
+        start = playhead
+        end = min(len(self.track), start + int(self.horizon_s * params['sample_rate'] * step))
+        if end <= start:
+            return
+        estimate = int((end - start) / step) * self.track.shape[1] * 4
+        with self.lock:
+            if key in self.in_flight or (key in self.ready and self.covers(self.ready[key], playhead)):
+                return
+            if len(self.in_flight) >= self.workers:
+                self.skipped += 1
+                return
+            if self.ready_bytes + sum(self.in_flight.values()) + estimate > self.max_bytes:
+                self.evict(estimate)
+                if self.ready_bytes + sum(self.in_flight.values()) + estimate > self.max_bytes:
+                    self.skipped += 1
+                    return
+            self.in_flight[key] = estimate
+            self.submitted += 1
+            generation = self.generation
+
+        tail = int(C.SWAP_CROSSFADE_MS * self.track_rate / 1000) + 1
+        if self.shared is not None:
+            source, origin = self.shared, 0
+        else:
+            # Send only the window the renderer reads, not the whole track
+            origin, b = self.render_window(self.track_rate, params, start, min(len(self.track), end + tail), len(self.track))
+            source = np.ascontiguousarray(self.track[origin:b])
+        future = self.pool().submit(render_job, source, origin, self.track_rate, params, start,
+                                    min(len(self.track), end + tail), *self.engine)
+        future.add_done_callback(lambda f: self.finish(f, key, start, end, generation))
+
+    def finish(self, future: Future, key: Hashable, start: int, end: int, generation: int):
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if generation != self.generation or future.cancelled() or future.exception() is not None:
+                return
+            block = future.result()
+            self.completed += 1
+            old = self.ready.pop(key, None)
+            if old is not None:
+                self.ready_bytes -= old[2].nbytes
+            self.ready[key] = (start, end, block)
+            self.ready_bytes += block.nbytes
+            self.evict(0)
+
+    def take(self, params: Dict[str, float], playhead: int, min_frames: int) -> Optional[Tuple[np.ndarray, int]]:
+        # A ready render for these parameters that covers at least min_frames past the playhead:
+        # (output frames from the playhead on, source frame where it ends) or None
+        key = self.key(params)
+        with self.lock:
+            entry = self.ready.get(key)
+            if entry is None or not self.covers(entry, playhead, min_frames):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.ready.move_to_end(key)
+            start, end, block = entry
+        step = self.output_step(self.track_rate, self.quantize(params))
+        lead = int(round(playhead / step)) - int(round(start / step))
+        return block[lead:], end
+
+    def covers(self, entry: Tuple[int, int, np.ndarray], playhead: int, min_frames: int = 0) -> bool:
+        start, end, _ = entry
+        return start <= playhead and end - playhead >= max(1, min_frames)
+
+    def expire(self, playhead: int):
+        # Drop renders the playhead has already moved past (or jumped away from)
+        for key in [k for k, entry in self.ready.items() if not self.covers(entry, playhead)]:
+            self.ready_bytes -= self.ready.pop(key)[2].nbytes
+            self.expired += 1
+
+    def evict(self, incoming: int):
+        # Oldest ready renders go first until the budget fits
+        while self.ready and self.ready_bytes + sum(self.in_flight.values()) + incoming > self.max_bytes:
+            _, (_, _, block) = self.ready.popitem(last=False)
+            self.ready_bytes -= block.nbytes
+            self.evictions += 1
+
+    def pool(self) -> ProcessPoolExecutor:
+        # Spawned rather than forked: the parent runs Qt, audio and tracking threads
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def get_stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'skipped': self.skipped,
+                'ready_bytes': self.ready_bytes,
+                'in_flight': len(self.in_flight),
+            }
+
+    def stop(self):
+        self.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
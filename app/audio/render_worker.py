@@ -0,0 +1,177 @@
+import weakref
+import threading
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+from audio.render_scheduler import RenderCancelled, check_cancelled
+
+
+class RenderWorkerDied(RuntimeError):
+    # The render process went away mid-request (crashed or was killed); restart() brings up a new one
+    pass
+
+
+def worker_main(conn, cancel):
+    # Render process loop: attaches shared arrays by name and renders into them on request
+    from audio.audio_effects import AudioEffects
+    from audio.playback_manager import blend_region
+    effects = AudioEffects()
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+
+    def view(name: str, shape: Tuple[int, int]) -> np.ndarray:
+        if name not in attached:
+            attached[name] = shared_memory.SharedMemory(name=name)
+        return np.ndarray(shape, dtype=np.float32, buffer=attached[name].buf)
+
+    while True:
+        message = conn.recv()
+        if message[0] == 'stop':
+            break
+        if message[0] == 'release':
+            shm = attached.pop(message[1], None)
+            if shm is not None:
+                shm.close()
+            continue
+        _, track, buffer, rate, params, engine, start, end, start_out, crossfade, blend_head, blend_tail = message
+        x = out = None
+        try:
+            effects.set_reverb_engine(engine[0])
+            effects.set_pitch_mode(engine[1])
+            x, out = view(*track), view(*buffer)
+            block = effects.render_range(x, rate, params, start, end, cancel)
+            check_cancelled(cancel)
+            blend_region(out, block, start_out, crossfade, blend_head, blend_tail)
+            reply = ('done',)
+        except RenderCancelled:
+            reply = ('cancelled',)
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {e}")
+        # Views are dropped before the next message, which may release their blocks
+        del x, out
+        conn.send(reply)
+    for shm in attached.values():
+        shm.close()
+
+
+class RenderWorker:
+    # Runs the effect chain in a separate process, so a re-render never holds the GIL the camera
+    # and tracking loop needs. Tracks and output buffers live in shared memory: the worker renders
+    # straight into the buffer playback reads from, and only the request itself is pickled.
+    # A shared block is freed once the array handed out for it is no longer referenced. Blocks
+    # belong to this process, so they outlive a render process that dies and is restarted.
+
+    def __init__(self):
+        self.context = multiprocessing.get_context('spawn')
+        self.cancel = self.context.Event()
+        self.start()
+        # One request in flight at a time
+        self.lock = threading.Lock()
+        # Blocks are added from the GUI thread and freed from the render thread
+        self.blocks_lock = threading.Lock()
+        self.blocks: Dict[str, Tuple[shared_memory.SharedMemory, weakref.ref]] = {}
+
+    def start(self):
+        self.conn, child = self.context.Pipe()
+        self.process = self.context.Process(target=worker_main, args=(child, self.cancel), daemon=True)
+        self.process.start()
+        # Only the worker holds the other end, so its exit shows up here as end of file
+        child.close()
+
+    def restart(self):
+        # Replace a render process that died; the new one attaches shared blocks as it needs them
+        with self.lock:
+            self.conn.close()
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(timeout=1.0)
+            self.start()
+
+    def allocate(self, frames: int, channels: int) -> np.ndarray:
+        # Zero-filled float32 (frames, channels) array in a new shared memory block
+        self.collect()
+        shm = shared_memory.SharedMemory(create=True, size=max(1, frames * channels * 4))
+        array = np.ndarray((frames, channels), dtype=np.float32, buffer=shm.buf)
+        with self.blocks_lock:
+            self.blocks[shm.name] = (shm, weakref.ref(array))
+        return array
+
+    def share(self, track: np.ndarray) -> np.ndarray:
+        # Copy of a track in shared memory, to be used in place of the original. Tracks decoded
+        # for the worker go straight into allocate() instead (see track_store.segment_into).
+        array = self.allocate(*track.shape)
+        array[:] = track
+        return array
+
+    def name_of(self, array: Optional[np.ndarray]) -> Optional[str]:
+        with self.blocks_lock:
+            for name, (_, ref) in self.blocks.items():
+                if ref() is array:
+                    return name
+        return None
+
+    def is_shared(self, array: Optional[np.ndarray]) -> bool:
+        # Whether array is one handed out by allocate / share (not a view of one)
+        return array is not None and self.name_of(array) is not None
+
+    def render_into(self, track: np.ndarray, buffer: np.ndarray, rate: int, params: Dict,
+                    engine: Tuple[str, str], start: int, end: int, start_out: int, crossfade: int,
+                    blend_head: bool = False, blend_tail: bool = False,
+                    cancel: Optional[threading.Event] = None):
+        # Render track frames [start, end) into buffer from output frame start_out in the worker
+        # (see AudioEffects.render_range and blend_region). Waits without holding the GIL and
+        # forwards cancel once, raising RenderCancelled when the worker has stopped, or
+        # RenderWorkerDied if the worker is gone.
+        request = ('render', (self.name_of(track), track.shape), (self.name_of(buffer), buffer.shape),
+                   rate, params, engine, start, end, start_out, crossfade, blend_head, blend_tail)
+        with self.lock:
+            try:
+                self.cancel.clear()
+                self.conn.send(request)
+                while not self.conn.poll(0.01):
+                    if cancel is not None and cancel.is_set():
+                        self.cancel.set()
+                        self.conn.poll(None)
+                        break
+                reply = self.conn.recv()
+            except (EOFError, OSError) as e:
+                raise RenderWorkerDied(f"Render worker exited: {type(e).__name__}") from e
+        if reply[0] == 'cancelled':
+            raise RenderCancelled()
+        if reply[0] == 'error':
+            raise RuntimeError(f"Render worker failed: {reply[1]}")
+
+    def collect(self):
+        # Free the blocks whose arrays are gone, in this process and the worker
+        with self.blocks_lock:
+            gone = [(name, self.blocks.pop(name)[0]) for name, (_, ref) in list(self.blocks.items()) if ref() is None]
+        for name, shm in gone:
+            shm.close()
+            self.unlink(shm)
+            if self.process.is_alive():
+                with self.lock:
+                    try:
+                        self.conn.send(('release', name))
+                    except OSError:
+                        # Died since; a restarted worker never attached the block
+                        pass
+
+    def stop(self):
+        if self.process.is_alive():
+            with self.lock:
+                try:
+                    self.conn.send(('stop',))
+                except OSError:
+                    pass
+            self.process.join(timeout=1.0)
+        # Names go now; the memory itself goes with the last array still using it
+        with self.blocks_lock:
+            blocks = [shm for shm, _ in self.blocks.values()]
+        for shm in blocks:
+            self.unlink(shm)
+
+    def unlink(self, shm: shared_memory.SharedMemory):
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
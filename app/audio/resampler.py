@@ -0,0 +1,207 @@
+import threading
+import numpy as np
+from fractions import Fraction
+from scipy import signal
+from typing import Dict, Optional, Tuple
+from modules import constants as C
+
+
+# Quality tiers: half-length of the kernel in input samples at full bandwidth, number of
+# filter phases, passband edge as a fraction of the output Nyquist, Kaiser beta, and the
+# largest denominator used when a fixed ratio is approximated as up/down for whole arrays
+RESAMPLER_TIERS = {
+    'live': {'half_taps': 4, 'phases': 64, 'rolloff': 0.90, 'beta': 6.0, 'max_denominator': 100},
+    'export': {'half_taps': 16, 'phases': 512, 'rolloff': 0.95, 'beta': 9.0, 'max_denominator': 1000},
+}
+
+filter_bank_cache: Dict[Tuple[str, float], np.ndarray] = {}
+filter_bank_lock = threading.Lock()
+
+
+def design_filter_bank(tier: str, cutoff: float) -> np.ndarray:
+    # Kaiser-windowed sinc split into phases -> (taps, phases + 1) float32, each column with unity DC
+    # gain. Column p is the kernel for a read position p / phases of the way between two input samples.
+    # Stored tap-major so a block's kernels are gathered as (taps, frames).
+    cfg = RESAMPLER_TIERS[tier]
+    half = int(np.ceil(cfg['half_taps'] / cutoff))
+    phases = cfg['phases']
+    frac = np.arange(phases + 1)[:, None] / phases
+    d = np.arange(2 * half)[None, :] - (half - 1) - frac
+    window = np.i0(cfg['beta'] * np.sqrt(np.clip(1.0 - (d / half) ** 2, 0.0, 1.0))) / np.i0(cfg['beta'])
+    bank = cutoff * np.sinc(cutoff * d) * window
+    bank /= bank.sum(axis=1, keepdims=True)
+    return np.ascontiguousarray(bank.T, dtype=np.float32)
+
+
+def get_filter_bank(tier: str, step: float) -> np.ndarray:
+    # Filter designs are cached per ratio bucket: the anti-aliasing cutoff only depends on
+    # how much faster than real time the input is read, snapped to RESAMPLER_CUTOFF_STEP
+    cfg = RESAMPLER_TIERS[tier]
+    cutoff = cfg['rolloff'] * min(1.0, 1.0 / max(step, 1e-6))
+    bucket = max(C.RESAMPLER_MIN_CUTOFF, round(cutoff / C.RESAMPLER_CUTOFF_STEP) * C.RESAMPLER_CUTOFF_STEP)
+    key = (tier, round(bucket, 4))
+    with filter_bank_lock:
+        bank = filter_bank_cache.get(key)
+    if bank is None:
+        bank = design_filter_bank(tier, bucket)
+        with filter_bank_lock:
+            filter_bank_cache[key] = bank
+    return bank
+
+
+class PolyphaseResampler:
+    # Streaming fractional-ratio resampler. Input is pushed block by block; the last few input
+    # frames and the fractional read position carry over, so the ratio can change every block.
+    # step is input frames consumed per output frame (pitch 1.5 -> step 1.5).
+    # Input history, read positions, gather indices and kernels live in scratch buffers that only
+    # grow, so a steady stream of same-sized blocks allocates nothing per call.
+
+    def __init__(self, channels: int = C.STREAM_CHANNELS, tier: str = 'live'):
+        if tier not in RESAMPLER_TIERS:
+            raise ValueError(f"Unknown resampler tier: {tier}")
+        self.channels = channels
+        self.tier = tier
+        # Enough left context for the widest kernel any ratio bucket can produce
+        self.max_half = int(np.ceil(RESAMPLER_TIERS[tier]['half_taps'] / C.RESAMPLER_MIN_CUTOFF))
+        self.buf = np.zeros((0, self.channels), dtype=np.float32)
+        self.frame_capacity = 0
+        self.tap_scratch: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.reserve(self.max_half + C.STREAM_BLOCK_SIZE * 4, C.STREAM_BLOCK_SIZE)
+        self.reset()
+
+    def reserve(self, input_frames: int, frames: int):
+        # Grow the scratch buffers (never shrinks); the input buffer keeps its history
+        if input_frames > len(self.buf):
+            buf = np.zeros((max(input_frames, 2 * len(self.buf)), self.channels), dtype=np.float32)
+            buf[:len(self.buf)] = self.buf
+            self.buf = buf
+        if frames > self.frame_capacity:
+            self.frame_capacity = frames
+            self.index = np.arange(frames + 1, dtype=np.float64)
+            self.offset_buf = np.zeros(frames + 1)
+            self.t = np.zeros(frames)
+            self.frac = np.zeros(frames)
+            self.base = np.zeros(frames, dtype=np.int64)
+            self.phase = np.zeros(frames, dtype=np.int64)
+
+    def scratch_for(self, taps: int, frames: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Gather indices, kernels and input windows, tap-major, for one filter length (one per ratio
+        # bucket) and block length. Kept whole rather than sliced so every gather writes contiguously.
+        scratch = self.tap_scratch.get((taps, frames))
+        if scratch is None:
+            scratch = (np.zeros((taps, frames), dtype=np.int64), np.zeros((taps, frames), dtype=np.float32),
+                       np.zeros((taps, frames, self.channels), dtype=np.float32))
+            self.tap_scratch[(taps, frames)] = scratch
+        return scratch
+
+    @property
+    def history(self) -> np.ndarray:
+        return self.buf[:self.history_len]
+
+    def reset(self):
+        # The first output lands exactly on the first input frame
+        self.buf[:self.max_half] = 0.0
+        self.history_len = self.max_half
+        self.time = float(self.max_half)
+
+    def offsets(self, frames: int, step: float, end_step: Optional[float] = None) -> np.ndarray:
+        # Read offsets of each output frame from the current position, plus the total advance as
+        # the last entry. With end_step the step ramps linearly across the block (per-sample pitch
+        # glides), reaching end_step on the final frame. The result is scratch, valid until the
+        # next call.
+        self.reserve(0, frames)
+        out = self.offset_buf[:frames + 1]
+        if end_step is None or end_step == step:
+            return np.multiply(self.index[:frames + 1], step, out=out)
+        steps = self.t[:frames]
+        np.multiply(self.index[1:frames + 1], (end_step - step) / frames, out=steps)
+        steps += step
+        out[0] = 0.0
+        np.cumsum(steps, out=out[1:])
+        return out
+
+    def input_needed(self, frames: int, step: float, end_step: Optional[float] = None) -> int:
+        # New input frames required before process() can emit `frames` outputs at this step
+        widest = step if end_step is None else max(step, end_step)
+        half = get_filter_bank(self.tier, widest).shape[0] // 2
+        last = self.time + self.offsets(frames, step, end_step)[frames - 1]
+        return max(0, int(np.floor(last)) + half + 1 - self.history_len)
+
+    def process(self, x: np.ndarray, step: float, frames: int, end_step: Optional[float] = None,
+                gain=1.0, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Push x (at least input_needed(frames, step, end_step) frames) and return exactly `frames`
+        # outputs, written into out when given. gain (a scalar or one value per output frame) is
+        # folded into the interpolation kernels, so it costs no pass over the output.
+        # Everything runs on scratch with no broadcasting, which would make NumPy allocate buffers.
+        bank = get_filter_bank(self.tier, step if end_step is None else max(step, end_step))
+        taps = bank.shape[0]
+        half = taps // 2
+        phases = bank.shape[1] - 1
+
+        total = self.history_len + len(x)
+        self.reserve(total, frames)
+        buf = self.buf
+        buf[self.history_len:total] = x
+        offsets = self.offsets(frames, step, end_step)
+        t, frac, base, phase = self.t[:frames], self.frac[:frames], self.base[:frames], self.phase[:frames]
+        np.add(offsets[:frames], self.time, out=t)
+        np.floor(t, out=frac)
+        base[...] = frac
+        np.subtract(t, frac, out=frac)
+        frac *= phases
+        np.rint(frac, out=frac)
+        phase[...] = frac
+
+        index, kernel, window = self.scratch_for(taps, frames)
+        np.take(bank, phase, axis=1, out=kernel, mode='clip')
+        per_frame_gain = np.ndim(gain) > 0
+        if per_frame_gain:
+            gain = np.reshape(gain, -1)
+        for k in range(taps):
+            np.add(base, k + 1 - half, out=index[k])
+            if per_frame_gain:
+                kernel[k] *= gain
+        if not per_frame_gain and gain != 1.0:
+            kernel *= np.float32(gain)
+        np.take(buf, index, axis=0, out=window, mode='clip')
+        if out is None:
+            out = np.empty((frames, self.channels), dtype=np.float32)
+        np.einsum('tf,tfc->fc', kernel, window, out=out)
+
+        # Keep only the input the next block can still reach
+        self.time += offsets[frames]
+        keep_from = min(int(np.floor(self.time)) - self.max_half, total)
+        self.history_len = total - keep_from
+        if keep_from > 0:
+            buf[:self.history_len] = buf[keep_from:total]
+        self.time -= keep_from
+        return out
+
+    def stream(self, x: np.ndarray, step: float, block_size: int = C.STREAM_BLOCK_SIZE) -> np.ndarray:
+        # Push a whole array through process() block by block at a fixed step
+        self.reset()
+        total = int(len(x) / step)
+        out = np.empty((total, x.shape[1]), dtype=np.float32)
+        src = 0
+        for start in range(0, total, block_size):
+            frames = min(block_size, total - start)
+            need = self.input_needed(frames, step)
+            chunk = x[src:src + need]
+            if len(chunk) < need:
+                chunk = np.concatenate([chunk, np.zeros((need - len(chunk), x.shape[1]), dtype=np.float32)])
+            src += need
+            out[start:start + frames] = self.process(chunk, step, frames)
+        return out
+
+    def ratio(self, step: float) -> Fraction:
+        # step as down / up, the rational ratio resample() runs at
+        return Fraction(step).limit_denominator(RESAMPLER_TIERS[self.tier]['max_denominator'])
+
+    def resample(self, x: np.ndarray, step: float) -> np.ndarray:
+        # Whole array at a fixed ratio: approximate step as down/up and run scipy's polyphase FIR,
+        # which is an order of magnitude faster than the per-block kernel when nothing changes
+        cfg = RESAMPLER_TIERS[self.tier]
+        ratio = self.ratio(step)
+        up, down = ratio.denominator, ratio.numerator
+        y = signal.resample_poly(x, up, down, axis=0, window=('kaiser', cfg['beta']))
+        return y[:len(x) * up // down].astype(np.float32, copy=False)
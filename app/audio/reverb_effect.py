@@ -1,17 +1,103 @@
 
+import os
+import threading
 import numpy as np
+from math import gcd
 from pydub import AudioSegment
-from scipy import signal
-from typing import Dict, Tuple
+from scipy import signal, fft
+from scipy.io import wavfile
+from typing import Tuple, Optional
+from modules import constants as C
+from audio.ir_cache import IRCache
+from audio.ir_bank import IRBank, content_digest
+from audio.partitioned_convolver import PartitionedConvolver, partition_ir
+from audio.audio_sink import segment_to_array
+from audio.master_bus import MasterBus, dry_levels
+from audio.render_scheduler import check_cancelled
+
+
+# Ringing of the wet path's zero-phase 120 Hz high-pass kept clear of the FFT's wrap-around
+HIGHPASS_PAD_S = 0.1
+
+
+def crossfeed_matrix(channels: int, amount: float = C.REVERB_CROSSFEED) -> np.ndarray:
+    # Each wet channel keeps (1 - amount) of its own input and spreads amount evenly over the others
+    if channels == 1:
+        return np.ones((1, 1), dtype=np.float32)
+    m = np.full((channels, channels), amount / (channels - 1), dtype=np.float32)
+    np.fill_diagonal(m, 1.0 - amount)
+    return m
+
+
+def preset_for_amount(reverb_amount: float) -> str:
+    # room -> hall -> plate as the amount grows, shared by both reverb engines
+    if reverb_amount < 0.7:
+        return 'room'
+    if reverb_amount < 1.4:
+        return 'hall'
+    return 'plate'
+
+
+def wet_dry_gains(amount: float) -> Tuple[float, float]:
+    # Equal-power blend between original and reverb: (wet, dry), shared by both reverb engines
+    t = float(np.clip(amount / 2.0, 0.0, 1.0))
+    a = t * (np.pi / 2.0)
+    return float(np.sin(a)), float(np.cos(a))
+
+
+class WetDryGlide:
+    # Wet/dry gains of a streaming reverb gliding per frame from the last block's amount to the
+    # new one, so a moving hand does not step the mix once per block (zipper noise). Scalars when
+    # the amount holds; otherwise (frames, 1) columns in scratch allocated for the block size.
+
+    def __init__(self, block_size: int = C.STREAM_BLOCK_SIZE):
+        self.allocate(block_size)
+
+    def allocate(self, frames: int):
+        self.frames = frames
+        self.ramp = (np.arange(1, frames + 1) / frames).astype(np.float32)
+        self.wet = np.empty((frames, 1), dtype=np.float32)
+        self.dry = np.empty((frames, 1), dtype=np.float32)
+
+    def gains(self, start: Optional[float], end: float, frames: int):
+        wet_end, dry_end = wet_dry_gains(end)
+        if start is None or start == end:
+            return wet_end, dry_end
+        if frames != self.frames:
+            self.allocate(frames)
+        wet_start, dry_start = wet_dry_gains(start)
+        np.multiply(self.ramp, wet_end - wet_start, out=self.wet[:, 0])
+        self.wet += wet_start
+        np.multiply(self.ramp, dry_end - dry_start, out=self.dry[:, 0])
+        self.dry += dry_start
+        return self.wet, self.dry
+
+
+def soft_clip(y: np.ndarray) -> np.ndarray:
+    # tanh saturation shared by the streaming reverbs, in place
+    y *= 0.95
+    np.tanh(y, out=y)
+    y *= 0.92
+    return y
 
 
 class ReverbEffect:
-    # This uses a convolution reverb (room, hall, plate).
+    # This uses a convolution reverb (room, hall, plate, plus any IR WAVs the user drops in).
 
-    def __init__(self):
-        # Cache impulse responses per (sr, time, type)
-        self.cache: Dict[Tuple[int, float, str], np.ndarray] = {}
+    def __init__(self, grid_step: float = C.REVERB_GRID_STEP, cache_bytes: int = C.IR_CACHE_MAX_BYTES,
+                 bank: Optional[IRBank] = None, ir_dir: Optional[str] = C.USER_IR_DIR):
+        # Reverb amount is snapped to a grid so a moving hand reuses a small set of IRs;
+        # IRs are cached per (form, sr, time, type) in a byte-capped LRU backed by the on-disk bank
+        self.grid_step = grid_step
+        self.cache = IRCache(cache_bytes)
+        self.bank = bank if bank is not None else (IRBank() if C.USE_IR_BANK else None)
+        self.selected_type = C.REVERB_TYPE
+        # Partition keys being loaded or built in the background for the audio thread
+        self.pending = set()
+        self.pending_lock = threading.Lock()
         self.setup_reverb_types()
+        if ir_dir and os.path.isdir(ir_dir):
+            self.load_ir_directory(ir_dir)
 
     def setup_reverb_types(self):
         self.types = {
@@ -29,32 +115,174 @@ class ReverbEffect:
             },
         }
 
+    def load_ir_file(self, path: str, name: Optional[str] = None) -> str:
+        # Register a measured impulse response WAV as an extra reverb type; returns its name
+        with open(path, 'rb') as f:
+            digest = content_digest(f.read())
+        sr, data = wavfile.read(path)
+        ir = data.astype(np.float32)
+        if data.dtype == np.uint8:
+            # 8-bit PCM is unsigned, centred on 128
+            ir -= 128.0
+            ir /= 128.0
+        elif np.issubdtype(data.dtype, np.integer):
+            ir /= float(np.iinfo(data.dtype).max)
+        if ir.ndim == 2:
+            ir = ir.mean(axis=1)
+        ir = ir[:int(sr * C.USER_IR_MAX_SECONDS)]
+        if len(ir) == 0:
+            raise ValueError(f"Empty impulse response: {path}")
+
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        self.types[name] = {'samples': ir, 'sample_rate': int(sr), 'digest': digest}
+        return name
+
+    def load_ir_directory(self, directory: str):
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.lower().endswith('.wav'):
+                try:
+                    self.load_ir_file(os.path.join(directory, file_name))
+                except (OSError, ValueError):
+                    pass
+
+    def set_type(self, rtype: str):
+        # 'auto' follows the reverb amount (room -> hall -> plate); anything else pins one type
+        if rtype != 'auto' and rtype not in self.types:
+            raise ValueError(f"Unknown reverb type: {rtype}")
+        self.selected_type = rtype
+
     def apply(self, audio: AudioSegment, reverb_amount: float) -> AudioSegment:
         if reverb_amount <= 0.0:
             return audio
+        y = self.apply_array(self.to_array(audio), reverb_amount, audio.frame_rate)
+        return self.to_audio(y, audio)
+
+    def apply_array(self, x: np.ndarray, reverb_amount: float, sr: int, gain: float = 1.0,
+                    normalize: bool = True, cancel: Optional[threading.Event] = None) -> np.ndarray:
+        # Float32 (frames, channels) in, new array out; x is only read. gain is folded into the mix.
+        # normalize runs the result through a MasterBus matched to the (gained) dry input;
+        # False leaves the level stages to the caller. A set cancel event stops the convolution
+        # between segments with RenderCancelled.
+        if reverb_amount <= 0.0:
+            return x * np.float32(gain)
+        time_s, rtype = self.ir_params(reverb_amount)
+        ir = self.get_ir(sr, time_s, rtype)
+        y = self.convolve_reverb(x, ir, reverb_amount, sr, gain, cancel)
+        if normalize:
+            X = y if y.ndim == 2 else y.reshape(-1, 1)
+            MasterBus(sr, X.shape[1], C.MASTER_RENDER_BLOCK).run(X, dry_levels(x.reshape(len(x), -1), gain))
+        return y
 
-        # Map control to tail length and pick a preset
-        time_s = float(np.interp(reverb_amount, [0.0, 2.0], [0.1, 1.2]))
-        rtype = self.pick_type(reverb_amount)
+    def tail_s(self, reverb_amount: float, sr: int) -> float:
+        # How far apart input and output frames still interact (either way: the convolution is
+        # centred), wet high-pass settling included
+        # (ir_params gives the IR's length without building or loading it)
+        time_s, _ = self.ir_params(reverb_amount)
+        return time_s + 0.1
 
-        x = self.to_array(audio)
-        ir = self.get_ir(audio.frame_rate, time_s, rtype)
-        y = self.convolve_reverb(x, ir, reverb_amount, audio.frame_rate)
-        return self.to_audio(y, audio)
+    def quantize(self, reverb_amount: float) -> float:
+        # Snap to the reverb grid
+        if self.grid_step <= 0:
+            return float(reverb_amount)
+        return float(np.clip(round(reverb_amount / self.grid_step) * self.grid_step, 0.0, 2.0))
+
+    def ir_params(self, reverb_amount: float) -> Tuple[float, str]:
+        # Map control to tail length and pick a preset, both from the quantized amount.
+        # Loaded IRs keep their own length; the amount only drives the wet/dry mix.
+        q = self.quantize(reverb_amount)
+        rtype = self.pick_type(q)
+        cfg = self.types[rtype]
+        if 'samples' in cfg:
+            return round(len(cfg['samples']) / cfg['sample_rate'], 3), rtype
+        return round(float(np.interp(q, [0.0, 2.0], [0.1, 1.2])), 3), rtype
 
     def pick_type(self, reverb_amount: float) -> str:
-        if reverb_amount < 0.7:
-            return 'room'
-        if reverb_amount < 1.4:
-            return 'hall'
-        return 'plate'
+        if self.selected_type != 'auto':
+            return self.selected_type
+        return preset_for_amount(reverb_amount)
 
     def get_ir(self, sr: int, time_s: float, rtype: str) -> np.ndarray:
-        # Use cached IR when possible
-        key = (int(sr), round(float(time_s), 3), rtype)
-        if key not in self.cache:
-            self.cache[key] = self.generate_ir(sr, time_s, rtype)
-        return self.cache[key]
+        # Time-domain IR for whole-track convolution
+        key = ('time', int(sr), round(float(time_s), 3), rtype)
+        return self.cache.get(key, lambda: self.from_bank(key, lambda: self.build_ir(sr, time_s, rtype)))
+
+    def get_partitions(self, sr: int, time_s: float, rtype: str, block_size: int) -> np.ndarray:
+        # IR already split and transformed for the partitioned convolver. The wet path's 120 Hz
+        # high-pass is baked in (both are linear), so the block path needs no filter of its own.
+        key = ('partitioned_hp', int(sr), round(float(time_s), 3), rtype, block_size)
+        return self.cache.get(key, lambda: self.from_bank(
+            key, lambda: partition_ir(self.highpass_ir(self.build_ir(sr, time_s, rtype), sr), block_size)))
+
+    def partitions_ready(self, sr: int, time_s: float, rtype: str, block_size: int) -> Optional[np.ndarray]:
+        # Non-blocking get_partitions for the audio thread: the cached partitions, or None while a
+        # background thread maps them from the bank (or synthesizes them) into the cache
+        key = ('partitioned_hp', int(sr), round(float(time_s), 3), rtype, block_size)
+        partitions = self.cache.peek(key)
+        if partitions is None:
+            with self.pending_lock:
+                if key in self.pending:
+                    return None
+                self.pending.add(key)
+            threading.Thread(target=self.fill, args=(key, sr, time_s, rtype, block_size), daemon=True).start()
+        return partitions
+
+    def fill(self, key: tuple, sr: int, time_s: float, rtype: str, block_size: int):
+        try:
+            self.get_partitions(sr, time_s, rtype, block_size)
+        finally:
+            with self.pending_lock:
+                self.pending.discard(key)
+
+    def highpass_ir(self, ir: np.ndarray, sr: int) -> np.ndarray:
+        # Same causal 2nd-order Butterworth the streaming wet path used to run per block. The IR
+        # is padded by 50 ms first so the filter's own ringing past the end is kept.
+        sos = signal.butter(2, min(0.99, 120.0 / (sr / 2.0)), 'high', output='sos')
+        padded = np.concatenate([ir, np.zeros(int(0.05 * sr), dtype=ir.dtype)])
+        return signal.sosfilt(sos, padded).astype(np.float32)
+
+    def from_bank(self, key: tuple, build) -> np.ndarray:
+        # Bank file name: form, sample rate, block size and a hash of what the IR is made from
+        if self.bank is None:
+            return build()
+        form, sr, time_s, rtype = key[:4]
+        block_size = key[4] if len(key) > 4 else 0
+        cfg = self.types[rtype]
+        if 'digest' in cfg:
+            recipe = (cfg['digest'],)
+        else:
+            recipe = (C.IR_GENERATOR_VERSION, rtype, time_s, sorted(cfg.items()))
+        return self.bank.get(f"{form}_{sr}_{block_size}_{content_digest(repr(recipe).encode())}", build)
+
+    def build_ir(self, sr: int, time_s: float, rtype: str) -> np.ndarray:
+        # Loaded IRs are resampled to the stream rate; presets are synthesized
+        cfg = self.types[rtype]
+        if 'samples' not in cfg:
+            return self.generate_ir(sr, time_s, rtype)
+        ir = cfg['samples']
+        if cfg['sample_rate'] != sr:
+            g = gcd(int(sr), cfg['sample_rate'])
+            ir = signal.resample_poly(ir, int(sr) // g, cfg['sample_rate'] // g)
+        ir = ir - np.mean(ir)
+        l2 = float(np.sqrt(np.sum(ir.astype(np.float64) ** 2)))
+        if l2 > 1e-12:
+            ir = ir / l2
+        return (ir * 0.35).astype(np.float32)
+
+    def warm(self, sr: int, block_size: int):
+        # Pull every grid point through the cache (mapped from the bank after the first run)
+        # so the first reverb gesture does not stall on IR synthesis
+        steps = int(round(2.0 / self.grid_step)) if self.grid_step > 0 else 0
+        for i in range(1, steps + 1):
+            time_s, rtype = self.ir_params(i * self.grid_step)
+            self.get_partitions(sr, time_s, rtype, block_size)
+
+    def warm_async(self, sr: int, block_size: int) -> threading.Thread:
+        thread = threading.Thread(target=self.warm, args=(sr, block_size), daemon=True)
+        thread.start()
+        return thread
+
+    def get_cache_stats(self):
+        return self.cache.get_stats()
 
     def generate_ir(self, sr: int, time_s: float, rtype: str) -> np.ndarray:
         # Impulse response: early echoes + fading tail + gentle tone shaping
@@ -98,58 +326,148 @@ class ReverbEffect:
         return ir.astype(np.float32)
 
     def wet_dry(self, amount: float) -> Tuple[float, float]:
-        # Equal-power blend between original and reverb 
-        t = float(np.clip(amount / 2.0, 0.0, 1.0))
-        a = t * (np.pi / 2.0)
-        return float(np.sin(a)), float(np.cos(a))
+        return wet_dry_gains(amount)
 
     def to_array(self, audio: AudioSegment) -> np.ndarray:
-        # 16-bit PCM -> float32 [-1, 1]; stereo -> (N, 2)
-        arr = np.array(audio.get_array_of_samples(), dtype=np.float32) / 32768.0
-        if audio.channels == 2:
-            arr = arr.reshape((-1, 2))
-        return arr
+        # PCM -> float32 [-1, 1] as (N, channels)
+        return segment_to_array(audio)
 
     def to_audio(self, arr: np.ndarray, ref: AudioSegment) -> AudioSegment:
         arr = np.clip(arr, -1.0, 1.0)
         i16 = np.ascontiguousarray((arr * 32767.0).astype(np.int16))
         return ref._spawn(i16.tobytes())
 
-    def convolve_reverb(self, x: np.ndarray, ir: np.ndarray, amount: float, sr: int) -> np.ndarray:
-        # Convolution + small stereo crossfeed; high-pass wet; RMS match
+    def convolve_reverb(self, x: np.ndarray, ir: np.ndarray, amount: float, sr: int, gain: float = 1.0,
+                        cancel: Optional[threading.Event] = None) -> np.ndarray:
+        # Convolution + small crossfeed; high-pass wet; soft clip. Convolution is linear, so the
+        # crossfeed is applied to the input and every channel goes through one (nfft, channels)
+        # transform. The wet path is an overlap-add over segments of REVERB_RENDER_SEGMENT_S, so
+        # only one segment's FFT buffers are alive at once and a set cancel event stops the render
+        # between segments. Each segment sits HIGHPASS_PAD_S into an FFT that long again past the
+        # linear convolution: the zero-phase high-pass rings on both sides, and the padding keeps
+        # that ringing from wrapping around.
         wet, dry = self.wet_dry(amount)
         X = x if x.ndim == 2 else x.reshape(-1, 1)
-        Y = np.zeros_like(X)
+        n, L = X.shape[0], len(ir)
+        pad = int(HIGHPASS_PAD_S * sr)
+        segment = max(1, min(n, int(C.REVERB_RENDER_SEGMENT_S * sr)))
+        nfft = fft.next_fast_len(pad + segment + L - 1 + pad, real=True)
+        start = (L - 1) // 2
+        kernel = (fft.rfft(ir, nfft) * self.highpass_response(sr, nfft))[:, None]
+        feed = crossfeed_matrix(X.shape[1]).T.astype(np.float32)
+        frame = np.zeros((nfft, X.shape[1]), dtype=np.float32)
 
+        out = np.multiply(X, np.float32(dry * gain), dtype=np.float32)
+        for offset in range(0, n, segment):
+            check_cancelled(cancel)
+            m = min(segment, n - offset)
+            frame.fill(0.0)
+            np.matmul(X[offset:offset + m], feed, out=frame[pad:pad + m])
+            spectrum = fft.rfft(frame, axis=0)
+            spectrum *= kernel
+            W = fft.irfft(spectrum, nfft, axis=0)
+            del spectrum
+            # W[i] is output frame offset - pad - start + i (the convolution is centred)
+            lo = offset - pad - start
+            a, b = max(0, -lo), min(nfft, n - lo)
+            if b > a:
+                W *= wet * gain
+                out[lo + a:lo + b] += W[a:b]
+            del W
+
+        soft_clip(out)
+        return out if x.ndim == 2 else out[:, 0]
+
+    def highpass_response(self, sr: int, nfft: int) -> np.ndarray:
+        # 120 Hz Butterworth run forwards and backwards (zero phase) has magnitude |H|^2, applied
+        # to the wet spectrum on the convolution's FFT grid
         nyq = sr / 2.0
-        hp = min(0.99, 120.0 / nyq)
-        b_hp, a_hp = signal.butter(2, hp, 'high')
-
-        for ch in range(X.shape[1]):
-            wd = signal.fftconvolve(X[:, ch], ir, mode='same')
-            if X.shape[1] == 2:
-                wc = signal.fftconvolve(X[:, 1 - ch], ir, mode='same')
-                w = wd * 0.8 + wc * 0.2
-            else:
-                w = wd
-            try:
-                w = signal.filtfilt(b_hp, a_hp, w)
-            except Exception:
-                pass
-            Y[:, ch] = X[:, ch] * dry + w * wet
-
-        xr = float(np.sqrt(np.mean(X.astype(np.float64) ** 2))) + 1e-12
-        yr = float(np.sqrt(np.mean(Y.astype(np.float64) ** 2))) + 1e-12
-        if yr > xr:
-            Y *= (xr / yr)
-
-        out = Y if x.ndim == 2 else Y[:, 0]
-        return self.post(out)
-
-    def post(self, y: np.ndarray) -> np.ndarray:
-        # Soft clip and cap peak
-        y = np.tanh(y * 0.95) * 0.92
-        pk = float(np.max(np.abs(y)))
-        if pk > 0.95:
-            y = y / pk * 0.95
-        return y
\ No newline at end of file
+        b_hp, a_hp = signal.butter(2, min(0.99, 120.0 / nyq), 'high')
+        _, h = signal.freqz(b_hp, a_hp, worN=np.linspace(0.0, np.pi, nfft // 2 + 1))
+        return (np.abs(h) ** 2).astype(np.float32)
+
+
+class BlockReverb:
+    # Streaming counterpart of ReverbEffect. The convolution runs through a partitioned
+    # convolver whose frequency-domain delay line carries the tail between blocks. Crossfeed,
+    # mix and soft clip run in place over preallocated buffers. When the amount drops to 0 the
+    # input stops feeding the convolver but the tail already in it rings out over the dry signal.
+    # Unless wait_for_ir (offline renders), an IR missing from the cache is never loaded on the
+    # calling thread: the previous IR stays in use (or the wet path is silent) until it arrives.
+
+    def __init__(self, reverb: ReverbEffect, sample_rate: int, channels: int = 2,
+                 block_size: int = C.STREAM_BLOCK_SIZE, wait_for_ir: bool = False):
+        self.reverb = reverb
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.wait_for_ir = wait_for_ir
+        self.glide = WetDryGlide(block_size)
+        self.convolver = PartitionedConvolver(block_size, channels)
+        self.crossfeed = crossfeed_matrix(channels).T
+        self.feed = np.zeros((block_size, channels), dtype=np.float32)
+        self.ir_key: Optional[Tuple[float, str]] = None
+        self.reset()
+
+    def reset(self):
+        # Drop the ringing tail and filter memory (used on seek or new track)
+        self.active = False
+        self.wet = 0.0
+        self.tail_left = 0
+        self.convolver.reset()
+
+    def process(self, x: np.ndarray, reverb_amount: float, out: Optional[np.ndarray] = None,
+                start_amount: Optional[float] = None) -> np.ndarray:
+        # x is a (frames, channels) float32 block; returns the wet/dry mix for that block, written
+        # into out when given (out may be x itself). With start_amount the mix glides across the
+        # block from that amount to reverb_amount. With the reverb off x is returned as is once
+        # the tail has rung out.
+        if reverb_amount <= 0.0:
+            if self.active:
+                return self.release(x, out, start_amount)
+            return x
+        self.active = True
+        self.tail_left = 0
+
+        key = self.reverb.ir_params(reverb_amount)
+        if key != self.ir_key:
+            lookup = self.reverb.get_partitions if self.wait_for_ir else self.reverb.partitions_ready
+            partitions = lookup(self.sample_rate, *key, self.block_size)
+            if partitions is not None:
+                self.convolver.set_partitions(partitions)
+                self.ir_key = key
+        wet, dry = self.glide.gains(start_amount, reverb_amount, len(x))
+        self.wet = wet_dry_gains(reverb_amount)[0]
+
+        # Crossfeed before convolution (convolution is linear)
+        if len(x) > len(self.feed):
+            self.feed = np.zeros((len(x), self.channels), dtype=np.float32)
+        w = self.convolver.process(np.matmul(x, self.crossfeed, out=self.feed[:len(x)]))
+        if out is None:
+            out = np.empty_like(x)
+        w *= wet
+        np.multiply(x, dry, out=out)
+        out += w
+        return soft_clip(out)
+
+    def release(self, x: np.ndarray, out: Optional[np.ndarray], start_amount: Optional[float] = None) -> np.ndarray:
+        # Reverb just turned off: silence goes into the convolver and what is left of the tail is
+        # added to the dry block (its gain gliding up to 1) at the last wet gain. After one IR
+        # length (plus the convolver's block of latency) nothing is left and the state is cleared.
+        if self.tail_left <= 0:
+            parts = self.convolver.partitions
+            self.tail_left = ((len(parts) if parts is not None else 0) + 1) * self.block_size
+        if len(x) > len(self.feed):
+            self.feed = np.zeros((len(x), self.channels), dtype=np.float32)
+        silence = self.feed[:len(x)]
+        silence.fill(0.0)
+        w = self.convolver.process(silence)
+        w *= self.wet
+        if out is None:
+            out = np.empty_like(x)
+        np.multiply(x, self.glide.gains(start_amount, 0.0, len(x))[1], out=out)
+        out += w
+        self.tail_left -= len(x)
+        if self.tail_left <= 0:
+            self.reset()
+        return out
@@ -0,0 +1,256 @@
+import numpy as np
+from pydub import AudioSegment
+from typing import Optional, Callable, Dict, Sequence, Tuple
+from modules import constants as C
+from audio.audio_effects import AudioEffects
+from audio.reverb_effect import ReverbEffect, BlockReverb
+from audio.fdn_reverb import FDNReverb
+from audio.resampler import PolyphaseResampler
+from audio.pitch_shifter import PitchShifter
+from audio.param_mailbox import ParameterMailbox, ParameterRamp
+from audio.audio_sink import AudioSink, create_sink, segment_to_array, match_channels
+from audio.track_store import ResidentWindow
+from audio.transport_clock import TransportClock
+from audio.master_bus import MasterBus
+from audio.dsp_graph import DSPGraph, GainNode, PitchShiftNode, FilterNode, DelayNode, ReverbNode, MasterNode
+from audio.tempo import estimate_tempo
+
+
+class StreamEngine:
+    # Real-time engine that pulls fixed-size blocks from the decoded track and runs the
+    # effect chain per block as the output sink asks for them. New parameters take effect on
+    # the next block, so latency is bounded by the block size rather than the track length.
+    # The resampler reads the track; everything after it is a DSPGraph of stateful nodes in
+    # STREAM_GRAPH order, working in place on scratch owned by the engine. When gain is the
+    # first node after a varispeed read, its ramp is folded into the resampler's kernels.
+
+    def __init__(self, sample_rate: int = C.DEFAULT_SAMPLE_RATE, block_size: int = C.STREAM_BLOCK_SIZE,
+                 sink: Optional[AudioSink] = None, status_callback: Optional[Callable[[str], None]] = None):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.channels = C.STREAM_CHANNELS
+        self.sink = sink if sink is not None else create_sink(sample_rate=sample_rate)
+        self.status_callback = status_callback
+
+        self.track: Optional[np.ndarray] = None
+        self.track_rate = sample_rate
+        self.read_pos = 0.0
+        self.source_pos = 0
+        self.finished = False
+        # Pages of a memory-mapped track are released once the read has moved past them
+        self.resident = ResidentWindow(int(C.TRACK_RESIDENT_S * sample_rate))
+        # Output frames delivered, timed against the wall clock (the position itself is read_pos)
+        self.clock = TransportClock(sample_rate)
+
+        # Parameters arrive through a lock-free mailbox and are ramped across each block
+        defaults = {'volume': C.DEFAULT_VOLUME, 'pitch': C.DEFAULT_PITCH, 'reverb': C.DEFAULT_REVERB,
+                    'filter': C.DEFAULT_FILTER, 'echo': C.DEFAULT_ECHO}
+        self.mailbox = ParameterMailbox(defaults)
+        self.ramp = ParameterRamp(defaults, block_size)
+
+        # Offline sinks wait for every IR so renders come out the same each time
+        self.convolution_reverb = BlockReverb(ReverbEffect(), sample_rate, self.channels, block_size,
+                                              wait_for_ir=not self.sink.realtime)
+        self.reverb_engines = {'convolution': self.convolution_reverb, 'fdn': FDNReverb(sample_rate, self.channels)}
+        self.resampler = PolyphaseResampler(self.channels, 'live')
+        self.pitch_shifter = PitchShifter(self.channels)
+
+        # Running RMS match and look-ahead limiter on the master bus, after the reverb
+        self.gain = GainNode(AudioEffects.volume_gain, self.ramp, block_size)
+        self.pitch_shift = PitchShiftNode(self.pitch_shifter)
+        self.delay = DelayNode(sample_rate, self.channels, block_size)
+        self.reverb_node = ReverbNode(self.reverb_engines[C.REVERB_ENGINE])
+        self.graph = DSPGraph({
+            'pitch_shift': self.pitch_shift,
+            'gain': self.gain,
+            'filter': FilterNode(sample_rate, self.channels),
+            'delay': self.delay,
+            'reverb': self.reverb_node,
+            'master': MasterNode(MasterBus(sample_rate, self.channels, block_size), self.reverb_node),
+        }, C.STREAM_GRAPH, sample_rate, enforce_budget=self.sink.realtime)
+        self.set_pitch_mode(C.PITCH_MODE)
+
+        # Per-block scratch; grown if a sink ever asks for more than block_size frames
+        self.out_block = np.zeros((block_size, self.channels), dtype=np.float32)
+
+        self.is_playing = False
+
+    def load(self, audio: AudioSegment):
+        # Decode once into a float32 array; every block is read from this buffer
+        self.load_array(segment_to_array(audio), audio.frame_rate)
+
+    def load_array(self, track: np.ndarray, track_rate: int):
+        # Use an already decoded float32 (frames, channels) track as is; it is only ever read.
+        # Its tempo sets the echo's note lengths.
+        self.install_track(*self.prepare_track(track, track_rate))
+
+    def prepare_track(self, track: np.ndarray, track_rate: int) -> Tuple[np.ndarray, int, float]:
+        # The slow half of a load, which leaves the engine alone: the track in the output's
+        # channels and its tempo, with the reverb's impulse response warming in the background
+        track = match_channels(track, self.channels)
+        self.convolution_reverb.reverb.warm_async(self.sample_rate, self.block_size)
+        return track, track_rate, estimate_tempo(track, track_rate)
+
+    def install_track(self, track: np.ndarray, track_rate: int, tempo_bpm: float):
+        # The quick half: swap the prepared track in and cue it from the top
+        self.track = track
+        self.track_rate = track_rate
+        self.delay.tempo_bpm = tempo_bpm
+        self.seek_frames(0)
+
+    def set_param(self, name: str, value: float):
+        # Never blocks: the renderer picks the newest value up at its next block
+        self.mailbox.post(name, value)
+
+    def set_params(self, new_params: Dict[str, float]):
+        self.mailbox.post_many(new_params)
+
+    def set_reverb_engine(self, name: str):
+        # Swapped between blocks; the new engine starts with an empty tail
+        if name not in self.reverb_engines:
+            raise ValueError(f"Unknown reverb engine: {name}")
+        engine = self.reverb_engines[name]
+        engine.reset()
+        self.reverb_node.reverb = engine
+
+    def set_pitch_mode(self, mode: str):
+        # 'varispeed' reads the track faster or slower; 'keylock' keeps the tempo and shifts pitch
+        # with the phase vocoder, which adds PitchShifter.latency frames of delay
+        if mode not in ('varispeed', 'keylock'):
+            raise ValueError(f"Unknown pitch mode: {mode}")
+        self.pitch_shifter.reset()
+        self.pitch_mode = mode
+        self.pitch_shift.active = mode == 'keylock'
+
+    def set_delay_division(self, name: str):
+        # Note length of the echo (a DELAY_DIVISIONS key); the delay glides to it
+        self.delay.set_division(name)
+
+    def get_tempo(self) -> float:
+        # Estimated tempo of the loaded track in BPM, before varispeed
+        return self.delay.tempo_bpm
+
+    def set_graph_order(self, order: Sequence[str]):
+        # Reorder the effect nodes (names as in STREAM_GRAPH); takes effect from the next block
+        self.graph.set_order(order)
+
+    def get_graph_stats(self) -> Dict:
+        return self.graph.get_stats()
+
+    def render(self, frames: int) -> Optional[np.ndarray]:
+        # Produce the next block of output: varispeed read at the track rate times pitch (or at the
+        # track rate for keylock), then the graph. Parameters glide per sample from the last
+        # block's values to the newest ones. The block returned is engine scratch, valid until
+        # the next call.
+        if self.finished:
+            return None
+        _, targets = self.mailbox.read()
+        spans = self.ramp.next(targets)
+        if frames > len(self.out_block):
+            self.out_block = np.zeros((frames, self.channels), dtype=np.float32)
+        block = self.out_block[:frames]
+
+        rate = self.track_rate / self.sample_rate
+        if self.pitch_mode == 'keylock':
+            self.read_block(frames, rate, out=block)
+            skip = ()
+            self.delay.speed = 1.0
+        else:
+            pitch_start, pitch_end = spans['pitch']
+            fold = self.graph.leads('gain', passive=('pitch_shift',))
+            gain = self.gain.curve(spans, frames) if fold else 1.0
+            self.read_block(frames, pitch_start * rate, pitch_end * rate, gain, out=block)
+            skip = ('gain',) if fold else ()
+            # The beat speeds up and slows down with the read; the echo keeps to it
+            self.delay.speed = pitch_end
+        self.clock.advance(frames)
+        return self.graph.process(block, spans, skip)
+
+    def seek_frames(self, frame: int):
+        # Restart the read at a source frame with empty resampler and reverb state
+        self.read_pos = float(frame)
+        self.source_pos = int(frame)
+        self.finished = False
+        self.clock.seek(0)
+        self.resident.reset(self.source_pos)
+        self.ramp.snap(self.mailbox.read()[1])
+        self.resampler.reset()
+        self.graph.reset()
+
+    def read_block(self, frames: int, step: float, end_step: Optional[float] = None, gain=1.0,
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Varispeed read through the polyphase resampler; it carries its own input history, so
+        # only the source frames it has not seen yet are fed in. gain is applied by the resampler.
+        need = self.resampler.input_needed(frames, step, end_step)
+        chunk = self.track[self.source_pos:self.source_pos + need]
+        if len(chunk) < need:
+            chunk = np.concatenate([chunk, np.zeros((need - len(chunk), self.channels), dtype=np.float32)])
+        self.source_pos += need
+        self.resident.advance(self.track, self.source_pos)
+        block = self.resampler.process(chunk, step, frames, end_step, gain, out)
+
+        offsets = self.resampler.offsets(frames, step, end_step)
+        end = len(self.track) - self.read_pos
+        if end < offsets[frames]:
+            block[offsets[:frames] >= end] = 0.0
+            self.finished = True
+        self.read_pos += offsets[frames]
+        return block
+
+    def on_sink_finished(self):
+        self.clock.pause()
+        self.is_playing = False
+        self.notify_status("Finished")
+
+    def play(self, start_position_s: float = 0.0) -> bool:
+        if self.track is None:
+            self.notify_status("No audio loaded.")
+            return False
+        try:
+            self.sink.stop()
+            self.clock.pause()
+            self.seek_frames(int(start_position_s * self.track_rate))
+            self.sink.start(self.render, self.on_sink_finished)
+            self.is_playing = True
+            self.notify_status("Playing")
+            return True
+        except Exception as e:
+            self.notify_status(f"Playback error: {e}")
+            return False
+
+    def pause(self):
+        if self.is_playing:
+            self.sink.stop()
+            self.clock.pause()
+            self.is_playing = False
+            self.notify_status("Paused")
+
+    def resume(self):
+        if not self.is_playing and self.track is not None and not self.finished:
+            self.sink.start(self.render, self.on_sink_finished)
+            self.is_playing = True
+            self.notify_status("Resumed")
+
+    def get_current_position_s(self, latency_frames: Optional[int] = None) -> float:
+        # Seconds into the source track being heard: the read position, less the output frames
+        # still queued in the sink (latency_frames when another sink plays this engine's output)
+        # and, in keylock, inside the phase vocoder, at the rate the read is moving
+        if latency_frames is None:
+            latency_frames = self.sink.latency_frames if self.is_playing else 0
+        step = self.track_rate / self.sample_rate
+        if self.pitch_mode == 'keylock':
+            latency_frames += self.pitch_shifter.latency
+        else:
+            step *= self.ramp.current.get('pitch', C.DEFAULT_PITCH)
+        return max(0.0, self.read_pos - latency_frames * step) / self.track_rate
+
+    def get_transport_stats(self) -> Dict[str, float]:
+        return self.clock.get_stats()
+
+    def notify_status(self, message: str):
+        if self.status_callback:
+            self.status_callback(message)
+
+    def cleanup(self):
+        self.sink.close()
+        self.is_playing = False
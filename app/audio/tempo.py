@@ -0,0 +1,46 @@
+import numpy as np
+from modules import constants as C
+
+
+def onset_envelope(x: np.ndarray, sample_rate: int, hop: int = 512) -> np.ndarray:
+    # Positive changes of log energy per hop of a (frames, channels) signal, the mean removed
+    frames = len(x) // hop
+    mono = x[:frames * hop].mean(axis=1) if x.ndim == 2 else x[:frames * hop]
+    energy = np.einsum('ij,ij->i', mono.reshape(frames, hop), mono.reshape(frames, hop))
+    flux = np.maximum(np.diff(np.log1p(1000.0 * energy)), 0.0)
+    return flux - flux.mean() if len(flux) else flux
+
+
+def estimate_tempo(x: np.ndarray, sample_rate: int, hop: int = 512) -> float:
+    # Beats per minute of a float32 track, from the autocorrelation of its onset envelope over
+    # TEMPO_ANALYSIS_S seconds around the middle. Lags between TEMPO_MAX_BPM and TEMPO_MIN_BPM
+    # are searched, weighted towards 120 BPM so a half or double tempo only wins when it is
+    # clearly stronger. DELAY_DEFAULT_BPM when there is too little audio or the best period
+    # repeats less than TEMPO_MIN_PERIODICITY of the envelope's energy (no steady beat).
+    span = int(C.TEMPO_ANALYSIS_S * sample_rate)
+    start = max(0, (len(x) - span) // 2)
+    envelope = onset_envelope(x[start:start + span], sample_rate, hop)
+    fps = sample_rate / hop
+    lo, hi = int(60.0 * fps / C.TEMPO_MAX_BPM), int(np.ceil(60.0 * fps / C.TEMPO_MIN_BPM))
+    if len(envelope) < 4 * hi or not envelope.any():
+        return C.DELAY_DEFAULT_BPM
+
+    n = 1 << int(np.ceil(np.log2(2 * len(envelope))))
+    spectrum = np.fft.rfft(envelope, n)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), n)[:hi + 2]
+    if autocorr[0] <= 0.0:
+        return C.DELAY_DEFAULT_BPM
+    lags = np.arange(lo, hi + 1)
+    weight = np.exp(-0.5 * np.log2(lags * 120.0 / (60.0 * fps)) ** 2)
+    scores = autocorr[lo:hi + 1] * weight
+    best = int(np.argmax(scores))
+    if autocorr[lo + best] < C.TEMPO_MIN_PERIODICITY * autocorr[0]:
+        return C.DELAY_DEFAULT_BPM
+
+    # Parabolic interpolation between neighbouring lags for a fractional period
+    lag = float(lags[best])
+    if 0 < best < len(scores) - 1:
+        a, b, c = scores[best - 1], scores[best], scores[best + 1]
+        if a - 2 * b + c < 0:
+            lag += 0.5 * (a - c) / (a - 2 * b + c)
+    return float(60.0 * fps / lag)
@@ -0,0 +1,216 @@
+import os
+import mmap
+import wave
+import atexit
+import weakref
+import tempfile
+import subprocess
+import numpy as np
+from pydub import AudioSegment
+from typing import Optional, Tuple
+from modules import constants as C
+from audio.audio_sink import segment_to_array, match_channels
+
+
+# Temporary files that could not be unlinked while mapped (Windows); removed at exit
+pending_removal = []
+
+
+def remove_pending():
+    for path in pending_removal:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+atexit.register(remove_pending)
+
+# Mappings made by map_file; other mmap-backed arrays (shared memory) are not tracks on disk
+track_mappings = weakref.WeakSet()
+
+
+class TrackWriter:
+    # Appends float32 (frames, channels) chunks to a temporary file, then maps it. Nothing but
+    # the current chunk is ever held in memory.
+
+    def __init__(self, channels: int, directory: Optional[str] = C.TRACK_STORE_DIR):
+        self.channels = channels
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix=C.TEMP_FILE_PREFIX, suffix='.f32', dir=directory)
+        self.file = os.fdopen(fd, 'wb')
+        self.frames = 0
+
+    def write(self, chunk: np.ndarray):
+        chunk = np.ascontiguousarray(match_channels(chunk, self.channels), dtype=np.float32)
+        self.file.write(chunk.tobytes())
+        self.frames += len(chunk)
+
+    def finish(self, writable: bool = False) -> np.ndarray:
+        self.file.close()
+        return map_file(self.path, self.channels, writable)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+def map_file(path: str, channels: int, writable: bool = False) -> np.ndarray:
+    # Map a raw float32 file as a (frames, channels) array. The file is unlinked straight away
+    # where the OS allows it, so the data goes away with the last view of the array.
+    if os.path.getsize(path) == 0:
+        os.remove(path)
+        return np.zeros((0, channels), dtype=np.float32)
+    with open(path, 'r+b' if writable else 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+    track_mappings.add(mm)
+    try:
+        os.remove(path)
+    except OSError:
+        pending_removal.append(path)
+    return np.frombuffer(mm, dtype=np.float32).reshape(-1, channels)
+
+
+def allocate(frames: int, channels: int, directory: Optional[str] = C.TRACK_STORE_DIR) -> np.ndarray:
+    # Zero-filled, writable disk-backed (frames, channels) buffer; the file is sparse until written
+    writer = TrackWriter(channels, directory)
+    writer.file.truncate(frames * channels * 4)
+    return writer.finish(writable=True)
+
+
+def decode_file(path: str, sample_rate: int, channels: int) -> Tuple[np.ndarray, int]:
+    # Decode an audio file into a mapped track, one chunk at a time. PCM WAVs are read directly
+    # at their own rate; anything else is streamed out of ffmpeg as float32 at sample_rate.
+    try:
+        return decode_wav(path, channels)
+    except (wave.Error, EOFError, ValueError):
+        return decode_ffmpeg(path, sample_rate, channels), sample_rate
+
+
+def decode_wav(path: str, channels: int) -> Tuple[np.ndarray, int]:
+    with wave.open(path, 'rb') as wav:
+        width, file_channels = wav.getsampwidth(), wav.getnchannels()
+        if width not in (1, 2, 4):
+            raise ValueError(f"Unsupported WAV sample width: {width}")
+        chunk_frames = int(C.TRACK_DECODE_CHUNK_S * wav.getframerate())
+        writer = TrackWriter(channels)
+        try:
+            while True:
+                data = wav.readframes(chunk_frames)
+                if not data:
+                    break
+                if width == 1:
+                    # 8-bit WAV is unsigned
+                    pcm = np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0
+                else:
+                    pcm = np.frombuffer(data, dtype=np.int16 if width == 2 else np.int32).astype(np.float32)
+                pcm *= 1.0 / float(1 << (8 * width - 1))
+                writer.write(pcm.reshape(-1, file_channels))
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.finish(), wav.getframerate()
+
+
+def decode_ffmpeg(path: str, sample_rate: int, channels: int) -> np.ndarray:
+    # ffmpeg (pydub's configured converter) writes float32 PCM to a pipe, read a chunk at a time
+    command = [AudioSegment.converter, '-v', 'error', '-i', path, '-f', 'f32le',
+               '-ac', str(channels), '-ar', str(sample_rate), '-']
+    chunk_bytes = int(C.TRACK_DECODE_CHUNK_S * sample_rate) * channels * 4
+    writer = TrackWriter(channels)
+    try:
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+            pending = b''
+            while True:
+                data = proc.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                data = pending + data
+                usable = len(data) - len(data) % (channels * 4)
+                writer.write(np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, channels))
+                pending = data[usable:]
+            error = proc.stderr.read()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {path}: {error.decode(errors='replace').strip()}")
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish()
+
+
+def segment_chunks(audio: AudioSegment):
+    # Float32 (frames, channels) chunks of an already decoded segment, TRACK_DECODE_CHUNK_S each
+    chunk_frames = int(C.TRACK_DECODE_CHUNK_S * audio.frame_rate)
+    total = int(audio.frame_count())
+    for start in range(0, total, chunk_frames):
+        yield segment_to_array(audio.get_sample_slice(start, min(total, start + chunk_frames)))
+
+
+def from_segment(audio: AudioSegment, channels: int) -> np.ndarray:
+    # Move an already decoded segment out of core, converting a chunk at a time
+    writer = TrackWriter(channels)
+    for chunk in segment_chunks(audio):
+        writer.write(chunk)
+    return writer.finish()
+
+
+def segment_into(audio: AudioSegment, out: np.ndarray) -> np.ndarray:
+    # Convert a decoded segment a chunk at a time into out, a (frames, channels) float32 array
+    # of its length (shared memory, say), so no second full-size copy is made
+    start = 0
+    for chunk in segment_chunks(audio):
+        out[start:start + len(chunk)] = match_channels(chunk, out.shape[1])
+        start += len(chunk)
+    return out
+
+
+def is_mapped(track: Optional[np.ndarray]) -> bool:
+    return mapping_of(track)[0] is not None
+
+
+def mapping_of(track: Optional[np.ndarray]) -> Tuple[Optional[mmap.mmap], Optional[np.ndarray]]:
+    # The mmap behind a view of a mapped track, and the array that spans the whole mapping
+    # (map_file mappings only)
+    root = track
+    while isinstance(root, np.ndarray) and isinstance(root.base, np.ndarray):
+        root = root.base
+    base = getattr(root, 'base', None)
+    if isinstance(base, memoryview):
+        base = base.obj
+    return (base, root) if isinstance(base, mmap.mmap) and base in track_mappings else (None, None)
+
+
+def release_pages(track: np.ndarray, start: int, end: int):
+    # Drop the resident pages holding frames [start, end) of a mapped track. The data stays in the
+    # file (written pages included) and is paged back in if read again. No-op for in-memory arrays.
+    mm, root = mapping_of(track)
+    if mm is None or not hasattr(mm, 'madvise') or end <= start:
+        return
+    offset = track.ctypes.data - root.ctypes.data
+    first = offset + start * track.strides[0]
+    last = min(offset + end * track.strides[0], len(mm))
+    first = -(-first // mmap.PAGESIZE) * mmap.PAGESIZE
+    last = last // mmap.PAGESIZE * mmap.PAGESIZE
+    if last > first:
+        mm.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+
+class ResidentWindow:
+    # Keeps a mapped track's resident set to a window around a moving read position: whatever
+    # lies more than `behind` frames before it is released in steps of `behind` frames.
+
+    def __init__(self, behind: int):
+        self.behind = max(1, behind)
+        self.released_to = 0
+
+    def reset(self, frame: int = 0):
+        # After a seek the pages from the new position on are faulted in afresh
+        self.released_to = min(self.released_to, max(0, frame - self.behind))
+
+    def advance(self, track: Optional[np.ndarray], frame: int):
+        upto = frame - self.behind
+        if track is None or upto - self.released_to < self.behind:
+            return
+        release_pages(track, self.released_to, upto)
+        self.released_to = upto
@@ -0,0 +1,61 @@
+import time
+import threading
+from typing import Dict, Optional
+
+
+class TransportClock:
+    # Playback position counted in frames handed to the output sink, never in elapsed time, so it
+    # cannot drift from the audio however late the threads reading it are scheduled. Advanced by
+    # the render function as each block goes out; seek, pause and resume land on exact frames.
+    # The frames delivered are also timed against the wall clock: drift is how far the audio sent
+    # is ahead of (positive) or behind (negative) real time since playback last (re)started.
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.frame = 0
+        # Every frame ever delivered, which seeks and pauses leave alone
+        self.output_frames = 0
+        self.lock = threading.Lock()
+        # Wall time of the first block since the last start, and the frames delivered from it on
+        self.anchor: Optional[float] = None
+        self.delivered = 0
+        self.drift_s = 0.0
+        self.max_drift_s = 0.0
+
+    def advance(self, frames: int):
+        # Called as a block of frames is delivered
+        now = time.perf_counter()
+        with self.lock:
+            if self.anchor is None:
+                self.anchor, self.delivered = now, 0
+            self.delivered += frames
+            self.frame += frames
+            self.output_frames += frames
+            self.drift_s = self.delivered / self.sample_rate - (now - self.anchor)
+            self.max_drift_s = max(self.max_drift_s, abs(self.drift_s))
+
+    def seek(self, frame: int):
+        # Move the position without touching the drift timing; output carries on from the new frame
+        with self.lock:
+            self.frame = max(0, int(frame))
+
+    def pause(self):
+        # Stop timing; the position stays on the last frame delivered and the next advance re-anchors
+        with self.lock:
+            self.anchor = None
+
+    def position_s(self, latency_frames: int = 0) -> float:
+        # Seconds into the playing buffer, less the frames still queued in the output
+        return max(0, self.frame - latency_frames) / self.sample_rate
+
+    def output_s(self) -> float:
+        # Seconds of audio delivered since the clock was made
+        return self.output_frames / self.sample_rate
+
+    def get_stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                'position_frames': self.frame,
+                'drift_ms': self.drift_s * 1000.0,
+                'max_drift_ms': self.max_drift_s * 1000.0,
+            }
@@ -0,0 +1,32 @@
+# Shared helpers for the headless benchmarks (run from app/: python -m benchmarks.<name>)
+
+import time
+import numpy as np
+from pydub import AudioSegment
+from modules import constants as C
+
+
+def make_test_signal(seconds: float, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = 2) -> np.ndarray:
+    # Deterministic chord plus noise as float32 (frames, channels)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    mono = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.15 * np.sin(2 * np.pi * 331 * t) + 0.1 * np.sin(2 * np.pi * 441 * t)
+    rng = np.random.RandomState(0)
+    x = mono[:, None] + 0.02 * rng.randn(len(t), channels)
+    return x.astype(np.float32)
+
+
+def make_test_segment(seconds: float, sample_rate: int = C.DEFAULT_SAMPLE_RATE, channels: int = 2) -> AudioSegment:
+    # Same signal as a 16-bit AudioSegment, the format the app decodes tracks into
+    x = make_test_signal(seconds, sample_rate, channels)
+    i16 = (np.clip(x, -1.0, 1.0) * 32767.0).astype(np.int16)
+    return AudioSegment(i16.tobytes(), frame_rate=sample_rate, sample_width=2, channels=channels)
+
+
+def time_call(fn, repeat: int = 3) -> float:
+    # Best-of-N wall time in seconds
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
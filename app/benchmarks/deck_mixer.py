@@ -0,0 +1,59 @@
+# Cost of a mixer block at growing deck counts, every deck playing with its own effects, split
+# into the decks' graphs and the sum plus master bus. The cost per deck at the largest count gives
+# the number of decks one core keeps up with in real time (and within GRAPH_CPU_BUDGET).
+
+import argparse
+import numpy as np
+from audio.audio_sink import NullSink
+from audio.deck_mixer import DeckMixer
+from benchmarks.bench_utils import make_test_signal
+from modules import constants as C
+
+
+def run(decks: int, x: np.ndarray, sample_rate: int, block_size: int, blocks: int, engine: str) -> dict:
+    mixer = DeckMixer(decks, sample_rate, block_size, sink=NullSink(sample_rate=sample_rate))
+    mixer.set_reverb_engine(engine)
+    for index, deck in enumerate(mixer.decks):
+        # Different material and settings per deck, so no deck is a copy of another
+        mixer.load_deck(index, np.roll(x, index * 9973, axis=0), sample_rate)
+        deck.set_params({'volume': 0.8, 'pitch': 1.0 + 0.02 * index, 'reverb': 0.4,
+                         'filter': (-0.5, 0.0, 0.5)[index % 3], 'echo': 0.3 * (index % 2)})
+        mixer.play_deck(index)
+    mixer.set_crossfader(0.3)
+    for _ in range(blocks // 10):
+        mixer.render(block_size)
+    mixer.blocks, mixer.deck_time_s, mixer.mix_time_s = 0, 0.0, 0.0
+    for _ in range(blocks):
+        mixer.render(block_size)
+    return mixer.get_mixer_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-deck mixer cost per block")
+    parser.add_argument('--decks', type=int, nargs='*', default=[1, 2, 4, 8])
+    parser.add_argument('--blocks', type=int, default=400)
+    parser.add_argument('--block-size', type=int, default=C.STREAM_BLOCK_SIZE)
+    parser.add_argument('--engine', default=C.REVERB_ENGINE, choices=['convolution', 'fdn'])
+    args = parser.parse_args()
+
+    sr = C.DEFAULT_SAMPLE_RATE
+    x = make_test_signal(args.blocks * args.block_size / sr + 5.0, sr)
+    block_us = args.block_size / sr * 1e6
+    print(f"block {args.block_size} frames = {block_us:.0f} us, reverb {args.engine}")
+    print(f"{'decks':<7}{'decks us':>10}{'mix us':>9}{'total us':>10}{'load':>7}")
+    totals = []
+    for decks in args.decks:
+        stats = run(decks, x, sr, args.block_size, args.blocks, args.engine)
+        total = stats['deck_us'] + stats['mix_us']
+        totals.append(total)
+        print(f"{decks:<7}{stats['deck_us']:>10.0f}{stats['mix_us']:>9.0f}{total:>10.0f}{total / block_us:>7.0%}")
+
+    # Per deck at the largest count measured, where the caches are least kind
+    per_deck = totals[-1] / args.decks[-1]
+    print(f"{per_deck:.0f} us per deck at {args.decks[-1]} decks")
+    print(f"decks one core sustains: {int(block_us // per_deck)} "
+          f"({int(C.GRAPH_CPU_BUDGET * block_us // per_deck)} within the CPU budget)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Per-node cost of the streaming effect graph (microseconds per block) with the DJ filter off,
+# as a low-pass and as a high-pass, in both pitch modes, with the echo send half open.
+
+import argparse
+from audio.audio_sink import NullSink
+from audio.stream_engine import StreamEngine
+from benchmarks.bench_utils import make_test_signal
+from modules import constants as C
+
+
+def run(x, sample_rate: int, block_size: int, pitch_mode: str, filter_value: float) -> dict:
+    engine = StreamEngine(sample_rate=sample_rate, block_size=block_size, sink=NullSink(sample_rate=sample_rate))
+    engine.set_pitch_mode(pitch_mode)
+    engine.load_array(x, sample_rate)
+    engine.set_params({'volume': 0.8, 'pitch': 1.05, 'reverb': 0.5, 'filter': filter_value, 'echo': 0.5})
+    engine.seek_frames(0)
+    while engine.render(block_size) is not None:
+        pass
+    return engine.get_graph_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming effect graph cost per node")
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--block-size', type=int, default=C.STREAM_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    sr = C.DEFAULT_SAMPLE_RATE
+    x = make_test_signal(args.seconds, sr)
+    budget_us = C.GRAPH_CPU_BUDGET * args.block_size / sr * 1e6
+    print(f"block budget: {budget_us:.0f} us")
+    print(f"{'mode':<11}{'filter':>7}" + ''.join(f"{name:>13}" for name in C.STREAM_GRAPH) + f"{'over':>7}")
+    for mode in ('varispeed', 'keylock'):
+        for value in (0.0, -0.7, 0.7):
+            stats = run(x, sr, args.block_size, mode, value)
+            costs = ''.join(f"{stats['node_us'][name]:>13.1f}" for name in C.STREAM_GRAPH)
+            print(f"{mode:<11}{value:>7.1f}{costs}{stats['over_budget']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Whole-track render time, serial AudioEffects.process against ParallelRenderer at growing worker
+# counts, with the largest difference from the serial output. The pool is started and warmed
+# before timing, as it is kept for the life of the app.
+
+import os
+import argparse
+import numpy as np
+from audio.audio_effects import AudioEffects
+from audio.parallel_render import ParallelRenderer
+from benchmarks.bench_utils import make_test_signal, time_call
+from modules import constants as C
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel chunked whole-track render")
+    parser.add_argument('--seconds', type=float, default=240.0)
+    parser.add_argument('--pitch', type=float, default=1.13)
+    parser.add_argument('--reverb', type=float, default=0.8)
+    parser.add_argument('--engine', default=C.REVERB_ENGINE, choices=['convolution', 'fdn'])
+    parser.add_argument('--workers', type=int, nargs='*', help="worker counts (default 2, 4, ... up to the core count)")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    counts = args.workers or sorted({2 ** i for i in range(1, cores.bit_length())} | {max(2, cores)})
+    sr = C.DEFAULT_SAMPLE_RATE
+    x = make_test_signal(args.seconds, sr)
+    params = {'pitch': args.pitch, 'volume': 0.8, 'reverb': args.reverb, 'sample_rate': sr}
+    effects = AudioEffects(args.engine)
+
+    serial = effects.process(x, sr, params)
+    serial_s = time_call(lambda: effects.process(x, sr, params), repeat=1)
+    print(f"{args.seconds:.0f} s track, pitch {args.pitch}, reverb {args.reverb} ({args.engine}), {cores} cores")
+    print(f"{'workers':<9}{'time s':>8}{'speedup':>9}{'max diff':>11}")
+    print(f"{'serial':<9}{serial_s:>8.2f}{1.0:>9.2f}{0.0:>11.1e}")
+    for workers in counts:
+        renderer = ParallelRenderer(workers=workers)
+        y = renderer.render(effects, x, sr, params)
+        seconds = time_call(lambda: renderer.render(effects, x, sr, params), repeat=1)
+        renderer.stop()
+        print(f"{workers:<9}{seconds:>8.2f}{serial_s / seconds:>9.2f}{float(np.abs(y - serial).max()):>11.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# Throughput of the pitch resampler tiers against the previous pydub path
+# (frame-rate relabel + set_frame_rate through audioop.ratecv).
+
+import argparse
+from audio.resampler import PolyphaseResampler
+from benchmarks.bench_utils import make_test_signal, make_test_segment, time_call
+from modules import constants as C
+
+
+def pydub_pitch(audio, pitch: float, target_sample_rate: int):
+    # The old AudioEffects.apply_pitch
+    pitched = audio._spawn(audio.raw_data, overrides={'frame_rate': int(audio.frame_rate * pitch)})
+    return pitched.set_frame_rate(target_sample_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pitch resampler throughput")
+    parser.add_argument('--seconds', type=float, default=30.0)
+    parser.add_argument('--block-size', type=int, default=C.STREAM_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    sr = C.DEFAULT_SAMPLE_RATE
+    segment = make_test_segment(args.seconds, sr)
+    x = make_test_signal(args.seconds, sr)
+
+    print(f"{'path':<26}{'pitch':>7}{'x realtime':>13}")
+    for pitch in (0.75, 1.25, 1.9):
+        rows = [
+            ('pydub ratecv (old)', lambda: pydub_pitch(segment, pitch, sr)),
+            ('whole array, live', lambda: PolyphaseResampler(2, 'live').resample(x, pitch)),
+            ('whole array, export', lambda: PolyphaseResampler(2, 'export').resample(x, pitch)),
+            ('streamed, live', lambda: PolyphaseResampler(2, 'live').stream(x, pitch, args.block_size)),
+            ('streamed, export', lambda: PolyphaseResampler(2, 'export').stream(x, pitch, args.block_size)),
+        ]
+        for name, fn in rows:
+            speed = args.seconds / time_call(fn, repeat=2)
+            print(f"{name:<26}{pitch:>7.2f}{speed:>12.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Per-block CPU cost of the tempo-preserving (keylock) pitch shifter against plain varispeed,
+# as a share of the time budget one block has before the sink needs the next one.
+
+import argparse
+import time
+import numpy as np
+from audio.pitch_shifter import PitchShifter
+from audio.resampler import PolyphaseResampler
+from benchmarks.bench_utils import make_test_signal
+from modules import constants as C
+
+
+def per_block_times(process, x: np.ndarray, block_size: int) -> np.ndarray:
+    times = []
+    for start in range(0, len(x) - block_size + 1, block_size):
+        block = x[start:start + block_size]
+        t0 = time.perf_counter()
+        process(block)
+        times.append(time.perf_counter() - t0)
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keylock pitch shifter per-block cost")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--block-size', type=int, default=C.STREAM_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    sr = C.DEFAULT_SAMPLE_RATE
+    x = make_test_signal(args.seconds, sr)
+    budget_us = args.block_size / sr * 1e6
+
+    print(f"block {args.block_size} frames = {budget_us:.0f} us of audio")
+    print(f"{'path':<22}{'pitch':>7}{'mean us':>10}{'p99 us':>10}{'% budget':>10}")
+    for pitch in (0.75, 1.0, 1.25, 1.9):
+        shifter = PitchShifter(x.shape[1])
+        resampler = PolyphaseResampler(x.shape[1], 'live')
+        source = np.tile(x, (3, 1))
+        read = [0]
+
+        def varispeed(block):
+            # Same work StreamEngine.read_block does: feed exactly the input the block needs
+            need = resampler.input_needed(len(block), pitch)
+            resampler.process(source[read[0]:read[0] + need], pitch, len(block))
+            read[0] += need
+
+        rows = [
+            ('varispeed (resampler)', varispeed),
+            ('keylock (vocoder)', lambda block: shifter.process(block, pitch)),
+        ]
+        for name, fn in rows:
+            t = per_block_times(fn, x, args.block_size)[8:] * 1e6
+            print(f"{name:<22}{pitch:>7.2f}{t.mean():>10.0f}{np.percentile(t, 99):>10.0f}"
+                  f"{100 * t.mean() / budget_us:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
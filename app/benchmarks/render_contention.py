@@ -0,0 +1,102 @@
+# Frame time of a stand-in for the camera/tracking loop while the replay path keeps re-rendering,
+# with renders on a thread in this process and in the render worker process. The stand-in does
+# per-frame Python and small-array NumPy work (flip, landmark smoothing, drawing maths), the kind
+# that needs the GIL, paced at the camera rate; no camera, MediaPipe or OpenCV is needed.
+# Frame time runs from when the frame was due to when it finished, so time spent waiting to get
+# the GIL back after the sleep counts. With a single core the worker still competes for the CPU.
+
+import time
+import argparse
+import threading
+import numpy as np
+from typing import Tuple
+import audio.audio_processor as audio_processor
+from audio.audio_sink import NullSink
+from benchmarks.bench_utils import make_test_signal
+from modules import constants as C
+
+
+def tracking_frame(image: np.ndarray, landmarks: np.ndarray, previous: list) -> Tuple[list, float]:
+    # One frame's worth of GIL-bound work: smoothed landmarks and the hand spread drawn from them
+    frame = image[:, ::-1].copy()
+    brightness = float(frame[::8, ::8].mean()) / 255.0
+    smoothed = []
+    for i, (x, y) in enumerate(landmarks):
+        px, py = previous[i] if previous else (x, y)
+        smoothed.append((int(px * 0.7 + x * 0.3), int(py * 0.7 + y * 0.3)))
+    spread = sum(((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5 for a, b in zip(smoothed, smoothed[1:]))
+    return smoothed, spread * brightness
+
+
+def measure(seconds: float, fps: float, render_load) -> np.ndarray:
+    # Frame times (ms) of the paced loop, with render_load() running alongside if given
+    rng = np.random.RandomState(0)
+    image = rng.randint(0, 255, (C.DEFAULT_CAMERA_HEIGHT, C.DEFAULT_CAMERA_WIDTH, 3), dtype=np.uint8)
+    landmarks = rng.rand(42, 2) * [C.DEFAULT_CAMERA_WIDTH, C.DEFAULT_CAMERA_HEIGHT]
+    stop = threading.Event()
+    loader = None
+    if render_load is not None:
+        loader = threading.Thread(target=render_load, args=(stop,), daemon=True)
+        loader.start()
+    times, previous = [], []
+    period = 1.0 / fps
+    due = time.perf_counter()
+    end = due + seconds
+    while due < end:
+        previous, _ = tracking_frame(image, landmarks, previous)
+        done = time.perf_counter()
+        times.append((done - due) * 1000.0)
+        # Next frame is due a period later, or now if this one overran
+        due = max(due + period, done)
+        time.sleep(max(0.0, due - time.perf_counter()))
+    stop.set()
+    if loader is not None:
+        loader.join()
+    return np.array(times)
+
+
+def make_load(processor, interval: float):
+    # Keeps the render scheduler busy: a new pitch every interval, never a repeated one
+    def load(stop: threading.Event):
+        processor.play(0.0)
+        pitch = 1.0
+        while not stop.is_set():
+            pitch = 0.8 if pitch >= 1.4 else pitch + 0.03
+            processor.set_params({'pitch': pitch, 'reverb': 0.6})
+            stop.wait(interval)
+        processor.pause()
+    return load
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracking frame time during replay-path re-renders")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--track', type=float, default=120.0, help="track length in seconds")
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--interval', type=float, default=0.25, help="seconds between parameter changes")
+    args = parser.parse_args()
+
+    # Replay path with nothing that would skip a render
+    audio_processor.USE_STREAM_ENGINE = False
+    audio_processor.RENDER_CACHE = False
+    audio_processor.SPECULATIVE_RENDER = False
+    track = make_test_signal(args.track)
+
+    print(f"{args.fps:.0f} fps stand-in tracking loop, new parameters every {args.interval:.2f} s, "
+          f"{args.track:.0f} s track")
+    print(f"{'renders':<16}{'median ms':>11}{'p95 ms':>9}{'max ms':>9}")
+    rows = [('none', None, None)]
+    for name, in_worker in (('in-process', False), ('worker process', True)):
+        audio_processor.RENDER_WORKER_PROCESS = in_worker
+        processor = audio_processor.AudioProcessor(sink=NullSink(realtime=True))
+        processor.set_track(track, C.DEFAULT_SAMPLE_RATE)
+        rows.append((name, processor, make_load(processor, args.interval)))
+    for name, processor, load in rows:
+        times = measure(args.seconds, args.fps, load)
+        print(f"{name:<16}{np.median(times):>11.2f}{np.percentile(times, 95):>9.2f}{times.max():>9.2f}")
+        if processor is not None:
+            processor.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Peak memory of one whole-track render: the previous AudioSegment chain (every stage converting
+# bytes <-> NumPy and returning a new segment) against AudioEffects.process on the float32 track.
+# Measured with tracemalloc, which sees both Python bytes objects and NumPy buffers.
+
+import argparse
+import tracemalloc
+import numpy as np
+from pydub import AudioSegment
+from scipy import fft, signal
+from audio.audio_effects import AudioEffects
+from audio.reverb_effect import crossfeed_matrix
+from audio.resampler import PolyphaseResampler
+from audio.audio_sink import segment_to_array, float_to_int16
+from benchmarks.bench_utils import make_test_segment, time_call
+from modules import constants as C
+
+
+def legacy_apply(effects: AudioEffects, audio: AudioSegment, params: dict) -> AudioSegment:
+    # The segment-to-segment chain as it was: pydub gain, pitch through an int16 segment, and a
+    # reverb that converted to float, convolved all channels at once, ran filtfilt in float64,
+    # mixed into a new array and converted back again
+    volume, pitch, reverb = params['volume'], params['pitch'], params['reverb']
+    audio = audio + float(np.clip(20 * np.log10(volume), -60, 12))
+    x = np.array(audio.get_array_of_samples(), dtype=np.float32) / 32768.0
+    pitched = PolyphaseResampler(audio.channels, C.PITCH_RESAMPLER_TIER).resample(x.reshape(-1, audio.channels), pitch)
+    audio = AudioSegment(float_to_int16(pitched).tobytes(), frame_rate=audio.frame_rate, sample_width=2, channels=audio.channels)
+
+    reverb_effect = effects.reverb_engines['convolution']
+    X = np.array(audio.get_array_of_samples(), dtype=np.float32).reshape(-1, audio.channels) / 32768.0
+    time_s, rtype = reverb_effect.ir_params(reverb)
+    ir = reverb_effect.get_ir(audio.frame_rate, time_s, rtype)
+    n, L = X.shape[0], len(ir)
+    nfft = fft.next_fast_len(n + L - 1, real=True)
+    spectrum = fft.rfft((X @ crossfeed_matrix(X.shape[1]).T).T, nfft, axis=1) * fft.rfft(ir, nfft)
+    W = fft.irfft(spectrum, nfft, axis=1)[:, (L - 1) // 2:(L - 1) // 2 + n]
+    b_hp, a_hp = signal.butter(2, 120.0 / (audio.frame_rate / 2.0), 'high')
+    W = signal.filtfilt(b_hp, a_hp, W, axis=1)
+    wet, dry = reverb_effect.wet_dry(reverb)
+    Y = X * dry + W.T.astype(np.float32) * wet
+    Y = np.tanh(Y * 0.95) * 0.92
+    return AudioSegment(float_to_int16(Y).tobytes(), frame_rate=audio.frame_rate, sample_width=2, channels=audio.channels)
+
+
+def peak_bytes(fn) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-track render peak memory")
+    parser.add_argument('--seconds', type=float, default=60.0)
+    args = parser.parse_args()
+
+    sr = C.DEFAULT_SAMPLE_RATE
+    segment = make_test_segment(args.seconds, sr)
+    track = segment_to_array(segment)
+    effects = AudioEffects('convolution', 'varispeed')
+    params = {'volume': 0.8, 'pitch': 1.25, 'reverb': 1.0, 'sample_rate': sr}
+    effects.process(track[:sr], sr, params)  # warm the IR cache so it is not counted
+
+    mb = 1024 * 1024
+    print(f"track: {args.seconds:.0f} s stereo, int16 {len(segment.raw_data) / mb:.1f} MB, float32 {track.nbytes / mb:.1f} MB")
+    print(f"{'path':<28}{'peak MB':>10}{'x float32 track':>17}{'seconds':>10}")
+    rows = [
+        ('AudioSegment chain (old)', lambda: legacy_apply(effects, segment, params)),
+        ('float32 process()', lambda: effects.process(track, sr, params)),
+    ]
+    for name, fn in rows:
+        peak = peak_bytes(fn)
+        print(f"{name:<28}{peak / mb:>10.1f}{peak / track.nbytes:>16.2f}x{time_call(fn, repeat=1):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Compares the cost per second of audio of the convolution and FDN reverb engines,
+# both as whole-track renders and streamed block by block.
+
+import argparse
+from audio.reverb_effect import ReverbEffect, BlockReverb
+from audio.fdn_reverb import FDNReverb
+from benchmarks.bench_utils import make_test_signal, make_test_segment, time_call
+from modules import constants as C
+
+
+def stream(processor, x, amount: float, block_size: int):
+    processor.reset()
+    for start in range(0, len(x) - block_size + 1, block_size):
+        processor.process(x[start:start + block_size], amount)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reverb engine cost per second of audio")
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--block-size', type=int, default=C.STREAM_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    sr = C.DEFAULT_SAMPLE_RATE
+    segment = make_test_segment(args.seconds, sr)
+    x = make_test_signal(args.seconds, sr)
+    convolution = ReverbEffect()
+    convolution.warm(sr, args.block_size)
+    block_convolution = BlockReverb(convolution, sr, block_size=args.block_size)
+    fdn = FDNReverb(sr)
+
+    print(f"{'engine':<28}{'amount':>8}{'ms per audio s':>18}")
+    for amount in (0.5, 1.0, 1.8):
+        rows = [
+            ('convolution, whole track', lambda: convolution.apply(segment, amount)),
+            ('fdn, whole track', lambda: fdn.apply(segment, amount)),
+            ('convolution, streamed', lambda: stream(block_convolution, x, amount, args.block_size)),
+            ('fdn, streamed', lambda: stream(fdn, x, amount, args.block_size)),
+        ]
+        for name, fn in rows:
+            cost = time_call(fn, repeat=2) / args.seconds * 1000
+            print(f"{name:<28}{amount:>8.1f}{cost:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
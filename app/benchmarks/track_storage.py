@@ -0,0 +1,76 @@
+# Resident memory of loading a long WAV and streaming it through the block engine into a null
+# sink, with the track held in memory and memory mapped. Each mode runs in its own process so
+# the peak RSS (Linux / macOS getrusage) belongs to that mode alone.
+
+import os
+import sys
+import wave
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+from modules import constants as C
+from benchmarks.bench_utils import make_test_signal
+
+
+def write_test_wav(path: str, minutes: float, sample_rate: int = C.DEFAULT_SAMPLE_RATE):
+    # Written a minute at a time so the generator itself stays small
+    minute = (np.clip(make_test_signal(60.0, sample_rate), -1.0, 1.0) * 32767.0).astype(np.int16).tobytes()
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        for _ in range(int(np.ceil(minutes))):
+            wav.writeframes(minute)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_mode(path: str, storage: str):
+    # Child process: load and stream the whole file, then report peak RSS
+    C.TRACK_STORAGE = storage
+    from audio.audio_sink import NullSink
+    from audio.audio_processor import AudioProcessor
+
+    base = peak_rss_mb()
+    sink = NullSink(realtime=False)
+    processor = AudioProcessor(sink=sink)
+    if not processor.load_file(path):
+        raise SystemExit(f"could not load {path}")
+    loaded = peak_rss_mb()
+    engine = processor.stream_engine
+    engine.set_params({'pitch': 1.1, 'reverb': 0.5})
+    engine.seek_frames(0)
+    frames = sink.drain(engine.render)
+    print(f"{storage} {base:.1f} {loaded:.1f} {peak_rss_mb():.1f} {frames}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track storage resident memory")
+    parser.add_argument('--minutes', type=float, default=20.0)
+    parser.add_argument('--child', nargs=2, metavar=('PATH', 'STORAGE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_mode(*args.child)
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        write_test_wav(path, args.minutes)
+        print(f"track: {args.minutes:.0f} min stereo 16-bit WAV, {os.path.getsize(path) / (1024 * 1024):.0f} MB")
+        print(f"{'storage':<10}{'start MB':>10}{'loaded MB':>11}{'peak MB':>10}")
+        for storage in ('memory', 'mmap'):
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.track_storage', '--child', path, storage],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            print(f"{out[0]:<10}{float(out[1]):>10.1f}{float(out[2]):>11.1f}{float(out[3]):>10.1f}")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
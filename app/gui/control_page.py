@@ -1,5 +1,5 @@
 # Control interface that displays real-time audio statistics and provides interactive controls
-# Shows pitch, volume, reverb values with enable/disable toggles and playback controls
+# Shows pitch, volume, reverb, filter, echo and crossfader values with enable/disable toggles and playback controls
 
 from PyQt5.QtWidgets import (
     QVBoxLayout, QLabel, QWidget, QPushButton, 
@@ -9,6 +9,7 @@ from PyQt5.QtGui import QFont
 from PyQt5.QtCore import Qt, QTimer
 from gui.base_page import BasePage
 from gui.styles import BUTTON_FONT_SIZE, BUTTON_STYLE, SUBTITLE_FONT_SIZE
+from modules.constants import FILTER_DEADZONE, DELAY_DIVISION
 
 class ControlPage(BasePage):
 
@@ -21,6 +22,10 @@ class ControlPage(BasePage):
         self.pitch_toggle_button = None
         self.reverb_toggle_button = None
         self.volume_toggle_button = None
+        self.filter_toggle_button = None
+        self.echo_toggle_button = None
+        self.division_button = None
+        self.crossfader_toggle_button = None
 
         # Get song name
         if audio_file_name:
@@ -120,13 +125,32 @@ class ControlPage(BasePage):
         reverb_val = f"{stats['reverb']:.2f}"
         volume_val = f"{stats['volume']:.2f}"
         volume_percent = f"{stats['volume'] * 100:.0f}%"
+        filter_value = stats.get('filter', 0.0)
+        filter_mode = "Off" if abs(filter_value) < FILTER_DEADZONE else ("High-pass" if filter_value > 0 else "Low-pass")
+        filter_val = f"{filter_mode} ({filter_value:+.2f})"
+        tempo = stats.get('tempo')
+        echo_val = f"{stats.get('echo', 0.0) * 100:.0f}% · {stats.get('delay_division', DELAY_DIVISION)}"
+        if tempo:
+            echo_val += f" @ {tempo:.1f} BPM"
         
         playback_info = self.get_playback_info()
 
         pitch_on = self.is_control_enabled('pitch')
         reverb_on = self.is_control_enabled('reverb')
         volume_on = self.is_control_enabled('volume')
+        filter_on = self.is_control_enabled('filter')
+        echo_on = self.is_control_enabled('echo')
         off_tag = "<span style='color:#9e9e9e;'> (Disabled)</span>"
+        mixer_row = ""
+        mixer = stats.get('mixer')
+        if mixer:
+            crossfader_on = self.is_control_enabled('crossfader')
+            playing = sum(mixer['playing'])
+            mixer_row = f"""
+            <tr>
+                <td><b>Crossfader:</b></td>
+                <td style="color: #FFA500;">A {mixer['crossfader']:.2f} B · {playing}/{mixer['decks']} decks playing{' ' + off_tag if not crossfader_on else ''}</td>
+            </tr>"""
         
         return f"""
         <h2>Audio Statistics</h2>
@@ -144,6 +168,14 @@ class ControlPage(BasePage):
                 <td><b>Reverb:</b></td>
                 <td style="color: #FF9800;">{reverb_val}{' ' + off_tag if not reverb_on else ''}</td>
             </tr>
+            <tr>
+                <td><b>Filter:</b></td>
+                <td style="color: #E040FB;">{filter_val}{' ' + off_tag if not filter_on else ''}</td>
+            </tr>
+            <tr>
+                <td><b>Echo:</b></td>
+                <td style="color: #00BCD4;">{echo_val}{' ' + off_tag if not echo_on else ''}</td>
+            </tr>{mixer_row}
         </table>
     
         """
@@ -253,9 +285,33 @@ class ControlPage(BasePage):
         self.reverb_toggle_button.setStyleSheet(BUTTON_STYLE)
         self.reverb_toggle_button.clicked.connect(self.toggle_reverb_control)
 
+        self.filter_toggle_button = QPushButton("Filter: Off")
+        self.filter_toggle_button.setFont(QFont("Arial", BUTTON_FONT_SIZE))
+        self.filter_toggle_button.setStyleSheet(BUTTON_STYLE)
+        self.filter_toggle_button.clicked.connect(self.toggle_filter_control)
+
+        self.echo_toggle_button = QPushButton("Echo: Off")
+        self.echo_toggle_button.setFont(QFont("Arial", BUTTON_FONT_SIZE))
+        self.echo_toggle_button.setStyleSheet(BUTTON_STYLE)
+        self.echo_toggle_button.clicked.connect(self.toggle_echo_control)
+
+        self.division_button = QPushButton(f"Echo time: {DELAY_DIVISION}")
+        self.division_button.setFont(QFont("Arial", BUTTON_FONT_SIZE))
+        self.division_button.setStyleSheet(BUTTON_STYLE)
+        self.division_button.clicked.connect(self.cycle_delay_division)
+
+        self.crossfader_toggle_button = QPushButton("Crossfader: On")
+        self.crossfader_toggle_button.setFont(QFont("Arial", BUTTON_FONT_SIZE))
+        self.crossfader_toggle_button.setStyleSheet(BUTTON_STYLE)
+        self.crossfader_toggle_button.clicked.connect(self.toggle_crossfader_control)
+
         toggles_layout.addWidget(self.pitch_toggle_button)
         toggles_layout.addWidget(self.volume_toggle_button)
         toggles_layout.addWidget(self.reverb_toggle_button)
+        toggles_layout.addWidget(self.filter_toggle_button)
+        toggles_layout.addWidget(self.echo_toggle_button)
+        toggles_layout.addWidget(self.division_button)
+        toggles_layout.addWidget(self.crossfader_toggle_button)
 
         layout.addLayout(toggles_layout)
         
@@ -268,21 +324,38 @@ class ControlPage(BasePage):
     def update_toggle_buttons(self):
         # Update button text and enabled state based on overlay/control states
         has_overlay = bool(self.overlay)
-        for btn in [self.pitch_toggle_button, self.volume_toggle_button, self.reverb_toggle_button]:
+        for btn in [self.pitch_toggle_button, self.volume_toggle_button, self.reverb_toggle_button, self.filter_toggle_button,
+                    self.echo_toggle_button, self.division_button]:
             if btn:
                 btn.setEnabled(has_overlay)
+        if self.crossfader_toggle_button:
+            # Only a mixer of two decks or more has a crossfader
+            decks = self.overlay.audio_controller.audio_processor.deck_count if has_overlay and hasattr(self.overlay, 'audio_controller') else 1
+            self.crossfader_toggle_button.setVisible(decks > 1)
+            self.crossfader_toggle_button.setEnabled(has_overlay)
         if not has_overlay:
             return
         try:
             pitch_on = self.is_control_enabled('pitch')
             volume_on = self.is_control_enabled('volume')
             reverb_on = self.is_control_enabled('reverb')
+            filter_on = self.is_control_enabled('filter')
+            echo_on = self.is_control_enabled('echo')
+            crossfader_on = self.is_control_enabled('crossfader')
             if self.pitch_toggle_button:
                 self.pitch_toggle_button.setText(f"Pitch: {'On' if pitch_on else 'Off'}")
             if self.volume_toggle_button:
                 self.volume_toggle_button.setText(f"Volume: {'On' if volume_on else 'Off'}")
             if self.reverb_toggle_button:
                 self.reverb_toggle_button.setText(f"Reverb: {'On' if reverb_on else 'Off'}")
+            if self.filter_toggle_button:
+                self.filter_toggle_button.setText(f"Filter: {'On' if filter_on else 'Off'}")
+            if self.echo_toggle_button:
+                self.echo_toggle_button.setText(f"Echo: {'On' if echo_on else 'Off'}")
+            if self.crossfader_toggle_button:
+                self.crossfader_toggle_button.setText(f"Crossfader: {'On' if crossfader_on else 'Off'}")
+            if self.division_button and hasattr(self.overlay, 'delay_division'):
+                self.division_button.setText(f"Echo time: {self.overlay.delay_division}")
         except Exception:
             pass
         
@@ -328,6 +401,42 @@ class ControlPage(BasePage):
         finally:
             self.update_toggle_buttons()
 
+    def toggle_filter_control(self):
+        if not self.overlay or not hasattr(self.overlay, 'toggle_filter_enabled'):
+            return
+        try:
+            QApplication.processEvents()
+            self.overlay.toggle_filter_enabled()
+        finally:
+            self.update_toggle_buttons()
+
+    def toggle_echo_control(self):
+        if not self.overlay or not hasattr(self.overlay, 'toggle_echo_enabled'):
+            return
+        try:
+            QApplication.processEvents()
+            self.overlay.toggle_echo_enabled()
+        finally:
+            self.update_toggle_buttons()
+
+    def toggle_crossfader_control(self):
+        if not self.overlay or not hasattr(self.overlay, 'toggle_crossfader_enabled'):
+            return
+        try:
+            QApplication.processEvents()
+            self.overlay.toggle_crossfader_enabled()
+        finally:
+            self.update_toggle_buttons()
+
+    def cycle_delay_division(self):
+        if not self.overlay or not hasattr(self.overlay, 'cycle_delay_division'):
+            return
+        try:
+            QApplication.processEvents()
+            self.overlay.cycle_delay_division()
+        finally:
+            self.update_toggle_buttons()
+
 
     def reset_audio_params(self):
         # Reset audio parameters to default values
@@ -20,11 +20,14 @@ class PlayPage(BasePage):
         # Sets up content for the page
         instructions = self.create_instructions_label()
         self.youtube_link_input = self.create_youtube_link_input()
+        # Optional second track on deck B, crossfaded against the first with both hands
+        self.deck_b_link_input = self.create_youtube_link_input("Deck B (optional): https://www.youtube.com/watch?v=...")
         run_btn = self.create_run_button()
 
         layout.insertWidget(1, instructions)
         layout.insertWidget(2, self.youtube_link_input)
-        layout.insertWidget(3, run_btn)
+        layout.insertWidget(3, self.deck_b_link_input)
+        layout.insertWidget(4, run_btn)
 
     def create_instructions_label(self):
         # Creates label for instructions
@@ -33,10 +36,10 @@ class PlayPage(BasePage):
         instructions.setAlignment(Qt.AlignCenter)
         return instructions
 
-    def create_youtube_link_input(self):
+    def create_youtube_link_input(self, placeholder="https://www.youtube.com/watch?v=..."):
         # Creates input field to insert YouTube link
         link_input = QLineEdit()
-        link_input.setPlaceholderText("https://www.youtube.com/watch?v=...")
+        link_input.setPlaceholderText(placeholder)
         link_input.setFont(QFont("Arial", INPUT_FONT_SIZE))
         link_input.setStyleSheet(INPUT_STYLE)
         return link_input
@@ -55,13 +58,14 @@ class PlayPage(BasePage):
         if not youtube_url:
             QMessageBox.warning(self, "Error", "Please enter a YouTube link.")
             return
+        deck_b_url = self.deck_b_link_input.text().strip()
         try:
-            self.process_youtube_audio(youtube_url)
+            self.process_youtube_audio(youtube_url, deck_b_url)
         except Exception as error:
             QMessageBox.critical(self, "Error", f"Error starting HandDJ: {error}")
 
-    def process_youtube_audio(self, youtube_url):
-        # Fetches audio, creates temporary wav audio file, starts overlay
+    def process_youtube_audio(self, youtube_url, deck_b_url=""):
+        # Fetches audio (and deck B's, if given), creates temporary wav audio files, starts overlay
         audio_fetcher = YouTubeAudio(sample_rate=44100)
         audio_data = audio_fetcher.fetch(youtube_url)
         
@@ -73,15 +77,20 @@ class PlayPage(BasePage):
 
         temp_audio_file = "youtube_audio.wav"
         audio_data.export(temp_audio_file, format="wav")
+        deck_files = []
+        if deck_b_url:
+            deck_files.append("youtube_audio_b.wav")
+            audio_fetcher.fetch(deck_b_url).export(deck_files[0], format="wav")
 
         try:
-            self.current_dj_controller = DJController(audio_file=temp_audio_file)
+            self.current_dj_controller = DJController(audio_file=temp_audio_file, deck_files=deck_files)
             # Pass the video title and dj_controller to the callback if available
             if self.on_play_callback:
                 self.on_play_callback(video_title, self.current_dj_controller)
             self.current_dj_controller.run()
         finally:
-            self.cleanup_temp_file(temp_audio_file)
+            for path in [temp_audio_file] + deck_files:
+                self.cleanup_temp_file(path)
 
     def cleanup_temp_file(self, file_path):
         # Cleans up the temporary wav audio file
@@ -1,3 +1,4 @@
+import os
 
 # Audio settings
 DEFAULT_SAMPLE_RATE = 44100
@@ -5,6 +6,146 @@ DEFAULT_BUFFER_SIZE = 1024
 DEFAULT_VOLUME = 1.0
 DEFAULT_PITCH = 1.0
 DEFAULT_REVERB = 0.0
+DEFAULT_FILTER = 0.0  # -1 full low-pass .. 0 off .. +1 full high-pass
+DEFAULT_ECHO = 0.0  # echo send, 0 (off) .. 1
+
+# Streaming engine settings
+USE_STREAM_ENGINE = True
+STREAM_BLOCK_SIZE = 512
+STREAM_CHANNELS = 2
+
+# Decks mixed into the one output by the streaming engine (1: a single track, no mixer). Each
+# deck runs its own effect graph; the sum goes through one master bus. MIXER_CROSSFADER_SIDES
+# puts decks on the crossfader's A and B sides, decks after them play through it at full level.
+MIXER_DECKS = 1
+MIXER_CROSSFADER_SIDES = ('A', 'B')
+DEFAULT_CROSSFADER = 0.5  # 0 all A .. 1 all B, constant power
+
+# Effect nodes after the track read, in order (see audio/dsp_graph.py). When the graph takes
+# more than GRAPH_CPU_BUDGET of a block's duration for GRAPH_OVER_BUDGET_BLOCKS blocks running,
+# the node whose recent cost covers the overrun switches to a cheaper setting. It switches back
+# once the graph would fit under GRAPH_RESTORE_HEADROOM of the budget with it restored, for
+# GRAPH_RESTORE_BLOCKS blocks running.
+STREAM_GRAPH = ('pitch_shift', 'gain', 'filter', 'delay', 'reverb', 'master')
+GRAPH_CPU_BUDGET = 0.5
+GRAPH_OVER_BUDGET_BLOCKS = 8
+GRAPH_RESTORE_HEADROOM = 0.8
+GRAPH_RESTORE_BLOCKS = 64
+
+# DJ filter sweep: hand height moves one knob from a low-pass (down) through off to a high-pass (up)
+FILTER_DEADZONE = 0.1
+FILTER_LOWPASS_MIN_HZ = 200.0
+FILTER_HIGHPASS_MAX_HZ = 6000.0
+FILTER_SETTLE_S = 0.5  # context a chunked whole-track render gives the filter
+
+# Tempo-synced echo (streaming engine): the delay is a note length at the track's tempo, which
+# is estimated on load and follows varispeed. The echo send opens the input into the delay and
+# raises the feedback from DELAY_FEEDBACK_MIN to DELAY_FEEDBACK_MAX.
+DELAY_DIVISIONS = {'1/4': 1.0, '1/8': 0.5, '1/8.': 0.75, '1/4.': 1.5, '1/16': 0.25}  # in beats
+DELAY_DIVISION = '1/8.'
+STREAM_ONLY_PARAMS = ('echo',)  # not rendered by the render-then-replay path
+DELAY_DEFAULT_BPM = 120.0  # when the track has no clear beat
+DELAY_MAX_S = 4.0  # circular buffer length, allocated once
+DELAY_FEEDBACK_MIN = 0.3
+DELAY_FEEDBACK_MAX = 0.75
+DELAY_WET = 0.6  # return level of the echoes
+DELAY_DAMPING_HZ = 4000.0  # one-pole low-pass in the feedback path, repeats get darker
+DELAY_GLIDE = 0.25  # most the delay may move per frame when the tempo or note length changes
+TEMPO_MIN_BPM = 70.0
+TEMPO_MAX_BPM = 180.0
+TEMPO_ANALYSIS_S = 60.0  # audio from the middle of the track used for the estimate
+TEMPO_MIN_PERIODICITY = 0.1
+
+# Track storage: 'memory' holds the decoded track in RAM, 'mmap' decodes it in chunks into a
+# temporary file that is memory mapped, so resident memory stays flat for multi-hour mixes
+TRACK_STORAGE = "memory"
+TRACK_STORE_DIR = None  # system temp directory
+TRACK_DECODE_CHUNK_S = 10.0
+TRACK_RESIDENT_S = 5.0  # mapped audio more than this far behind the playhead is paged out
+
+# Live parameter changes are written here as CSV on exit (None: not recorded), for replaying
+# the performance offline with render_automation.py. Times are seconds of audio output; each
+# further track loaded gets its own log, numbered beside this one.
+AUTOMATION_LOG_PATH = None
+
+# Output sinks ('auto', 'sounddevice', 'pygame', 'null', 'wav', 'ring')
+DEFAULT_SINK = 'auto'
+PYGAME_SINK_BLOCK_SIZE = 4096
+RING_BUFFER_SECONDS = 2
+
+# Reverb impulse responses
+REVERB_GRID_STEP = 0.05
+IR_CACHE_MAX_BYTES = 32 * 1024 * 1024
+IR_GENERATOR_VERSION = 1
+USE_IR_BANK = True
+IR_BANK_DIR = os.path.join(os.path.expanduser("~"), ".handdj", "ir_bank")
+USER_IR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "impulse_responses")
+USER_IR_MAX_SECONDS = 4.0
+REVERB_TYPE = "auto"
+REVERB_CROSSFEED = 0.2
+REVERB_ENGINE = "convolution"  # or "fdn" for the low-CPU feedback delay network
+REVERB_RENDER_SEGMENT_S = 10.0  # whole-track reverb renders run in segments, cancellable between them
+
+# Pitch resampler ('live' in the streaming engine, 'export' for whole-track renders)
+RESAMPLER_CUTOFF_STEP = 0.02
+RESAMPLER_MIN_CUTOFF = 0.25
+PITCH_RESAMPLER_TIER = "export"
+
+# Progressive re-render (render-then-replay path): a short window at the playhead is swapped in
+# first, then the rest of the track is filled in growing chunks rendered with context on each side.
+# With reverb the context grows to the reverb tail, plus the master bus's level window before it.
+PROGRESSIVE_RENDER = True
+PROGRESSIVE_WINDOW_S = 0.5
+PROGRESSIVE_CHUNK_MAX_S = 30.0
+PROGRESSIVE_PREROLL_S = 1.0
+PROGRESSIVE_POSTROLL_S = 1.0
+SWAP_CROSSFADE_MS = 30
+
+# Re-render parameter grid (render-then-replay path), shared by speculative renders and the
+# render cache; reverb snaps to REVERB_GRID_STEP. Every render on this path uses the grid, so
+# pitch moves in steps of RENDER_PITCH_STEP (0.01 is about 17 cents). Bump the version when
+# rendered output changes.
+RENDER_PITCH_STEP = 0.01
+RENDER_FILTER_STEP = 0.05
+RENDER_ENGINE_VERSION = 3
+
+# Master bus (streaming, both paths): the reverb mix is matched to the dry RMS over a running
+# window, then a look-ahead limiter holds peaks under the ceiling
+MASTER_RMS_WINDOW_S = 3.0
+MASTER_LOOKAHEAD_MS = 5.0
+MASTER_RELEASE_MS = 50.0
+MASTER_CEILING = 0.95
+MASTER_RENDER_BLOCK = 4096  # block size when a whole-track render runs through the bus
+
+# Replay-path renders run in a separate process and write into shared memory, keeping the
+# render's NumPy/SciPy work off the GIL the camera and tracking loop runs on
+RENDER_WORKER_PROCESS = True
+
+# Whole-track renders (first play, non-progressive re-renders) split across a process pool;
+# None workers means one per core
+PARALLEL_RENDER = False
+PARALLEL_RENDER_WORKERS = None
+PARALLEL_RENDER_CHUNK_S = 30.0
+
+# Finished whole-track renders kept for settings the hand returns to
+RENDER_CACHE = True
+RENDER_CACHE_MAX_BYTES = 128 * 1024 * 1024  # about six minutes of stereo float32 at 44.1 kHz
+
+# Speculative pre-rendering (render-then-replay path): the next few seconds are rendered in a
+# process pool for the parameter states the hand is heading towards
+SPECULATIVE_RENDER = True
+SPECULATIVE_WORKERS = 2
+SPECULATIVE_MAX_BYTES = 64 * 1024 * 1024
+SPECULATIVE_HORIZON_S = 2.0
+SPECULATIVE_LOOKAHEAD_S = (0.1, 0.25, 0.5)
+SPECULATIVE_MAX_STATES = 3
+SPECULATIVE_OBSERVE_INTERVAL_S = 0.05  # parameter changes in between are recorded, not acted on
+
+# Pitch mode: "varispeed" changes pitch and tempo together (turntable), "keylock" shifts pitch
+# only with a phase vocoder in the streaming engine
+PITCH_MODE = "varispeed"
+PITCH_SHIFT_FRAME_SIZE = 2048
+PITCH_SHIFT_OVERLAP = 4
 
 # Audio limits
 VOLUME_MIN = 0.0
@@ -39,6 +180,12 @@ REVERB_DISTANCE_MIN = 30
 REVERB_DISTANCE_MAX = 150
 VOLUME_DISTANCE_MIN = 50
 VOLUME_DISTANCE_MAX = 300
+FILTER_HEIGHT_TOP = 80  # wrist y (pixels) for the full high-pass
+FILTER_HEIGHT_BOTTOM = 400  # wrist y for the full low-pass
+ECHO_HEIGHT_TOP = 80  # left wrist y for the full echo send
+ECHO_HEIGHT_BOTTOM = 300  # left wrist y below which the send is closed
+CROSSFADER_X_MIN = 120  # x (pixels) of the point between both wrists for full A
+CROSSFADER_X_MAX = 520  # ... and for full B
 
 # Audio ranges
 PITCH_RANGE_MIN = 0.5
@@ -47,6 +194,10 @@ REVERB_RANGE_MIN = 0.0
 REVERB_RANGE_MAX = 2.0
 VOLUME_RANGE_MIN = 0.0
 VOLUME_RANGE_MAX = 2.0
+FILTER_RANGE_MIN = -1.0
+FILTER_RANGE_MAX = 1.0
+ECHO_RANGE_MIN = 0.0
+ECHO_RANGE_MAX = 1.0
 
 # GUI colors
 BACKGROUND_COLOR = "#1e1e1e"
@@ -62,7 +213,7 @@ TEMP_FILE_SUFFIX = ".wav"
 DEFAULT_AUDIO_FILES = ["testing.mp3", "test_audio.wav", "audio.mp3", "music.mp3"]
 
 # Update intervals (seconds)
-PARAMETER_UPDATE_INTERVAL = 0.5
+PARAMETER_UPDATE_INTERVAL = 0.5  # pitch/reverb updates on the render-then-replay path, which re-renders on each
 PROGRESS_UPDATE_INTERVAL = 0.1
 
 # Smoothing settings
@@ -0,0 +1,92 @@
+# Offline render of a performance: an audio file and an automation log (time,param,value CSV as
+# recorded with AUTOMATION_LOG_PATH) through the streaming engine into a WAV, as fast as the CPU
+# allows. No sound card, camera or GUI is used, so it doubles as a throughput benchmark.
+#
+#   cd app
+#   python render_automation.py track.mp3 performance.csv -o mix.wav
+
+import os
+import sys
+import time
+import argparse
+from typing import Dict, Optional
+from audio import track_store
+from audio.audio_sink import WavFileSink
+from audio.automation import AutomationLog
+from audio.stream_engine import StreamEngine
+from modules import constants as C
+
+
+def render(audio_path: str, log: AutomationLog, out_path: str, sample_rate: int = C.DEFAULT_SAMPLE_RATE,
+           reverb_engine: str = C.REVERB_ENGINE, pitch_mode: str = C.PITCH_MODE,
+           duration_s: Optional[float] = None, delay_division: str = C.DELAY_DIVISION) -> Dict[str, float]:
+    # Changes are posted to the engine at the block boundary their time falls in, the same way the
+    # live loop's updates reach it, and ramp in over that block
+    track, track_rate = track_store.decode_file(audio_path, sample_rate, C.STREAM_CHANNELS)
+    sink = WavFileSink(out_path, sample_rate=sample_rate)
+    engine = StreamEngine(sample_rate=sample_rate, sink=sink)
+    engine.set_reverb_engine(reverb_engine)
+    engine.set_pitch_mode(pitch_mode)
+    engine.set_delay_division(delay_division)
+    engine.load_array(track, track_rate)
+
+    initial, index = log.changes(0, 0.0)
+    defaults = {'volume': C.DEFAULT_VOLUME, 'pitch': C.DEFAULT_PITCH, 'reverb': C.DEFAULT_REVERB, 'filter': C.DEFAULT_FILTER,
+                'echo': C.DEFAULT_ECHO}
+    engine.set_params(dict(defaults, **initial))
+    engine.seek_frames(0)
+
+    limit = int(duration_s * sample_rate) if duration_s is not None else None
+    sink.render = engine.render
+    sink.open()
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while limit is None or frames < limit:
+            changes, index = log.changes(index, frames / sample_rate)
+            if changes:
+                engine.set_params(changes)
+            size = sink.block_size if limit is None else min(sink.block_size, limit - frames)
+            block = sink.pull(size)
+            if block is None:
+                break
+            sink.write(block)
+            frames += len(block)
+    finally:
+        sink.close()
+    stats = sink.get_stats()
+    stats['wall_time_s'] = time.perf_counter() - start
+    stats['audio_s'] = frames / sample_rate
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a recorded performance offline to a WAV file")
+    parser.add_argument('audio', help="audio file (WAV directly, anything else through ffmpeg)")
+    parser.add_argument('automation', help="time,param,value CSV of parameter changes")
+    parser.add_argument('-o', '--output', default='mix.wav')
+    parser.add_argument('--sample-rate', type=int, default=C.DEFAULT_SAMPLE_RATE)
+    parser.add_argument('--reverb-engine', default=C.REVERB_ENGINE, choices=['convolution', 'fdn'])
+    parser.add_argument('--pitch-mode', default=C.PITCH_MODE, choices=['varispeed', 'keylock'])
+    parser.add_argument('--delay-division', default=C.DELAY_DIVISION, choices=list(C.DELAY_DIVISIONS),
+                        help="echo note length at the track's tempo")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds of output")
+    args = parser.parse_args()
+
+    for path in (args.audio, args.automation):
+        if not os.path.exists(path):
+            sys.exit(f"No such file: {path}")
+    try:
+        log = AutomationLog.load(args.automation)
+        stats = render(args.audio, log, args.output, args.sample_rate, args.reverb_engine,
+                       args.pitch_mode, args.duration, args.delay_division)
+    except (ValueError, RuntimeError) as e:
+        sys.exit(f"Render failed: {e}")
+
+    print(f"wrote {args.output}: {stats['audio_s']:.1f} s of audio, {len(log)} parameter changes")
+    print(f"render time:     {stats['wall_time_s']:.2f} s ({stats['render_time_s']:.2f} s in the engine)")
+    print(f"realtime factor: {stats['audio_s'] / max(stats['wall_time_s'], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import pytest
+from audio.automation import AutomationLog
+
+
+class FakeClock:
+    def __init__(self, t=100.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def test_recording_is_timed_from_start():
+    clock, log = FakeClock(), AutomationLog()
+    log.start({'volume': 1.0, 'pitch': 1.0}, clock=clock)
+    clock.t += 1.5
+    log.record('volume', 0.5)
+    clock.t += 0.5
+    log.record('volume', 0.5)
+    log.record('reverb', 0.3)
+    log.record('not_a_param', 1.0)
+    assert log.events == [(0.0, 'volume', 1.0), (0.0, 'pitch', 1.0),
+                          (1.5, 'volume', 0.5), (2.0, 'reverb', 0.3)]
+    assert log.duration == 2.0
+
+
+def test_record_without_start_needs_a_time():
+    log = AutomationLog()
+    log.record('volume', 0.5)
+    assert len(log) == 0
+    log.record('volume', 0.5, t=3.0)
+    assert log.events == [(3.0, 'volume', 0.5)]
+
+
+def test_csv_round_trip(tmp_path):
+    path = str(tmp_path / 'performance.csv')
+    log = AutomationLog([(0.0, 'volume', 1.0), (0.25, 'pitch', 1.06), (1.125, 'filter', -0.4),
+                         (2.5, 'echo', 0.2), (2.5, 'reverb', 0.35)])
+    log.save(path)
+    with open(path) as f:
+        assert f.readline().strip() == 'time,param,value'
+    loaded = AutomationLog.load(path)
+    assert loaded.events == log.events
+
+
+def test_load_sorts_by_time_and_rejects_bad_files(tmp_path):
+    path = tmp_path / 'log.csv'
+    path.write_text('time,param,value\n2.0,pitch,1.1\n0.5,volume,0.8\n')
+    assert AutomationLog.load(str(path)).events == [(0.5, 'volume', 0.8), (2.0, 'pitch', 1.1)]
+
+    path.write_text('t,name,value\n0.0,volume,1.0\n')
+    with pytest.raises(ValueError):
+        AutomationLog.load(str(path))
+    path.write_text('time,param,value\n0.0,speed,1.0\n')
+    with pytest.raises(ValueError):
+        AutomationLog.load(str(path))
+
+
+def test_changes_returns_newest_value_per_param():
+    log = AutomationLog([(0.0, 'volume', 1.0), (0.1, 'volume', 0.9), (0.2, 'pitch', 1.1), (0.5, 'volume', 0.7)])
+    changes, index = log.changes(0, 0.25)
+    assert changes == {'volume': 0.9, 'pitch': 1.1}
+    assert index == 3
+    assert log.changes(index, 0.4) == ({}, 3)
+    assert log.changes(index, 1.0) == ({'volume': 0.7}, 4)
@@ -0,0 +1,63 @@
+import numpy as np
+from audio.ir_cache import IRCache
+from audio.render_cache import RenderCache
+
+
+def array(kb: int) -> np.ndarray:
+    return np.zeros(kb * 256, dtype=np.float32)
+
+
+def test_ir_cache_evicts_least_recently_used_over_its_byte_cap():
+    cache = IRCache(max_bytes=3 * 1024)
+    for key in 'abc':
+        cache.get(key, lambda: array(1))
+    cache.get('a', lambda: array(1))  # a is now the most recent
+    cache.get('d', lambda: array(1))
+    assert cache.peek('b') is None
+    assert all(cache.peek(key) is not None for key in 'acd')
+    stats = cache.get_stats()
+    assert stats['bytes'] == 3 * 1024
+    assert stats['evictions'] == 1
+    assert (stats['hits'], stats['misses']) == (4, 4)
+
+
+def test_ir_cache_builds_once():
+    cache = IRCache(max_bytes=1 << 20)
+    built = []
+    for _ in range(3):
+        cache.get('ir', lambda: built.append(1) or array(1))
+    assert len(built) == 1
+
+
+def test_ir_cache_keeps_the_newest_entry_even_when_oversized():
+    cache = IRCache(max_bytes=1024)
+    cache.get('small', lambda: array(1))
+    big = cache.get('big', lambda: array(4))
+    assert cache.peek('big') is big
+    assert cache.peek('small') is None
+
+
+def test_render_cache_byte_cap_and_replace():
+    cache = RenderCache(max_bytes=2 * 1024)
+    cache.put('a', array(1))
+    cache.put('b', array(1))
+    cache.put('a', array(1))  # replacing does not count the old bytes twice
+    assert cache.get_stats()['bytes'] == 2 * 1024
+    cache.put('c', array(1))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+
+def test_render_cache_skips_renders_over_the_whole_budget():
+    cache = RenderCache(max_bytes=1024)
+    cache.put('a', array(1))
+    cache.put('big', array(2))
+    assert cache.get('big') is None
+    assert cache.get('a') is not None
+
+
+def test_render_cache_key_ignores_volume():
+    cache = RenderCache()
+    params = {'pitch': 1.0, 'reverb': 0.3, 'volume': 0.5, 'sample_rate': 44100}
+    louder = dict(params, volume=1.5)
+    assert cache.key('t', 44100, params, 'fdn', 'varispeed') == cache.key('t', 44100, louder, 'fdn', 'varispeed')
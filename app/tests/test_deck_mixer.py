@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from audio.audio_sink import NullSink
+from audio.deck_mixer import DeckMixer, crossfader_gains
+
+SAMPLE_RATE = 44100
+# One per deck, each on a whole bin of a one second window
+FREQS = (441.0, 1103.0, 2205.0)
+
+
+def tone(freq):
+    t = np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE
+    return np.stack([0.15 * np.sin(2 * np.pi * freq * t)] * 2, axis=1).astype(np.float32)
+
+
+def levels(position, decks=2):
+    # Level of each deck's tone in the mix after two seconds at a fixed crossfader position
+    mixer = DeckMixer(decks=decks, sample_rate=SAMPLE_RATE, sink=NullSink(sample_rate=SAMPLE_RATE))
+    mixer.sides = ['A', 'B', 'thru'][:decks]
+    for index in range(decks):
+        mixer.load_deck(index, tone(FREQS[index]), SAMPLE_RATE)
+        mixer.play_deck(index)
+    mixer.set_crossfader(position)
+    mixer.ramp.snap(mixer.mailbox.read()[1])
+    blocks = -(-2 * SAMPLE_RATE // mixer.block_size)
+    out = np.concatenate([mixer.render(mixer.block_size).copy() for _ in range(blocks)])[-SAMPLE_RATE:, 0]
+    spectrum = np.abs(np.fft.rfft(out * np.hanning(len(out))))
+    return np.array([spectrum[int(f)] for f in FREQS[:decks]])
+
+
+def test_crossfader_gains_are_constant_power():
+    np.testing.assert_allclose(crossfader_gains(0.0, ['A', 'B', 'thru']), [1.0, 0.0, 1.0], atol=1e-7)
+    np.testing.assert_allclose(crossfader_gains(1.0, ['A', 'B', 'thru']), [0.0, 1.0, 1.0], atol=1e-7)
+    middle = crossfader_gains(0.5, ['A', 'B'])
+    np.testing.assert_allclose(20 * np.log10(middle), [-3.01, -3.01], atol=0.01)
+    for position in np.linspace(0.0, 1.0, 11):
+        a, b = crossfader_gains(position, ['A', 'B'])
+        assert abs(a * a + b * b - 1.0) < 1e-6
+    np.testing.assert_array_equal(crossfader_gains(-1.0, ['A']), crossfader_gains(0.0, ['A']))
+    np.testing.assert_array_equal(crossfader_gains(2.0, ['B']), crossfader_gains(1.0, ['B']))
+
+
+def test_mix_follows_the_crossfader():
+    full_a, full_b, middle = levels(0.0), levels(1.0), levels(0.5)
+    assert full_a[1] < 1e-3 * full_a[0]
+    assert full_b[0] < 1e-3 * full_b[1]
+    assert middle[0] / full_a[0] == pytest.approx(np.sqrt(0.5), rel=0.01)
+    assert middle[1] / full_b[1] == pytest.approx(np.sqrt(0.5), rel=0.01)
+
+
+def test_thru_deck_ignores_the_crossfader():
+    full_a, full_b = levels(0.0, decks=3), levels(1.0, decks=3)
+    assert full_a[2] == pytest.approx(full_b[2], rel=0.01)
@@ -0,0 +1,50 @@
+import numpy as np
+from modules import constants as C
+from audio.audio_sink import NullSink
+from audio.dsp_graph import DSPGraph, FilterNode, Node
+from audio.stream_engine import StreamEngine
+
+FRAMES = C.STREAM_BLOCK_SIZE
+BUDGET = C.GRAPH_CPU_BUDGET * FRAMES / C.DEFAULT_SAMPLE_RATE
+
+
+def graph():
+    return DSPGraph({'pitch_shift': Node(), 'filter': FilterNode()}, ('pitch_shift', 'filter'))
+
+
+def run_blocks(graph, costs, blocks):
+    # Feed check_budget measured costs directly, so the outcome does not depend on the machine
+    for _ in range(blocks):
+        graph.recent_s.update(costs)
+        graph.check_budget(sum(costs.values()), FRAMES)
+
+
+def test_degrades_the_node_whose_cost_covers_the_overrun():
+    g = graph()
+    run_blocks(g, {'pitch_shift': 0.2 * BUDGET, 'filter': 1.0 * BUDGET}, C.GRAPH_OVER_BUDGET_BLOCKS)
+    assert g.degraded == ['filter']
+    assert g.nodes['filter'].sections == 1
+
+
+def test_leaves_a_cheap_node_alone():
+    # The overrun comes from a node that cannot degrade; degrading the filter would not help
+    g = graph()
+    run_blocks(g, {'pitch_shift': 1.5 * BUDGET, 'filter': 0.1 * BUDGET}, 4 * C.GRAPH_OVER_BUDGET_BLOCKS)
+    assert g.degraded == []
+    assert g.nodes['filter'].sections == 2
+
+
+def test_restores_once_there_is_headroom():
+    g = graph()
+    run_blocks(g, {'pitch_shift': 0.5 * BUDGET, 'filter': 0.6 * BUDGET}, C.GRAPH_OVER_BUDGET_BLOCKS)
+    assert g.degraded == ['filter']
+    run_blocks(g, {'pitch_shift': 0.0, 'filter': 0.3 * BUDGET}, C.GRAPH_RESTORE_BLOCKS - 1)
+    assert g.degraded == ['filter']
+    run_blocks(g, {'pitch_shift': 0.0, 'filter': 0.3 * BUDGET}, 1)
+    assert g.degraded == []
+    assert g.nodes['filter'].sections == 2
+
+
+def test_offline_engines_do_not_enforce_the_budget():
+    assert StreamEngine(sink=NullSink(realtime=False)).graph.enforce_budget is False
+    assert StreamEngine(sink=NullSink()).graph.enforce_budget is True
@@ -0,0 +1,34 @@
+import numpy as np
+from modules import constants as C
+from audio.master_bus import MasterBus, dry_levels
+
+
+def loud_signal(seconds: float, sample_rate: int = C.DEFAULT_SAMPLE_RATE) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    x = 3.0 * np.sin(2 * np.pi * 110 * t)[:, None] + rng.standard_normal((len(t), 2))
+    x[len(t) // 2:len(t) // 2 + 64] = 8.0  # a transient far over the ceiling
+    return x.astype(np.float32)
+
+
+def test_limiter_holds_the_ceiling_per_block():
+    bus = MasterBus()
+    x = loud_signal(2.0)
+    for start in range(0, len(x), C.STREAM_BLOCK_SIZE):
+        block = bus.process(x[start:start + C.STREAM_BLOCK_SIZE].copy())
+        assert np.abs(block).max() <= C.MASTER_CEILING + 1e-6
+
+
+def test_limiter_holds_the_ceiling_on_whole_renders():
+    x = loud_signal(2.0)
+    y = MasterBus(block_size=C.MASTER_RENDER_BLOCK).run(x.copy(), dry_levels(x))
+    assert len(y) == len(x)
+    assert np.abs(y).max() <= C.MASTER_CEILING + 1e-6
+
+
+def test_quiet_signal_passes_delayed_and_unchanged():
+    bus = MasterBus()
+    x = (0.1 * np.random.default_rng(1).standard_normal((4 * C.STREAM_BLOCK_SIZE, 2))).astype(np.float32)
+    y = np.concatenate([bus.process(x[i:i + C.STREAM_BLOCK_SIZE].copy())
+                        for i in range(0, len(x), C.STREAM_BLOCK_SIZE)])
+    np.testing.assert_allclose(y[bus.lookahead:], x[:-bus.lookahead], atol=1e-7)
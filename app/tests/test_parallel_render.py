@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from audio.audio_effects import AudioEffects
+from audio.parallel_render import ParallelRenderer
+
+SAMPLE_RATE = 44100
+
+
+@pytest.fixture(scope='module')
+def renderer():
+    renderer = ParallelRenderer(workers=3, chunk_s=4.0)
+    yield renderer
+    renderer.stop()
+
+
+@pytest.mark.parametrize('params', [
+    {'pitch': 1.0, 'reverb': 0.0, 'volume': 0.7, 'sample_rate': SAMPLE_RATE},
+    {'pitch': 0.9, 'reverb': 0.0, 'volume': 1.0, 'sample_rate': 48000},
+    {'pitch': 1.07, 'reverb': 0.5, 'volume': 0.8, 'sample_rate': SAMPLE_RATE},
+    {'pitch': 1.0, 'reverb': 0.3, 'filter': -0.5, 'volume': 1.0, 'sample_rate': SAMPLE_RATE},
+])
+def test_parallel_render_matches_serial(renderer, params):
+    # An odd length, so the last chunk is cut short and the output length rounds
+    x = (0.1 * np.random.default_rng(0).standard_normal((int(SAMPLE_RATE * 13.37), 2))).astype(np.float32)
+    effects = AudioEffects()
+    serial = effects.process(x, SAMPLE_RATE, params)
+    parallel = renderer.render(effects, x, SAMPLE_RATE, params)
+    assert parallel.shape == serial.shape
+    np.testing.assert_allclose(parallel, serial, atol=1e-5)
@@ -0,0 +1,53 @@
+import numpy as np
+from audio.param_mailbox import ParameterMailbox, ParameterRamp
+
+
+def test_mailbox_keeps_newest_value():
+    mailbox = ParameterMailbox({'pitch': 1.0, 'reverb': 0.0})
+    mailbox.post('pitch', 1.2)
+    mailbox.post('pitch', 0.9)
+    sequence, values = mailbox.read()
+    assert sequence == 2
+    assert values == {'pitch': 0.9, 'reverb': 0.0}
+
+
+def test_mailbox_ignores_unknown_names():
+    mailbox = ParameterMailbox({'pitch': 1.0})
+    mailbox.post('tempo', 2.0)
+    mailbox.post_many({'tempo': 2.0})
+    assert mailbox.read() == (0, {'pitch': 1.0})
+
+
+def test_mailbox_post_many_publishes_once():
+    mailbox = ParameterMailbox({'pitch': 1.0, 'reverb': 0.0})
+    mailbox.post_many({'pitch': 1.1, 'reverb': 0.5})
+    assert mailbox.read() == (1, {'pitch': 1.1, 'reverb': 0.5})
+
+
+def test_published_snapshot_is_not_mutated():
+    mailbox = ParameterMailbox({'pitch': 1.0})
+    _, before = mailbox.read()
+    mailbox.post('pitch', 1.5)
+    assert before == {'pitch': 1.0}
+
+
+def test_ramp_spans_from_last_value():
+    ramp = ParameterRamp({'pitch': 1.0}, 4)
+    assert ramp.next({'pitch': 1.2}) == {'pitch': (1.0, 1.2)}
+    assert ramp.next({'pitch': 1.2}) == {'pitch': (1.2, 1.2)}
+
+
+def test_ramp_snap_skips_the_glide():
+    ramp = ParameterRamp({'pitch': 1.0}, 4)
+    ramp.snap({'pitch': 0.8})
+    assert ramp.next({'pitch': 0.8}) == {'pitch': (0.8, 0.8)}
+
+
+def test_ramp_curve():
+    ramp = ParameterRamp({'pitch': 1.0}, 4)
+    assert ramp.curve(0.5, 0.5, 4) == 0.5
+    np.testing.assert_allclose(ramp.curve(0.0, 1.0, 4)[:, 0], [0.25, 0.5, 0.75, 1.0])
+    out = np.zeros(8, dtype=np.float32)
+    values = ramp.curve(1.0, 3.0, 2, out=out)
+    np.testing.assert_allclose(values[:, 0], [2.0, 3.0])
+    assert np.shares_memory(values, out)
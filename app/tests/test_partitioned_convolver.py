@@ -0,0 +1,62 @@
+import numpy as np
+from scipy import signal
+from audio.ir_bank import IRBank
+from audio.partitioned_convolver import PartitionedConvolver, partition_ir
+
+BLOCK = 256
+
+
+def make_signals(frames=8 * BLOCK, ir_frames=3 * BLOCK + 37):
+    rng = np.random.default_rng(5)
+    x = rng.standard_normal((frames, 2)).astype(np.float32)
+    ir = (rng.standard_normal(ir_frames) * np.exp(-np.arange(ir_frames) / 200)).astype(np.float32)
+    return x, ir
+
+
+def direct(x, ir):
+    return signal.fftconvolve(x, ir[:, None], axes=0)[:len(x)]
+
+
+def test_whole_blocks_match_direct_convolution():
+    x, ir = make_signals()
+    convolver = PartitionedConvolver(BLOCK, 2)
+    convolver.set_ir(ir)
+    y = np.concatenate([convolver.process(x[i:i + BLOCK]) for i in range(0, len(x), BLOCK)])
+    assert np.max(np.abs(y - direct(x, ir))) < 1e-4
+
+
+def test_unaligned_requests_are_one_block_late():
+    x, ir = make_signals()
+    convolver = PartitionedConvolver(BLOCK, 2)
+    convolver.set_ir(ir)
+    sizes = [100, 300, 57, 511, 256]
+    out, start = [], 0
+    while start < len(x):
+        size = sizes[len(out) % len(sizes)]
+        out.append(convolver.process(x[start:start + size]))
+        start += size
+    y = np.concatenate(out)
+    assert len(y) == len(x)
+    assert np.max(np.abs(y[:BLOCK])) == 0.0
+    assert np.max(np.abs(y[BLOCK:] - direct(x, ir)[:-BLOCK])) < 1e-4
+
+
+def test_banked_partitions_convolve_the_same(tmp_path):
+    x, ir = make_signals()
+    bank = IRBank(str(tmp_path))
+    built = []
+
+    def build():
+        built.append(True)
+        return partition_ir(ir, BLOCK)
+
+    fresh = bank.get('test_ir', build)
+    stored = bank.get('test_ir', build)
+    assert len(built) == 1
+    assert isinstance(stored, np.memmap)
+    np.testing.assert_array_equal(stored, fresh)
+
+    convolver = PartitionedConvolver(BLOCK, 2)
+    convolver.set_partitions(stored)
+    y = convolver.process(x)
+    assert np.max(np.abs(y - direct(x, ir))) < 1e-4
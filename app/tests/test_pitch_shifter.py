@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from audio.pitch_shifter import PitchShifter
+
+SAMPLE_RATE = 44100
+
+
+def tone(freq, frames):
+    t = np.arange(frames) / SAMPLE_RATE
+    return np.stack([np.sin(2 * np.pi * freq * t)] * 2, axis=1).astype(np.float32)
+
+
+@pytest.mark.parametrize('pitch', [0.8, 1.0, 1.2])
+def test_process_returns_as_many_frames_as_given(pitch):
+    shifter = PitchShifter(2)
+    x = tone(440.0, 5000)
+    for size in (300, 1, 512, 2048, 139):
+        assert shifter.process(x[:size], pitch).shape == (size, 2)
+
+
+@pytest.mark.parametrize('pitch', [0.8, 1.0, 1.2])
+def test_apply_keeps_the_length(pitch):
+    x = tone(440.0, 20000)
+    assert PitchShifter(2).apply(x, pitch).shape == x.shape
+
+
+def test_impulse_comes_out_latency_frames_later():
+    shifter = PitchShifter(2)
+    x = np.zeros((8192, 2), dtype=np.float32)
+    x[1000] = 1.0
+    y = np.concatenate([shifter.process(x[i:i + 300], 1.0).copy() for i in range(0, len(x), 300)])
+    assert np.max(np.abs(y[:1000])) == 0.0
+    assert np.argmax(np.abs(y[:, 0])) == 1000 + shifter.latency
+
+
+def test_apply_trims_the_latency():
+    x = tone(440.0, SAMPLE_RATE)
+    y = PitchShifter(2).apply(x, 1.0)
+    assert np.max(np.abs(y[4096:-4096] - x[4096:-4096])) < 1e-3
+
+
+@pytest.mark.parametrize('pitch', [0.8, 1.2])
+def test_tone_moves_by_pitch_at_the_same_tempo(pitch):
+    y = PitchShifter(2).apply(tone(440.0, 2 * SAMPLE_RATE), pitch)
+    segment = y[SAMPLE_RATE // 2:SAMPLE_RATE // 2 + SAMPLE_RATE, 0]
+    peak_hz = np.argmax(np.abs(np.fft.rfft(segment * np.hanning(len(segment)))))
+    assert abs(peak_hz - 440.0 * pitch) <= 1
+
+
+def test_process_writes_into_out():
+    shifter = PitchShifter(2)
+    x = tone(440.0, 4096)
+    expected = np.concatenate([shifter.process(x[i:i + 512], 1.1).copy() for i in range(0, len(x), 512)])
+    shifter.reset()
+    for i in range(0, len(x), 512):
+        block = x[i:i + 512].copy()
+        assert shifter.process(block, 1.1, out=block) is block
+        np.testing.assert_array_equal(block, expected[i:i + 512])
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from audio.audio_effects import AudioEffects
+
+SAMPLE_RATE = 44100
+
+
+def swelling_noise(seconds: float) -> np.ndarray:
+    # Level changes over the track, so a master bus gain that jumped at a seam would show
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = (1.0 + 0.9 * np.sin(2 * np.pi * 0.1 * t))[:, None]
+    return (0.2 * rng.standard_normal((len(t), 2)) * envelope).astype(np.float32)
+
+
+@pytest.mark.parametrize('engine', ['convolution', 'fdn'])
+@pytest.mark.parametrize('pitch', [1.0, 1.05])
+def test_chunks_join_into_the_whole_render(engine, pitch):
+    x = swelling_noise(16.0)
+    effects = AudioEffects(engine)
+    params = {'volume': 1.0, 'pitch': pitch, 'reverb': 0.8, 'sample_rate': SAMPLE_RATE}
+    whole = effects.process(x, SAMPLE_RATE, params)
+
+    edges = [0, int(3.3 * SAMPLE_RATE), int(7.0 * SAMPLE_RATE), int(11.9 * SAMPLE_RATE), len(x)]
+    chunks = [effects.render_range(x, SAMPLE_RATE, params, a, b) for a, b in zip(edges, edges[1:])]
+    joined = np.concatenate(chunks)
+
+    n = min(len(joined), len(whole))
+    assert abs(len(joined) - len(whole)) <= 1
+    np.testing.assert_allclose(joined[:n], whole[:n], atol=1e-5)
@@ -0,0 +1,112 @@
+import threading
+import time
+import pytest
+from audio.render_scheduler import RenderCancelled, RenderScheduler, check_cancelled
+
+
+class BlockingRender:
+    # Render that signals when it starts, waits for release, then reaches its checkpoint
+    # (when checkpoints is set)
+    def __init__(self, checkpoints=True):
+        self.checkpoints = checkpoints
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.seen = []
+
+    def __call__(self, params, cancel):
+        self.seen.append(params['value'])
+        self.started.set()
+        assert self.release.wait(2.0)
+        if self.checkpoints:
+            check_cancelled(cancel)
+        return params['value']
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+def test_check_cancelled():
+    check_cancelled(None)
+    cancel = threading.Event()
+    check_cancelled(cancel)
+    cancel.set()
+    with pytest.raises(RenderCancelled):
+        check_cancelled(cancel)
+
+
+def test_newer_request_cancels_the_running_render_and_coalesces_waiting_ones():
+    render, delivered = BlockingRender(), []
+    scheduler = RenderScheduler(render, delivered.append)
+    try:
+        scheduler.request({'value': 1})
+        assert render.started.wait(2.0)
+        for value in (2, 3, 4):
+            scheduler.request({'value': value})
+        render.release.set()
+        wait_for(lambda: not scheduler.is_busy)
+        stats = scheduler.get_stats()
+    finally:
+        scheduler.stop()
+    assert delivered == [4]
+    assert render.seen == [1, 4]
+    assert stats['cancelled'] == 1
+    assert stats['coalesced'] == 2
+    assert stats['completed'] == 1
+
+
+def test_result_is_dropped_when_a_request_lands_after_the_last_checkpoint():
+    render, delivered = BlockingRender(checkpoints=False), []
+    scheduler = RenderScheduler(render, delivered.append)
+    try:
+        scheduler.request({'value': 1})
+        assert render.started.wait(2.0)
+        scheduler.request({'value': 2})
+        render.release.set()
+        wait_for(lambda: not scheduler.is_busy)
+        stats = scheduler.get_stats()
+    finally:
+        scheduler.stop()
+    assert delivered == [2]
+    assert stats['cancelled'] == 1
+    assert stats['completed'] == 1
+
+
+def test_failed_render_is_counted_and_the_worker_carries_on():
+    delivered = []
+
+    def render(params, cancel):
+        if params['value'] == 'bad':
+            raise ValueError(params['value'])
+        return params['value']
+
+    scheduler = RenderScheduler(render, delivered.append)
+    try:
+        scheduler.request({'value': 'bad'})
+        wait_for(lambda: scheduler.get_stats()['failed'] == 1)
+        scheduler.request({'value': 'good'})
+        wait_for(lambda: delivered == ['good'])
+    finally:
+        scheduler.stop()
+
+
+def test_stop_cancels_the_running_render():
+    started, delivered = threading.Event(), []
+
+    def render(params, cancel):
+        started.set()
+        cancel.wait(2.0)
+        check_cancelled(cancel)
+        return params['value']
+
+    scheduler = RenderScheduler(render, delivered.append)
+    scheduler.request({'value': 1})
+    assert started.wait(2.0)
+    scheduler.stop()
+    assert not scheduler.worker.is_alive()
+    assert delivered == []
+    assert scheduler.get_stats()['cancelled'] == 1
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from audio.resampler import PolyphaseResampler, RESAMPLER_TIERS
+
+SAMPLE_RATE = 44100
+
+
+def tone(freq, frames=SAMPLE_RATE):
+    t = np.arange(frames) / SAMPLE_RATE
+    return np.stack([np.sin(2 * np.pi * freq * t)] * 2, axis=1).astype(np.float32)
+
+
+def error_against_ideal(y, freq, step):
+    # Largest deviation from the tone read step times faster, away from the edges
+    ideal = np.sin(2 * np.pi * freq * step * np.arange(len(y)) / SAMPLE_RATE)
+    return np.max(np.abs(y[2000:-2000, 0] - ideal[2000:-2000]))
+
+
+@pytest.mark.parametrize('tier', sorted(RESAMPLER_TIERS))
+@pytest.mark.parametrize('step', [1.25, 0.8, 1.0 / 1.06])
+def test_output_length(tier, step):
+    resampler = PolyphaseResampler(2, tier)
+    x = tone(1000.0, 10000)
+    ratio = resampler.ratio(step)
+    assert len(resampler.resample(x, step)) == len(x) * ratio.denominator // ratio.numerator
+    assert len(resampler.stream(x, step)) == int(len(x) / step)
+
+
+@pytest.mark.parametrize('tier', sorted(RESAMPLER_TIERS))
+@pytest.mark.parametrize('step', [1.25, 0.8])
+def test_tone_moves_by_the_step(tier, step):
+    resampler = PolyphaseResampler(2, tier)
+    x = tone(1000.0)
+    assert error_against_ideal(resampler.resample(x, step), 1000.0, step) < 1e-3
+    assert error_against_ideal(resampler.stream(x, step), 1000.0, step) < 2e-3
+
+
+def test_export_tier_is_more_accurate_than_live():
+    x = tone(12000.0)
+    live = PolyphaseResampler(2, 'live').stream(x, 1.25)
+    export = PolyphaseResampler(2, 'export').stream(x, 1.25)
+    assert error_against_ideal(export, 12000.0, 1.25) < 1e-3
+    assert error_against_ideal(export, 12000.0, 1.25) < error_against_ideal(live, 12000.0, 1.25) / 10
+
+
+@pytest.mark.parametrize('tier', sorted(RESAMPLER_TIERS))
+def test_tone_above_the_new_nyquist_is_filtered(tier):
+    # 18 kHz read 1.5 times faster would land at 27 kHz, past the output's Nyquist
+    resampler = PolyphaseResampler(2, tier)
+    x = tone(18000.0)
+    for y in (resampler.stream(x, 1.5), resampler.resample(x, 1.5)):
+        assert np.sqrt(np.mean(y[2000:-2000] ** 2)) < 0.05
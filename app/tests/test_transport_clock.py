@@ -0,0 +1,45 @@
+import numpy as np
+from audio.playback_manager import PlaybackManager
+from audio.audio_sink import NullSink
+from audio.transport_clock import TransportClock
+
+SAMPLE_RATE = 44100
+
+
+def test_position_counts_delivered_frames():
+    clock = TransportClock(SAMPLE_RATE)
+    for _ in range(10):
+        clock.advance(441)
+    assert clock.frame == 4410
+    assert clock.position_s() == 0.1
+    assert clock.position_s(latency_frames=441) == 0.09
+
+
+def test_seek_moves_position_but_not_output_time():
+    clock = TransportClock(SAMPLE_RATE)
+    clock.advance(SAMPLE_RATE)
+    clock.seek(5 * SAMPLE_RATE)
+    assert clock.position_s() == 5.0
+    assert clock.output_s() == 1.0
+    clock.seek(-10)
+    assert clock.frame == 0
+
+
+def test_pause_keeps_position_and_reanchors_drift():
+    clock = TransportClock(SAMPLE_RATE)
+    clock.advance(512)
+    clock.pause()
+    assert clock.anchor is None
+    assert clock.frame == 512
+    clock.advance(512)
+    assert clock.frame == 1024
+    assert clock.delivered == 512
+
+
+def test_replay_position_is_in_source_seconds():
+    # A buffer rendered at pitch 0.9 holds the source at 0.9 source frames per frame
+    manager = PlaybackManager(SAMPLE_RATE, 512, sink=NullSink(sample_rate=SAMPLE_RATE))
+    buffer = np.zeros((20 * SAMPLE_RATE, 2), dtype=np.float32)
+    manager.swap_buffer(buffer, 0.9, 0)
+    manager.seek(5.0 / 0.9)
+    assert abs(manager.get_source_position_s(SAMPLE_RATE) - 5.0) < 1e-4
@@ -5,21 +5,24 @@ import os
 import pygame
 import threading
 import numpy as np
-from typing import Optional
+from typing import Optional, Sequence
 from tracking.hand_tracker import HandTracker
 from audio.audio_controller import AudioController
 from tracking.visualizer import Visualizer
 from modules.constants import *
 
 class DJController:
-    def __init__(self, audio_file: str = "audio.wav"):
+    def __init__(self, audio_file: str = "audio.wav", deck_files: Sequence[str] = ()):
         # Initialize the DJ controller with camera, audio, and hand tracking components
         self.camera_width, self.camera_height = DEFAULT_CAMERA_WIDTH, DEFAULT_CAMERA_HEIGHT
         
 
         self.visualizer = Visualizer(camera_width=self.camera_width, camera_height=self.camera_height)
 
-        self.audio_controller = AudioController(sample_rate=DEFAULT_SAMPLE_RATE)
+        # Extra files go on decks B, C, ... of a mixer, crossfaded by moving both hands sideways
+        self.deck_files = [path for path in deck_files if path and os.path.exists(path)]
+        decks = max(MIXER_DECKS, 1 + len(self.deck_files))
+        self.audio_controller = AudioController(sample_rate=DEFAULT_SAMPLE_RATE, decks=decks)
         
         self.hand_tracker: Optional[HandTracker] = None
         self.camera: Optional[cv2.VideoCapture] = None
@@ -41,6 +44,9 @@ class DJController:
             'pitch': True,
             'reverb': True,
             'volume': True,
+            'filter': False,  # opt-in: the sweep rides on the same hand as reverb
+            'echo': False,  # opt-in: the send rides on the same hand as pitch
+            'crossfader': True,
         }
 
         if audio_file and os.path.exists(audio_file):
@@ -80,6 +86,8 @@ class DJController:
 
             if self.pending_audio_file:
                 self.audio_controller.load_audio(self.pending_audio_file)
+                for index, path in enumerate(self.deck_files, start=1):
+                    self.audio_controller.load_deck(index, path)
                 
 
             self.initialization_complete = True
@@ -172,9 +180,17 @@ class DJController:
             if self.controls_enabled.get('pitch', True):
                 pitch = self.visualizer.draw_pitch_control(frame, smoothed_left)
                 self.audio_controller.smooth_pitch(pitch)
+
+            # Left hand height opens the echo send
+            if self.controls_enabled.get('echo', False):
+                send = self.visualizer.draw_echo_control(frame, smoothed_left)
+                self.audio_controller.smooth_echo(send)
+            else:
+                self.release_echo()
         else:
    
             self.previous_landmarks['left'] = None
+            self.release_echo()
             
 
         if self.hand_tracker.right_hand_present and self.hand_tracker.right_hand_landmarks:
@@ -189,9 +205,17 @@ class DJController:
             if self.controls_enabled.get('reverb', True):
                 reverb = self.visualizer.draw_reverb_control(frame, smoothed_right)
                 self.audio_controller.smooth_reverb(reverb)
+
+            # Right hand height sweeps the DJ filter
+            if self.controls_enabled.get('filter', False):
+                sweep = self.visualizer.draw_filter_control(frame, smoothed_right)
+                self.audio_controller.smooth_filter(sweep)
+            else:
+                self.release_filter()
         else:
   
             self.previous_landmarks['right'] = None
+            self.release_filter()
             
 
         if (self.hand_tracker.left_hand_present and self.hand_tracker.right_hand_present and
@@ -212,18 +236,50 @@ class DJController:
                 )
                 self.audio_controller.smooth_volume(volume)
 
+            if self.crossfader_enabled():
+                position = self.visualizer.draw_crossfader_control(
+                    frame,
+                    self.previous_landmarks['left'],
+                    self.previous_landmarks['right']
+                )
+                self.audio_controller.smooth_crossfader(position)
+
     def update_controls(self, frame):
 
         if self.hand_tracker.left_hand_present and self.hand_tracker.left_hand_landmarks and self.controls_enabled.get('pitch', True):
             pitch = self.visualizer.draw_pitch_control(frame, self.hand_tracker.left_hand_landmarks)
             self.audio_controller.smooth_pitch(pitch)
+        if self.hand_tracker.left_hand_present and self.hand_tracker.left_hand_landmarks and self.controls_enabled.get('echo', False):
+            send = self.visualizer.draw_echo_control(frame, self.hand_tracker.left_hand_landmarks)
+            self.audio_controller.smooth_echo(send)
+        else:
+            self.release_echo()
         if self.hand_tracker.right_hand_present and self.hand_tracker.right_hand_landmarks and self.controls_enabled.get('reverb', True):
             reverb = self.visualizer.draw_reverb_control(frame, self.hand_tracker.right_hand_landmarks)
             self.audio_controller.smooth_reverb(reverb)
+        if self.hand_tracker.right_hand_present and self.hand_tracker.right_hand_landmarks and self.controls_enabled.get('filter', False):
+            sweep = self.visualizer.draw_filter_control(frame, self.hand_tracker.right_hand_landmarks)
+            self.audio_controller.smooth_filter(sweep)
+        else:
+            self.release_filter()
         if (self.hand_tracker.left_hand_present and self.hand_tracker.right_hand_present and
             self.controls_enabled.get('volume', True)):
             volume = self.visualizer.draw_volume_control(frame, self.hand_tracker.left_hand_landmarks, self.hand_tracker.right_hand_landmarks)
             self.audio_controller.smooth_volume(volume)
+        if self.hand_tracker.left_hand_present and self.hand_tracker.right_hand_present and self.crossfader_enabled():
+            position = self.visualizer.draw_crossfader_control(frame, self.hand_tracker.left_hand_landmarks, self.hand_tracker.right_hand_landmarks)
+            self.audio_controller.smooth_crossfader(position)
+
+    def release_filter(self):
+        # With no hand on it (lost, or the control switched off) the filter eases back to off
+        # instead of staying wherever the hand left it
+        if abs(self.audio_controller.filter - DEFAULT_FILTER) > 0.001:
+            self.audio_controller.smooth_filter(DEFAULT_FILTER)
+
+    def release_echo(self):
+        # Likewise the echo send closes, and the repeats already in the line ring out
+        if self.audio_controller.echo > 0.001:
+            self.audio_controller.smooth_echo(DEFAULT_ECHO)
 
     def render_visuals(self, frame):
 
@@ -250,6 +306,30 @@ class DJController:
     def toggle_volume_enabled(self) -> bool:
         return self.toggle_control('volume')
 
+    def toggle_filter_enabled(self) -> bool:
+        return self.toggle_control('filter')
+
+    def toggle_echo_enabled(self) -> bool:
+        return self.toggle_control('echo')
+
+    def toggle_crossfader_enabled(self) -> bool:
+        return self.toggle_control('crossfader')
+
+    def crossfader_enabled(self) -> bool:
+        # Only with a mixer of two decks or more
+        return self.controls_enabled.get('crossfader', True) and self.audio_controller.audio_processor.deck_count > 1
+
+    @property
+    def delay_division(self) -> str:
+        return self.audio_controller.delay_division
+
+    def cycle_delay_division(self) -> str:
+        # Step the echo's note length through DELAY_DIVISIONS
+        names = list(DELAY_DIVISIONS)
+        name = names[(names.index(self.delay_division) + 1) % len(names)]
+        self.audio_controller.set_delay_division(name)
+        return name
+
     def is_control_enabled(self, name: str) -> bool:
         return self.controls_enabled.get(name, False)
 
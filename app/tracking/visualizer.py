@@ -90,6 +90,67 @@ class Visualizer:
         cv2.putText(image, f"Volume: {raw_volume:.2f}", (display_x - 50, display_y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
         return raw_volume
 
+    def draw_filter_control(self, image, landmarks):
+        # Draws the DJ filter sweep from wrist height: low-pass below the middle, high-pass above
+        wrist_x, wrist_y = landmarks[WRIST][1], landmarks[WRIST][2]
+
+        raw_filter = np.interp(wrist_y, [FILTER_HEIGHT_TOP, FILTER_HEIGHT_BOTTOM], [FILTER_RANGE_MAX, FILTER_RANGE_MIN])
+
+        raw_filter = np.clip(raw_filter, FILTER_RANGE_MIN, FILTER_RANGE_MAX)
+
+
+        bar_x = self.camera_width - 30
+        mid_y = (FILTER_HEIGHT_TOP + FILTER_HEIGHT_BOTTOM) // 2
+        cv2.line(image, (bar_x, FILTER_HEIGHT_TOP), (bar_x, FILTER_HEIGHT_BOTTOM), (255, 255, 255), 2)
+        cv2.line(image, (bar_x - 8, mid_y), (bar_x + 8, mid_y), (255, 255, 255), 2)
+        marker_y = int(np.clip(wrist_y, FILTER_HEIGHT_TOP, FILTER_HEIGHT_BOTTOM))
+        cv2.circle(image, (bar_x, marker_y), 8, (255, 0, 255), cv2.FILLED)
+        cv2.circle(image, (wrist_x, wrist_y), 10, (255, 0, 255), cv2.FILLED)
+
+
+        label = "Off" if abs(raw_filter) < FILTER_DEADZONE else ("HPF" if raw_filter > 0 else "LPF")
+        cv2.putText(image, f"Filter: {label} {raw_filter:+.2f}", (bar_x - 170, marker_y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 255), 2)
+        return raw_filter
+
+    def draw_echo_control(self, image, landmarks):
+        # Draws the echo send from left wrist height: closed below ECHO_HEIGHT_BOTTOM, full at the top
+        wrist_x, wrist_y = landmarks[WRIST][1], landmarks[WRIST][2]
+
+        raw_echo = np.interp(wrist_y, [ECHO_HEIGHT_TOP, ECHO_HEIGHT_BOTTOM], [ECHO_RANGE_MAX, ECHO_RANGE_MIN])
+
+        raw_echo = np.clip(raw_echo, ECHO_RANGE_MIN, ECHO_RANGE_MAX)
+
+
+        bar_x = 30
+        cv2.line(image, (bar_x, ECHO_HEIGHT_TOP), (bar_x, ECHO_HEIGHT_BOTTOM), (255, 255, 255), 2)
+        marker_y = int(np.clip(wrist_y, ECHO_HEIGHT_TOP, ECHO_HEIGHT_BOTTOM))
+        cv2.line(image, (bar_x, ECHO_HEIGHT_BOTTOM), (bar_x, marker_y), (255, 255, 0), 6)
+        cv2.circle(image, (bar_x, marker_y), 8, (255, 255, 0), cv2.FILLED)
+        cv2.circle(image, (wrist_x, wrist_y), 10, (255, 255, 0), cv2.FILLED)
+
+
+        cv2.putText(image, f"Echo: {raw_echo * 100:.0f}%", (bar_x + 15, marker_y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+        return raw_echo
+
+    def draw_crossfader_control(self, image, left_landmarks, right_landmarks):
+        # Draws the crossfader from where the point between both wrists sits across the frame
+        left_x, left_y = left_landmarks[WRIST][1], left_landmarks[WRIST][2]
+        right_x, right_y = right_landmarks[WRIST][1], right_landmarks[WRIST][2]
+        mid_x = (left_x + right_x) // 2
+
+        raw_crossfader = np.interp(mid_x, [CROSSFADER_X_MIN, CROSSFADER_X_MAX], [0.0, 1.0])
+
+        raw_crossfader = np.clip(raw_crossfader, 0.0, 1.0)
+
+
+        bar_y = self.camera_height - 40
+        cv2.line(image, (CROSSFADER_X_MIN, bar_y), (CROSSFADER_X_MAX, bar_y), (255, 255, 255), 2)
+        marker_x = int(np.clip(mid_x, CROSSFADER_X_MIN, CROSSFADER_X_MAX))
+        cv2.rectangle(image, (marker_x - 6, bar_y - 12), (marker_x + 6, bar_y + 12), (0, 165, 255), cv2.FILLED)
+        cv2.putText(image, "A", (CROSSFADER_X_MIN - 25, bar_y + 6), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
+        cv2.putText(image, "B", (CROSSFADER_X_MAX + 10, bar_y + 6), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
+        return raw_crossfader
+
     def draw_fps(self, image, previous_time, current_time):
         # Shows current frame rate in the corner for performance monitoring
         if previous_time > 0: